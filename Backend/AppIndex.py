@@ -0,0 +1,351 @@
+import os
+import re
+import json
+import threading
+from time import perf_counter
+import numpy as np
+
+# Persisted app -> URL mapping for web apps (user edits are kept across runs)
+IndexFile = os.path.join("Data", "AppIndex.json")
+
+# How often the background thread refreshes its indexes (seconds)
+ProcessRefreshInterval = 5
+AppRefreshInterval = 300
+
+# Minimum Dice similarity (over character trigrams) for a fuzzy match
+MatchThreshold = 0.5
+
+# CloseApp terminates processes without asking, so a fuzzy process match must be much closer
+CloseThreshold = 0.85
+
+# Processes CloseApp never terminates, whatever they are called: the OS, its shell and services
+SystemProcesses = {
+    "system", "system idle process", "idle", "registry", "memory compression", "secure system",
+    "smss", "csrss", "wininit", "winlogon", "services", "lsass", "lsaiso", "svchost", "fontdrvhost",
+    "dwm", "explorer", "sihost", "taskhostw", "ctfmon", "spoolsv", "conhost", "dllhost", "runtimebroker",
+    "audiodg", "searchindexer", "searchhost", "startmenuexperiencehost", "shellexperiencehost",
+    "textinputhost", "securityhealthservice", "msmpeng", "nissrv", "smartscreen", "wudfhost", "userinit",
+    "init", "systemd", "kthreadd", "launchd", "loginwindow", "windowserver", "finder", "dock",
+}
+
+# Spoken names that differ from the installed/process name
+DefaultAliases = {
+    "chrome": "google chrome",
+    "vs code": "visual studio code",
+    "vscode": "visual studio code",
+    "code": "visual studio code",
+    "word": "microsoft word",
+    "excel": "microsoft excel",
+    "powerpoint": "microsoft powerpoint",
+    "edge": "microsoft edge",
+    "file explorer": "explorer",
+    "calculator": "calculator",
+    "paint": "paint",
+    "cmd": "command prompt",
+    "terminal": "windows terminal",
+}
+
+# Web apps opened in the browser when nothing is installed locally
+DefaultWebApps = {
+    "facebook": "https://www.facebook.com",
+    "instagram": "https://www.instagram.com",
+    "youtube": "https://www.youtube.com",
+    "whatsapp": "https://web.whatsapp.com",
+    "telegram": "https://web.telegram.org",
+    "twitter": "https://x.com",
+    "x": "https://x.com",
+    "linkedin": "https://www.linkedin.com",
+    "gmail": "https://mail.google.com",
+    "google": "https://www.google.com",
+    "chatgpt": "https://chatgpt.com",
+    "github": "https://github.com",
+    "canva": "https://www.canva.com",
+    "netflix": "https://www.netflix.com",
+    "spotify": "https://open.spotify.com",
+    "amazon": "https://www.amazon.in",
+    "flipkart": "https://www.flipkart.com",
+    "reddit": "https://www.reddit.com",
+    "wikipedia": "https://www.wikipedia.org",
+    "google maps": "https://maps.google.com",
+    "google drive": "https://drive.google.com",
+    "stackoverflow": "https://stackoverflow.com",
+}
+
+
+# Lowercase, drop ".exe" and collapse whitespace so spoken and installed names compare equal
+def Normalize(name):
+    name = name.lower().strip()
+    if name.endswith(".exe"):
+        name = name[:-4]
+    return re.sub(r"\s+", " ", name)
+
+
+def Trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyTable:
+    """Name/alias table with a trigram inverted index.
+
+    Add/Remove update plain dicts incrementally; Compile() then snapshots them
+    into numpy arrays so a lookup is one bincount over the query's postings.
+    """
+
+    def __init__(self):
+        self.exact = {}      # normalized name -> canonical value
+        self.grams = {}      # normalized name -> its trigram set
+        self._snapshot = ({}, [], np.zeros(0, dtype=np.int32))  # postings, names, gram counts
+
+    def __len__(self):
+        return len(self.exact)
+
+    def Add(self, name, value=None):
+        key = Normalize(name)
+        if not key:
+            return
+        self.exact[key] = value if value is not None else name
+        if key not in self.grams:
+            self.grams[key] = Trigrams(key)
+
+    def Remove(self, name):
+        key = Normalize(name)
+        self.exact.pop(key, None)
+        self.grams.pop(key, None)
+
+    def Names(self):
+        return set(self.exact)
+
+    def Compile(self):
+        names = list(self.grams)
+        postings = {}
+        for i, key in enumerate(names):
+            for gram in self.grams[key]:
+                postings.setdefault(gram, []).append(i)
+        postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        sizes = np.array([len(self.grams[key]) for key in names], dtype=np.int32)
+        self._snapshot = (postings, names, sizes)  # Swapped in one assignment, so lookups never see a half-built index
+
+    def Lookup(self, name, threshold=MatchThreshold):
+        """Return (value, score) for the best match, or (None, 0.0)."""
+        key = Normalize(name)
+        value = self.exact.get(key)
+        if value is not None:
+            return value, 1.0
+
+        postings, names, sizes = self._snapshot
+        grams = Trigrams(key)
+        hits = [postings[gram] for gram in grams if gram in postings]
+        if not hits:
+            return None, 0.0
+
+        shared = np.bincount(np.concatenate(hits), minlength=len(names))
+        scores = 2.0 * shared / (len(grams) + sizes)
+        best = int(scores.argmax())
+        if scores[best] < threshold:
+            return None, 0.0
+        value = self.exact.get(names[best])
+        return (value, float(scores[best])) if value is not None else (None, 0.0)
+
+
+class AppIndex:
+    """Prebuilt resolver for OpenApp/CloseApp: installed apps, web apps and running processes."""
+
+    def __init__(self, index_file=IndexFile):
+        self.index_file = index_file
+        self.aliases = dict(DefaultAliases)
+        self.web_urls = dict(DefaultWebApps)
+        self.apps = FuzzyTable()
+        self.web = FuzzyTable()
+        self.processes = FuzzyTable()
+        self.pids = {}   # normalized process name -> set of pids
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load()
+
+    # ----- persistence -----
+
+    def _load(self):
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.web_urls.update(data.get("web", {}))
+            self.aliases.update(data.get("aliases", {}))
+        except FileNotFoundError:
+            try:
+                self.Save()  # Write the defaults out, so there is a file to add web apps and aliases to
+            except OSError:
+                pass
+        except ValueError:
+            pass
+        for name, url in self.web_urls.items():
+            self.web.Add(name, url)
+        self.web.Compile()
+
+    def Save(self):
+        os.makedirs(os.path.dirname(self.index_file) or ".", exist_ok=True)
+        temp_path = self.index_file + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"web": self.web_urls, "aliases": self.aliases}, f, indent=4)
+        os.replace(temp_path, self.index_file)
+
+    def AddWebApp(self, name, url):
+        with self._lock:
+            self.web_urls[Normalize(name)] = url
+            self.web.Add(name, url)
+            self.web.Compile()
+        self.Save()
+
+    # ----- refresh -----
+
+    def RefreshApps(self, names=None):
+        """Diff the installed-app list against the table and apply only the changes."""
+        if names is None:
+            names = InstalledApps()
+        fresh = {Normalize(name): name for name in names}
+        with self._lock:
+            current = self.apps.Names()
+            for key in current - fresh.keys():
+                self.apps.Remove(key)
+            for key in fresh.keys() - current:
+                self.apps.Add(key, fresh[key])
+            if current != fresh.keys():
+                self.apps.Compile()
+        self.ready.set()
+
+    def RefreshProcesses(self, processes=None):
+        """processes: iterable of (pid, name); defaults to the live process table."""
+        if processes is None:
+            processes = RunningProcesses()
+        pids = {}
+        for pid, name in processes:
+            if name:
+                pids.setdefault(Normalize(name), set()).add(pid)
+        with self._lock:
+            current = self.processes.Names()
+            for key in current - pids.keys():
+                self.processes.Remove(key)
+            for key in pids.keys() - current:
+                self.processes.Add(key, key)
+            if current != pids.keys():
+                self.processes.Compile()
+            self.pids = pids
+
+    def Start(self):
+        """Build the indexes in the background and keep them fresh."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="AppIndexRefresh", daemon=True)
+        self._thread.start()
+
+    def Stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        since_apps = AppRefreshInterval
+        while not self._stop.is_set():
+            try:
+                if since_apps >= AppRefreshInterval:
+                    self.RefreshApps()
+                    since_apps = 0
+                self.RefreshProcesses()
+            except Exception as e:
+                print(f"App index refresh failed: {e}")
+                self.ready.set()  # Callers fall back to AppOpener's own matching
+            self._stop.wait(ProcessRefreshInterval)
+            since_apps += ProcessRefreshInterval
+
+    # ----- resolution -----
+
+    def _alias(self, name):
+        key = Normalize(name)
+        return self.aliases.get(key, key)
+
+    def ResolveApp(self, name):
+        """Installed app name for a spoken name, or None."""
+        value, _ = self.apps.Lookup(self._alias(name))
+        return value
+
+    def ResolveWeb(self, name):
+        """URL for a web app, or None."""
+        value, _ = self.web.Lookup(self._alias(name))
+        return value
+
+    def ResolveProcess(self, name):
+        """(process name, pids) of a running app safe to terminate, or (None, set()).
+
+        Only an exact or alias match, or a fuzzy one scoring CloseThreshold or more, counts;
+        system processes never match. Anything less is left to AppOpener's own close.
+        """
+        value = None
+        for key in (Normalize(name), self._alias(name)):
+            value, _ = self.processes.Lookup(key, threshold=CloseThreshold)
+            if value is not None:
+                break
+        if value is None or value in SystemProcesses:
+            return None, set()
+        return value, {pid for pid in self.pids.get(value, ()) if UserProcess(pid)}
+
+
+# Installed app names as AppOpener sees them
+def InstalledApps():
+    from AppOpener import give_appnames
+    return list(give_appnames())
+
+
+# (pid, name) for every running process
+def RunningProcesses():
+    import psutil
+    return [(p.info["pid"], p.info["name"]) for p in psutil.process_iter(["pid", "name"])]
+
+
+# True for a process the current user started: services and other users' processes are never closed
+def UserProcess(pid):
+    import psutil
+    try:
+        if pid == os.getpid():
+            return False
+        return psutil.Process(pid).username() == psutil.Process().username()
+    except psutil.Error:
+        return False
+
+
+# Shared index used by Automation
+Apps = AppIndex()
+
+
+# --- Benchmark: resolution latency over a fixture app list ---
+if __name__ == "__main__":
+    import random
+
+    words = ["studio", "office", "media", "player", "photo", "editor", "cloud", "sync", "manager", "visual",
+             "code", "music", "video", "notes", "mail", "chat", "browser", "paint", "design", "terminal"]
+    random.seed(7)
+    fixture = sorted({" ".join(random.sample(words, 2)) + f" {i}" for i in range(600)})
+    fixture += ["google chrome", "visual studio code", "notepad", "spotify", "microsoft word", "telegram desktop"]
+
+    index = AppIndex(index_file=os.path.join("Data", "AppIndex.bench.json"))
+    start = perf_counter()
+    index.RefreshApps(fixture)
+    index.RefreshProcesses([(i, f"proc{i}.exe") for i in range(300)] + [(9001, "chrome.exe"), (9002, "notepad.exe")])
+    print(f"Built index: {len(index.apps)} apps, {len(index.processes)} processes in {(perf_counter() - start) * 1000:.1f} ms")
+
+    def typo(name):
+        if len(name) < 4:
+            return name
+        i = random.randrange(1, len(name) - 1)
+        return name[:i] + name[i + 1:]
+
+    queries = [typo(random.choice(fixture)) for _ in range(5000)] + ["chrome", "vs code", "facebook", "close me"] * 50
+    timings = []
+    for query in queries:
+        start = perf_counter()
+        index.ResolveApp(query) or index.ResolveWeb(query)
+        index.ResolveProcess(query)
+        timings.append(perf_counter() - start)
+    timings.sort()
+    print(f"Resolve: mean {sum(timings) / len(timings) * 1e6:.1f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us, max {timings[-1] * 1e6:.1f} us over {len(queries)} queries")
+    print("Examples:", {q: index.ResolveApp(q) or index.ResolveWeb(q) for q in ["chrome", "vs code", "notpad", "facebook", "spotfy"]})
@@ -5,28 +5,26 @@ from AppOpener import close, open as appopen  # Import functions to open and clo
 from webbrowser import open as webopen  # Import web browser functionality.
 from pywhatkit import search, playonyt  # Import functions for Google search and YouTube playback.
 from dotenv import dotenv_values  # Import dotenv to manage environment variables.
-from bs4 import BeautifulSoup  # Import BeautifulSoup for parsing HTML content.
 from rich import print  # Import rich for styled console output.
-from groq import Groq  # Import Groq for AI chat functionalities.
+import LLM  # Import the LLM gateway for AI chat functionalities.
+import Tracing  # Import Tracing for per-turn latency spans.
 import webbrowser  # Import webbrowser for opening URLs.
 import subprocess  # Import subprocess for interacting with the system.
 import requests  # Import requests for making HTTP requests.
 import keyboard  # Import keyboard for keyboard-related actions.
+import psutil  # Import psutil to close apps by process id.
 import asyncio  # Import asyncio for asynchronous programming.
 import os  # Import os for operating system functionalities.
+from AppIndex import Apps  # Prebuilt app/web/process index for OpenApp and CloseApp.
+from Reminders import Scheduler  # Persistent reminder scheduler.
+import Retrieval  # Local search index; written content becomes searchable by the chatbot.
 
 # Load environment variables from the .env file.
 env_vars = dotenv_values(".env")
-GroqAPIKey = env_vars.get("GroqAPIKey")  # Retrieve the Groq API Key.
+ContentEditor = env_vars.get("ContentEditor", "notepad.exe")  # Editor that opens generated content.
 
-# Define specific CSS classes for parsing HTML content.
-classes = ["zCubwf", "hgKElc", "LTKOO sY7ric", "Z0LcW", "gsrt vk_bk FzwWb YwPhnf", "pclqee", "tw-Data-text tw-text-small tw-ta", "IZ6rdc", "O5uR6d LTKOO", "vlzY6ch", "webanswers-webanswers_table__webanswers-table", "dDoNo ikb4Bb gsrt", "sXLaOe", "LWkfKe", "VQF4g", "QV3WPe", "kno-rdesc", "SPZz6b"]
-
-# Define a useragent for making web requests.
-useragent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.75 Safari/537.36'
-
-# Initialize the Groq client with the API Key.
-client = Groq(api_key=GroqAPIKey)
+# Build the application index in the background so the first command doesn't wait for it.
+Apps.Start()
 
 # Predefined professional responses for user interactions.
 professional_responses = [
@@ -34,8 +32,14 @@ professional_responses = [
     "I'm at your service for any additional questions or support you may need-don't hesitate to ask.",
 ]
 
-# List to store chatbot messages.
-messages = []
+# Each content topic gets its own context; the prompt is capped so one request can't grow unbounded.
+MaxContentPromptChars = 2000
+
+# Characters written before the file is flushed and the editor is opened.
+FirstFlushChars = 200
+
+# Commands of one request that run at the same time (provider calls are limited separately, per provider).
+MaxParallelTasks = int(env_vars.get("AutomationConcurrency") or 4)
 
 # System message to provide context to the chatbot.
 SystemChatBot = [{"role": "system", "content": f"Hello, I am {os.environ.get('Username', 'User')}, You're a content writer. You have to write content like letters, codes, applications, essays, notes, songs, poems etc."}]
@@ -47,48 +51,54 @@ def GoogleSearch(Topic):
 def GoogleSearch(Topic):
     search(Topic)  # Use pywhatkit's search function to perform a Google search.
     return True  # Indicate success.  # Example call to search for Python programming tutorials.
-# Function to generate content using AI and save it to a file.
+# Function to generate content using AI and stream it into a file.
 def Content(Topic):
 
     # Nested function to open a file in Notepad.
     def OpenNotepad(File):
-        default_text_editor = 'notepad.exe'  # Default text editor.
-        subprocess.Popen([default_text_editor, File])  # Open the file in Notepad.
+        if ContentEditor:  # An empty ContentEditor in .env just writes the file.
+            subprocess.Popen([ContentEditor, File])  # Open the file in the editor.
 
-    # Nested function to generate content using the AI chatbot.
-    def ContentWriterAI(prompt):
-        messages.append({"role": "user", "content": f"{prompt}"})  # Add the user's prompt to messages.
+    # Nested function to stream content from the AI chatbot straight into the file.
+    def ContentWriterAI(prompt, File):
+        # Isolated, bounded context: system prompt plus this topic only (no earlier essays)
+        context = SystemChatBot + [{"role": "user", "content": prompt[:MaxContentPromptChars]}]
 
-        completion = client.chat.completions.create(
+        # The gateway applies the shared Groq limit, so several content tasks can run at once.
+        completion = LLM.Stream(
+            context,  # Include system instructions and this topic.
             model="llama-3.3-70b-versatile", # Specify the AI model.
-            messages=SystemChatBot + messages,  # Include system instructions and chat history.
             max_tokens=2048,  # Limit the maximum tokens in the response.
             temperature=0.7,  # Adjust response randomness.
             top_p=1,  # Control the cumulative probability for response diversity.
-            stream=True,  # Enable streaming response.
             stop=None  # Allow the model to determine stopping conditions.
         )
 
-        Answer = ""  # Initialize an empty string for the response.
-
-        # Process streamed response chunks.
-        for chunk in completion:
-            if chunk.choices[0].delta.content:  # Check for content in the current chunk.
-                Answer += chunk.choices[0].delta.content  # Append the content to the answer.
+        written = 0
+        opened = False
 
-        Answer = Answer.replace("</s>", "")  # Remove unwanted tokens from the response.
-        messages.append({"role": "assistant", "content": Answer})  # Add the AI's response to messages.
-        return Answer
+        with open(File, "w", encoding="utf-8") as file:
+            # Write streamed chunks as they arrive.
+            for text in completion:
+                text = text.replace("</s>", "")  # Remove unwanted tokens from the response.
+                file.write(text)
+                written += len(text)
 
-    Topic = Topic.replace("Content ", "")  # Remove "Content " from the topic.
-    ContentByAI = ContentWriterAI(Topic)  # Generate content using AI.
+                # Open the editor once the first part of the content is on disk.
+                if not opened and written >= FirstFlushChars:
+                    file.flush()
+                    OpenNotepad(File)
+                    opened = True
 
-    # Save the generated content to a text file.
-    with open(rf"Data\{Topic.lower().replace(' ','')}.txt", "w", encoding="utf-8") as file:
-        file.write(ContentByAI)  # Write the content to the file.
-        file.close()
+        if not opened:
+            OpenNotepad(File)  # Short content: open it once it's complete.
+        return written
 
-    OpenNotepad(rf"Data\{Topic.lower().replace(' ','')}.txt")  # Open the file in Notepad.
+    Topic = Topic.replace("Content ", "")  # Remove "Content " from the topic.
+    File = rf"Data\{Topic.lower().replace(' ','')}.txt"
+    ContentWriterAI(Topic, File)  # Generate content into the file.
+    Retrieval.Index.AddFile(File)  # Index it so later questions can draw on it.
+    Retrieval.Index.Save()
     return True  # Indicate success.
 
  # Example call to generate sample content.
@@ -106,30 +116,32 @@ def PlayYoutube(query):
  # Example call to play a song.
 # Function to open an application or a relevant webpage.
 def OpenApp(app, sess=requests.session()):
+    # Step 1: Resolve the spoken name against the prebuilt index (no rescan of installed apps)
+    name = Apps.ResolveApp(app) if Apps.ready.is_set() else None
     try:
-        # Step 1: Try to open Desktop App (Ex: Notepad, Chrome)
-        appopen(app, match_closest=True, output=True, throw_error=True)
-        return True
-    
+        if name:
+            appopen(name, match_closest=False, output=True, throw_error=True)
+            return True
+        if not Apps.ready.is_set():
+            # Index still building: let AppOpener do its own closest match this once
+            appopen(app, match_closest=True, output=True, throw_error=True)
+            return True
     except:
-        # Step 2: Agar App PC mein nahi hai, to Web Link dhundo aur open karo
-        print(f"App not installed locally. Opening official website for: {app}")
-        
-        try:
-            # Googlesearch library use karke sirf PEHLA link nikalo
-            # 'num_results=1' ka matlab sirf top link chahiye
-            for url in gsearch(f"{app} official website", num_results=1):
-                print(f"Opening Website: {url}")
-                webopen(url) # Direct link open hoga (Ex: canva.com)
-                return True
-        except Exception as e:
-            print(f"Search failed: {e}")
-            
-        # Step 3: Ultimate Fallback (DuckDuckGo 'I'm Feeling Lucky')
-        # Agar upar wala fail ho jaye, to ye link seedha pehli website kholta hai
-        backup_url = f"https://duckduckgo.com/?q=!ducky+{app}"
-        webopen(backup_url)
+        pass
+
+    # Step 2: Agar App PC mein nahi hai, to known web app ka link open karo
+    print(f"App not installed locally. Opening official website for: {app}")
+    url = Apps.ResolveWeb(app)
+    if url:
+        print(f"Opening Website: {url}")
+        webopen(url)
         return True
+
+    # Step 3: Ultimate Fallback (DuckDuckGo 'I'm Feeling Lucky')
+    # Ye link seedha pehli website kholta hai
+    backup_url = f"https://duckduckgo.com/?q=!ducky+{app}"
+    webopen(backup_url)
+    return True
  # Example call to open Facebook.
  # Example call to open Google Chrome.
 # Function to close an application.
@@ -138,6 +150,20 @@ def CloseApp(app):
     if "chrome" in app:
         pass # Skip if the app is Chrome.
     else:
+        # Close by pid from the running-process index when we can resolve the name
+        name, pids = Apps.ResolveProcess(app)
+        if pids:
+            closed = False
+            for pid in pids:
+                try:
+                    psutil.Process(pid).terminate()
+                    closed = True
+                except psutil.Error:
+                    pass
+            if closed:
+                print(f"Closed {name}")
+                return True
+
         try:
             close(app, match_closest=True, output=True, throw_error=True)  # Attempt to close the app.
             return True  # Indicate success.
@@ -177,12 +203,29 @@ def System(command):
 
     return True  # Indicate success.
 
+# Function to schedule a reminder from router text like "9:00pm 25th june business meeting".
+def Reminder(text):
+    try:
+        reminder = Scheduler.AddFromText(text)
+    except ValueError as e:
+        print(f"Could not set reminder: {e}")
+        return False
+    print(f"Reminder set for {reminder.When()}: {reminder.message}")
+    return True
+
 # Asynchronous function to translate and execute user commands.
 async def TranslateAndExecute(commands: list[str]):
 
     funcs = []  # List to store asynchronous tasks.
+    limit = asyncio.Semaphore(MaxParallelTasks)  # Bound the worker threads one command list can take.
+
+    async def run(span_name, func, *args):
+        async with limit:
+            return await asyncio.to_thread(Tracing.Traced(span_name)(func), *args)  # Each task gets its own span.
 
     for command in commands:
+        span_name = "automation." + command.split(" ")[0]  # e.g. automation.open, automation.content
+        to_thread = lambda func, *args: run(span_name, func, *args)
 
         if command.startswith("open "):  # Handle "open" commands.
             
@@ -193,7 +236,7 @@ async def TranslateAndExecute(commands: list[str]):
                 pass
 
             else:
-                fun = asyncio.to_thread(OpenApp, command.removeprefix("open ")) # Schedule app opening.
+                fun = to_thread(OpenApp, command.removeprefix("open ")) # Schedule app opening.
                 funcs.append(fun)
 
         elif command.startswith("general "):  # Placeholder for general commands.
@@ -203,27 +246,31 @@ async def TranslateAndExecute(commands: list[str]):
             pass
 
         elif command.startswith("close "):  # Handle "close" commands.
-            fun = asyncio.to_thread(CloseApp, command.removeprefix("close "))  # Schedule app closing.
+            fun = to_thread(CloseApp, command.removeprefix("close "))  # Schedule app closing.
             funcs.append(fun)
 
         elif command.startswith("play "):  # Handle "play" commands.
-            fun = asyncio.to_thread(PlayYoutube, command.removeprefix("play "))  # Schedule YouTube playback.
+            fun = to_thread(PlayYoutube, command.removeprefix("play "))  # Schedule YouTube playback.
             funcs.append(fun)
 
         elif command.startswith("content "):  # Handle "content" commands.
-            fun = asyncio.to_thread(Content, command.removeprefix("content "))  # Schedule content creation.
+            fun = to_thread(Content, command.removeprefix("content "))  # Schedule content creation.
             funcs.append(fun)
 
         elif command.startswith("google search "):  # Handle Google search commands.
-            fun = asyncio.to_thread(GoogleSearch, command.removeprefix("google search "))  # Schedule Google search.
+            fun = to_thread(GoogleSearch, command.removeprefix("google search "))  # Schedule Google search.
             funcs.append(fun)
 
         elif command.startswith("youtube search "):  # Handle YouTube search commands.
-            fun = asyncio.to_thread(YouTubeSearch, command.removeprefix("youtube search "))  # Schedule YouTube search.
+            fun = to_thread(YouTubeSearch, command.removeprefix("youtube search "))  # Schedule YouTube search.
             funcs.append(fun)
 
         elif command.startswith("system "):  # Handle system commands.
-            fun = asyncio.to_thread(System, command.removeprefix("system "))  # Schedule system command.
+            fun = to_thread(System, command.removeprefix("system "))  # Schedule system command.
+            funcs.append(fun)
+
+        elif command.startswith("reminder "):  # Handle reminder commands.
+            fun = to_thread(Reminder, command.removeprefix("reminder "))  # Schedule the reminder.
             funcs.append(fun)
 
         else:
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import dotenv_values
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+# Threads available to blocking SDK calls (Groq, Cohere, Serper, pygame, selenium ...)
+BackendWorkers = int(env_vars.get("BackendWorkers") or 8)
+
+
+class BackendLoop:
+    """One long-lived asyncio event loop on its own thread.
+
+    The GUI submits coroutines to it thread-safely instead of starting a thread
+    and an asyncio.run() per query. Blocking calls made with asyncio.to_thread
+    run on the loop's default executor, which is capped at `workers` threads.
+    """
+
+    def __init__(self, workers=BackendWorkers):
+        self.workers = workers
+        self.loop = None
+        self.executor = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def Start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="BackendLoop", daemon=True)
+                self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="BackendWorker")
+        self.loop.set_default_executor(self.executor)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def Submit(self, coro):
+        """Schedule a coroutine from any thread; returns a concurrent.futures.Future.
+
+        The coroutine runs as a task with a copy of the caller's contextvars.
+        """
+        self.Start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def Run(self, coro, timeout=None):
+        """Submit a coroutine and block until its result (not from the loop thread itself)."""
+        return self.Submit(coro).result(timeout)
+
+    def Stop(self):
+        with self._lock:
+            if self._thread is None:
+                return
+            thread, self._thread = self._thread, None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        thread.join(5)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._ready.clear()
+
+
+# Shared loop used by the GUI
+Loop = BackendLoop()
+
+
+def Submit(coro):
+    return Loop.Submit(coro)
+
+
+def Run(coro, timeout=None):
+    return Loop.Run(coro, timeout)
+
+
+async def Iterate(generator_function, *args, **kwargs):
+    """Async iterator over a blocking generator, which runs on the executor (with the caller's contextvars).
+
+    Items are handed over as soon as they are produced. If the consumer stops early,
+    the generator is closed after its current item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def pump():
+        generator = generator_function(*args, **kwargs)
+        try:
+            for item in generator:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+                if stop.is_set():
+                    break
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            generator.close()
+
+    worker = asyncio.ensure_future(asyncio.to_thread(pump))
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+        await worker
+    finally:
+        stop.set()
+
+
+# Keep a reference to fire-and-forget tasks until they finish (the loop only holds weak ones)
+_background = set()
+
+
+def Background(coro):
+    """Start a coroutine as a task on the running loop without awaiting it."""
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+# --- Benchmark: per-turn overhead and thread count, thread-per-query + asyncio.run vs one loop ---
+if __name__ == "__main__":
+    from time import perf_counter, sleep
+
+    Turns = 2000
+    TaskDelay = 0.005  # Stand-in for an automation task awaiting I/O
+
+    async def task():
+        await asyncio.sleep(TaskDelay)
+
+    async def blocking_task():
+        await asyncio.to_thread(sleep, TaskDelay)
+
+    def measure(label, start_turn, wait):
+        peak = threading.active_count()
+        started = perf_counter()
+        handles = []
+        for _ in range(Turns):
+            handles.append(start_turn())
+            peak = max(peak, threading.active_count())
+        for handle in handles:
+            wait(handle)
+            peak = max(peak, threading.active_count())
+        elapsed = perf_counter() - started
+        print(f"{label:<34} {elapsed / Turns * 1e6:8.0f} us/turn   peak threads {peak}")
+
+    def old_turn(coro_func):
+        thread = threading.Thread(target=lambda: asyncio.run(coro_func()), daemon=True)
+        thread.start()
+        return thread
+
+    measure("thread + asyncio.run (async)", lambda: old_turn(task), lambda t: t.join())
+    measure("thread + asyncio.run (blocking)", lambda: old_turn(blocking_task), lambda t: t.join())
+    Loop.Start()
+    measure("backend loop (async)", lambda: Submit(task()), lambda f: f.result())
+    measure("backend loop (blocking)", lambda: Submit(blocking_task()), lambda f: f.result())
+    Loop.Stop()
@@ -0,0 +1,240 @@
+"""Batch runner: push a JSONL file of queries through the pipeline without the GUI.
+
+Run from the project root:
+
+    python Backend/Batch.py queries.jsonl -o results.jsonl -c 16
+    python Backend/Batch.py queries.jsonl -o results.jsonl --stand-ins      # against local stand-in servers
+
+Each input line is {"id": ..., "query": ...} (or just a JSON string). Every query is one
+turn: the router, then each routed task (chat, realtime search, image, content ...), like
+a server /turn. Queries run `--concurrency` at a time, each in its own session so their
+conversations don't mix, under the shared per-provider limiters (RateLimit.py).
+
+Results are appended to the output file as each query finishes and double as the
+checkpoint: run the same command again and ids already in the output are skipped.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+from time import perf_counter, time
+
+import BackendLoop
+import Cancellation
+import Sessions
+import Tracing
+from Benchmark import Percentile
+
+
+def ReadQueries(path):
+    """Yield (id, query) per line; lines without an id are numbered by line."""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            yield str(item.get("id", number)), item["query"]
+
+
+def Completed(path):
+    """Ids already in the output file (a torn last line from a killed run is ignored)."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(str(json.loads(line)["id"]))
+                except (ValueError, KeyError):
+                    continue
+    return done
+
+
+class BatchRunner:
+    def __init__(self, output, concurrency=16, fsync_every=50):
+        from Server import AssistantServer
+        self.pipeline = AssistantServer()  # Only its Turn() is used: the same pipeline as a server /turn
+        self.output = output
+        self.concurrency = concurrency
+        self.fsync_every = fsync_every
+        self.latencies = []
+        self.failed = 0
+        self._written = 0
+
+    async def Run(self, queries, skip=()):
+        jobs = asyncio.Queue(maxsize=self.concurrency * 2)  # Read the input lazily, however large it is
+        started = perf_counter()
+        with open(self.output, "a", encoding="utf-8") as out:
+            async def worker():
+                while True:
+                    job = await jobs.get()
+                    if job is None:
+                        return
+                    record = await self.RunOne(*job)
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    self._written += 1
+                    if self._written % self.fsync_every == 0:
+                        os.fsync(out.fileno())
+                    self.Progress(started)
+
+            workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+            try:
+                for query_id, query in queries:
+                    if query_id not in skip:
+                        await jobs.put((query_id, query))
+                for _ in workers:
+                    await jobs.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+                out.flush()
+                os.fsync(out.fileno())
+        return perf_counter() - started
+
+    async def RunOne(self, query_id, query):
+        record = {"id": query_id, "query": query, "tasks": [], "answers": {}, "images": [], "executed": [], "errors": []}
+        start = perf_counter()
+        with Sessions.Scope(Sessions.Session()), Cancellation.Scope(Cancellation.CancelToken("batch")), \
+                Tracing.StartTrace("batch", query=query) as root:
+            try:
+                async for event in self.pipeline.Turn(query):
+                    kind = event["type"]
+                    if kind == "task":
+                        record["tasks"].append(event["task"])
+                    elif kind == "answer":
+                        record["answers"][event["task"]] = event["text"]
+                    elif kind == "image":
+                        record["images"].append(event["path"])
+                    elif kind == "executed":
+                        record["executed"].append(event["task"])
+                    elif kind == "error":
+                        record["errors"].append(event["message"])
+            except Exception as e:
+                record["errors"].append(repr(e))
+            record["first_task_ms"] = next((s.attrs.get("first_task_ms") for s in root.trace.spans
+                                            if s.name == "router" and "first_task_ms" in s.attrs), None)
+        record["latency_ms"] = round((perf_counter() - start) * 1000, 1)
+        record["finished_at"] = time()
+        self.latencies.append(record["latency_ms"] / 1000)
+        if record["errors"]:
+            self.failed += 1
+        return record
+
+    def Progress(self, started):
+        done = len(self.latencies)
+        if done % 100 == 0:
+            elapsed = perf_counter() - started
+            print(f"  {done} done, {done / elapsed:.1f} queries/s, p95 {Percentile(self.latencies, 95) * 1000:.0f} ms",
+                  file=sys.stderr)
+
+    def Report(self, elapsed):
+        done = len(self.latencies)
+        print(f"\n{done} queries in {elapsed:.1f} s: {done / elapsed if elapsed else 0:.1f} queries/s, {self.failed} with errors")
+        if done:
+            print("latency ms  " + "  ".join(f"p{q} {Percentile(self.latencies, q) * 1000:.0f}" for q in (50, 95, 99))
+                  + f"  max {max(self.latencies) * 1000:.0f}")
+        import RateLimit
+        for name, limiter in sorted(RateLimit.Limiters.items()):
+            print(f"  {name:<13} {limiter.bucket.rate * 60:>8.0f} rpm  concurrency {limiter.concurrency}")
+        import LocalAnswers
+        local = LocalAnswers.Engine.AsDict()
+        print(f"  answered locally {local['hits']}/{local['queries']} general questions ({local['hit_rate'] * 100:.0f}%)")
+        import Tiering
+        for tier, stats in Tiering.Stats.AsDict().items():
+            print(f"  {tier:<6} tier {stats['count']:>6} chat answers  p50 {stats['latency_p50'] * 1000:.0f} ms"
+                  f"  p95 {stats['latency_p95'] * 1000:.0f} ms  ~${stats['cost_usd']:.4f}  at the token cap {stats['capped']}")
+
+
+def StartStandIns(args):
+    """Point every provider at local stand-ins and work in a temporary directory; returns the servers."""
+    import tempfile
+    from StandIns import StandInServer, Behaviour, RouterResponder
+
+    def behaviour(ttft, seed):
+        return Behaviour(ttft=ttft, jitter=0.3, token_rate=args.token_rate, tokens=args.tokens, seed=seed)
+
+    servers = {
+        "groq": StandInServer(behaviour(args.llm_ttft, 1)).Start(),
+        "cohere": StandInServer(behaviour(0.15, 2), responder=RouterResponder).Start(),
+        "serper": StandInServer(behaviour(0.2, 3)).Start(),
+        "image": StandInServer(behaviour(0.5, 4)).Start(),
+    }
+    workdir = tempfile.mkdtemp(prefix="jarvis-batch-")
+    os.makedirs(os.path.join(workdir, "Data"), exist_ok=True)
+    os.chdir(workdir)  # Backend modules read and write Data/ relative to the working directory
+
+    import LLM
+    LLM.RegisterProvider("groq", LLM.OpenAICompatibleProvider(servers["groq"].url + "/v1"))
+    LLM.RegisterProvider("cohere", LLM.OpenAICompatibleProvider(servers["cohere"].url + "/v1"))
+    import SearchProviders
+    import ImageGeneration
+    SearchProviders.SerperURL = servers["serper"].url + "/search"
+    SearchProviders.HTMLSearchURL = servers["serper"].url + "/html"
+    ImageGeneration.ImageAPIURL = servers["image"].url
+    try:
+        import Automation
+        Automation.ContentEditor = None  # Write content files without launching an editor
+    except Exception:
+        pass
+    return servers
+
+
+def Main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of queries through the pipeline")
+    parser.add_argument("input", help="JSONL queries: {\"id\": ..., \"query\": ...} per line")
+    parser.add_argument("-o", "--output", help="JSONL results, also the resume checkpoint (default <input>.results.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="queries in flight at once")
+    parser.add_argument("--limit", action="append", default=[], metavar="PROVIDER=RPM:CONCURRENCY",
+                        help="override a provider limit, e.g. groq=600:16 (default from .env)")
+    parser.add_argument("--restart", action="store_true", help="discard earlier results instead of resuming")
+    parser.add_argument("--cache", action="store_true", help="reuse cached answers for near-identical questions")
+    parser.add_argument("--stand-ins", action="store_true", help="run against local stand-in servers")
+    parser.add_argument("--llm-ttft", type=float, default=0.25, help="stand-ins: LLM time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=250.0, help="stand-ins: LLM tokens per second")
+    parser.add_argument("--tokens", type=int, default=80, help="stand-ins: tokens per LLM answer")
+    args = parser.parse_args()
+
+    # Resolve paths before the stand-ins move to a scratch directory
+    source = os.path.abspath(args.input)
+    output = os.path.abspath(args.output or os.path.splitext(args.input)[0] + ".results.jsonl")
+    if args.restart and os.path.exists(output):
+        os.remove(output)
+    skip = Completed(output)
+    if skip:
+        print(f"Resuming: {len(skip)} queries already in {output}")
+
+    servers = StartStandIns(args) if args.stand_ins else {}
+
+    import RateLimit
+    limits = dict(spec.split("=", 1) for spec in args.limit)
+    for provider in ("groq", "cohere", "serper", "pollinations"):
+        if provider in limits:
+            rpm, _, concurrency = limits[provider].partition(":")
+            RateLimit.Limiters[provider] = RateLimit.Limiter(provider, float(rpm), int(concurrency or args.concurrency))
+        elif args.stand_ins:
+            RateLimit.Limiters[provider] = RateLimit.Limiter(provider, 1e6, args.concurrency)  # Stand-ins have no quota
+
+    # Every in-flight query may hold a thread for its blocking provider call
+    BackendLoop.Loop.workers = max(BackendLoop.Loop.workers, args.concurrency)
+    BackendLoop.Loop.Start()
+    try:
+        runner = BatchRunner(output, args.concurrency)
+        runner.pipeline.Chatbot.Cache.enabled = args.cache
+        elapsed = BackendLoop.Run(runner.Run(ReadQueries(source), skip))
+        runner.Report(elapsed)
+        print(f"Results in {output}")
+    except KeyboardInterrupt:
+        print(f"\nStopped; run again to resume from {output}")
+    finally:
+        BackendLoop.Loop.Stop()
+        for server in servers.values():
+            server.Stop()
+
+
+if __name__ == "__main__":
+    Main()
@@ -0,0 +1,255 @@
+"""End-to-end latency benchmark against local stand-in servers.
+
+Run from the project root:
+
+    python Backend/Benchmark.py -n 50
+    python Backend/Benchmark.py -n 50 --compare Data/Benchmarks/<commit>.json
+    python Backend/Benchmark.py --soak -n 10000       # memory and latency drift over a long session
+
+Every backend module is pointed at StandIns servers with fixed, seeded
+latency so results are comparable across commits. The pipeline runs in a
+temporary working directory, so the real Data folder is never touched.
+"""
+import os
+import json
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter, time
+
+from StandIns import StandInServer, Behaviour, RouterResponder
+import Memory
+
+# Query mix: (query, stage the router stand-in sends it to)
+Queries = [
+    "what is python programming language?",
+    "how can i study more effectively?",
+    "who is the latest indian prime minister?",
+    "tell me today's news about technology",
+    "generate image of a lion in the jungle",
+    "write an application for sick leave",
+    "thanks, i really liked it",
+    "what is the price of gold?",
+]
+
+
+def Percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))]
+
+
+def Summarize(samples):
+    return {stage: {"count": len(values), "mean": sum(values) / len(values),
+                    "p50": Percentile(values, 50), "p95": Percentile(values, 95), "p99": Percentile(values, 99)}
+            for stage, values in samples.items() if values}
+
+
+def SoakReport(tracker):
+    """Growth over the soak run: RSS and latency from the first to the last sample, and where memory is held."""
+    samples = tracker.samples
+    report = {"samples": samples, "top_allocators": tracker.TopAllocators(10), "retained": dict(list(Memory.Retained().items())[:10])}
+    if len(samples) >= 2:
+        first, last = samples[0], samples[-1]
+        turns = (last["turn"] - first["turn"]) / 1000
+        report["rss_mb_per_1k_turns"] = (last["rss_mb"] - first["rss_mb"]) / turns
+        report["traced_mb_per_1k_turns"] = (last["traced_mb"] - first["traced_mb"]) / turns
+        report["p50_drift"] = last["p50_ms"] / first["p50_ms"]
+        print(f"\nFrom turn {first['turn']} to {last['turn']}: RSS {report['rss_mb_per_1k_turns']:+.2f} MB and traced "
+              f"{report['traced_mb_per_1k_turns']:+.2f} MB per 1k turns, turn p50 {first['p50_ms']:.1f} -> {last['p50_ms']:.1f} ms "
+              f"({report['p50_drift']:.2f}x)")
+    print("\nStill allocated since the start, by line:")
+    for where, size, count in report["top_allocators"]:
+        print(f"  {size / 1024:>9.1f} KiB {count:>+8} blocks  {where}")
+    print("\nLargest module-level containers:")
+    for name, count in report["retained"].items():
+        print(f"  {count:>8,}  {name}")
+    tracker.Stop()
+    return report
+
+
+def CommitId(root):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+class Pipeline:
+    """Runs one turn the way the GUI does (router, then each task), recording per-stage timings."""
+
+    def __init__(self, samples):
+        import LLM
+        import Model
+        import Chatbot
+        import RealtimeSearchEngine
+        import ImageGeneration
+        self.LLM, self.Model, self.Chatbot = LLM, Model, Chatbot
+        self.RealtimeSearchEngine, self.ImageGeneration = RealtimeSearchEngine, ImageGeneration
+        try:
+            import Automation
+            Automation.ContentEditor = None  # Write content files without launching an editor
+        except Exception as e:
+            print(f"Automation stage disabled (import failed: {e})")
+            Automation = None
+        self.Automation = Automation
+        self.samples = samples
+
+        # Time the Serper call on its own, inside RealtimeSearchEngine
+        search = RealtimeSearchEngine.GoogleSearch
+
+        def timed_search(query):
+            start = perf_counter()
+            try:
+                return search(query)
+            finally:
+                self.Record("search", perf_counter() - start)
+
+        RealtimeSearchEngine.GoogleSearch = timed_search
+
+    def Record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def Timed(self, stage, func, *args):
+        start = perf_counter()
+        try:
+            return func(*args)
+        except Exception as e:
+            self.Record(f"{stage}_error", perf_counter() - start)
+            print(f"{stage} failed: {e}")
+        finally:
+            self.Record(stage, perf_counter() - start)
+
+    def Turn(self, query):
+        import Tracing
+        with Tracing.StartTrace("turn", query=query):
+            self._turn(query)
+
+    def _turn(self, query):
+        import asyncio
+        start = perf_counter()
+        decision = self.Timed("router", self.Model.FirstLayerDMM, query) or []
+        for task in decision:
+            if task.startswith("general "):
+                self.Timed("general", self.Chatbot.ChatBot, task.removeprefix("general "))
+            elif task.startswith("realtime "):
+                self.Timed("realtime", self.RealtimeSearchEngine.RealtimeSearchEngine, task.removeprefix("realtime "))
+            elif task.startswith("generate image"):
+                self.Timed("image", self.ImageGeneration.GenerateImages, task.removeprefix("generate image").strip(), False)
+            elif task.startswith("content ") and self.Automation is not None:
+                self.Timed("automation", lambda t: asyncio.run(self.Automation.Automation([t])), task)
+        self.Record("total", perf_counter() - start)
+
+
+def Main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark with local stand-ins")
+    parser.add_argument("-n", "--turns", type=int, default=40, help="number of turns to run")
+    parser.add_argument("--llm-ttft", type=float, default=0.25, help="median LLM time to first token (s)")
+    parser.add_argument("--router-ttft", type=float, default=0.15, help="median router time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=250.0, help="LLM tokens per second")
+    parser.add_argument("--tokens", type=int, default=80, help="tokens per LLM answer")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="median Serper latency (s)")
+    parser.add_argument("--image-latency", type=float, default=0.5, help="median image generation latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="lognormal sigma applied to every latency")
+    parser.add_argument("--prefill-rate", type=float, help="LLM prompt tokens per second (default: prompt size is free)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache enabled")
+    parser.add_argument("--out", help="result file (default Data/Benchmarks/<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--soak", action="store_true", help="soak test: near-zero stand-in latency, memory and latency sampled as turns go by")
+    parser.add_argument("--sample-every", type=int, default=500, help="turns between soak samples")
+    if parser.parse_known_args()[0].soak:
+        # Many turns quickly: what grows is the app's own memory and per-turn work, not the stand-ins' latency
+        parser.set_defaults(turns=10000, llm_ttft=0.002, router_ttft=0.002, search_latency=0.002, image_latency=0.002,
+                            token_rate=50000.0, jitter=0.1)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def behaviour(ttft, seed):
+        return Behaviour(ttft=ttft, jitter=args.jitter, token_rate=args.token_rate, tokens=args.tokens,
+                         failure_rate=args.failure_rate, prefill_rate=args.prefill_rate, seed=seed)
+
+    servers = {
+        "groq": StandInServer(behaviour(args.llm_ttft, 1)).Start(),
+        "cohere": StandInServer(behaviour(args.router_ttft, 2), responder=RouterResponder).Start(),
+        "serper": StandInServer(behaviour(args.search_latency, 3)).Start(),
+        "image": StandInServer(behaviour(args.image_latency, 4)).Start(),
+    }
+
+    workdir = tempfile.mkdtemp(prefix="jarvis-bench-")
+    os.makedirs(os.path.join(workdir, "Data"), exist_ok=True)
+    os.chdir(workdir)  # Backend modules read and write Data/ relative to the working directory
+
+    import LLM
+    LLM.RegisterProvider("groq", LLM.OpenAICompatibleProvider(servers["groq"].url + "/v1"))
+    LLM.RegisterProvider("cohere", LLM.OpenAICompatibleProvider(servers["cohere"].url + "/v1"))
+    import RateLimit
+    for name in ("groq", "cohere", "serper", "html", "pollinations"):
+        RateLimit.Limiters[name] = RateLimit.Limiter(name, rpm=1e6, concurrency=64)  # Measure latency, not our own throttling
+
+    samples = {}
+    pipeline = Pipeline(samples)
+    import SearchProviders
+    SearchProviders.SerperURL = servers["serper"].url + "/search"
+    SearchProviders.HTMLSearchURL = servers["serper"].url + "/html"
+    pipeline.ImageGeneration.ImageAPIURL = servers["image"].url
+    pipeline.Chatbot.Cache.enabled = args.cache
+
+    tracker = Memory.MemoryTracker().Start() if args.soak else None
+    window = []
+    started = time()
+    for i in range(args.turns):
+        start = perf_counter()
+        pipeline.Turn(Queries[i % len(Queries)])
+        if tracker is not None:
+            window.append(perf_counter() - start)
+            if (i + 1) % args.sample_every == 0:
+                sample = tracker.Sample(turn=i + 1, p50_ms=Percentile(window, 50) * 1000, p95_ms=Percentile(window, 95) * 1000)
+                print(f"  {i + 1:>6} turns  RSS {sample['rss_mb']:6.1f} MB  traced {sample['traced_mb']:6.1f} MB  "
+                      f"retained {sample['retained']:>7,}  turn p50 {sample['p50_ms']:6.1f} ms  p95 {sample['p95_ms']:6.1f} ms")
+                window = []
+    elapsed = time() - started
+
+    samples["llm_ttft"] = [m.ttft for m in LLM.Metrics if m.ttft is not None and m.provider == "groq"]
+    samples["router_ttft"] = [m.ttft for m in LLM.Metrics if m.ttft is not None and m.provider == "cohere"]
+
+    result = {
+        "commit": CommitId(root),
+        "timestamp": started,
+        "turns": args.turns,
+        "elapsed": elapsed,
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "stages": Summarize(samples),
+    }
+
+    print(f"\n{'stage':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<14}{stats['count']:>7}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+
+    if tracker is not None:
+        result["soak"] = SoakReport(tracker)
+
+    out = args.out or os.path.join(root, "Data", "Benchmarks", f"{result['commit']}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4)
+    print(f"\nSaved {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline.get('commit')} (p95, negative is faster):")
+        for stage, stats in result["stages"].items():
+            before = baseline.get("stages", {}).get(stage)
+            if before:
+                delta = (stats["p95"] - before["p95"]) * 1000
+                print(f"  {stage:<14}{before['p95'] * 1000:>9.1f} -> {stats['p95'] * 1000:>9.1f} ms ({delta:+.1f})")
+
+    for server in servers.values():
+        server.Stop()
+
+
+if __name__ == "__main__":
+    Main()
@@ -0,0 +1,276 @@
+import socket
+import asyncio
+import threading
+import contextvars
+from time import perf_counter, sleep
+from contextlib import contextmanager
+
+
+class Cancelled(BaseException):
+    """Raised inside a cancelled turn.
+
+    Like asyncio.CancelledError it is not an Exception, so the backend's broad
+    `except Exception` fallbacks (and ChatBot's retry) let it through.
+    """
+
+
+class CancelToken:
+    """Cooperative cancellation for one turn. Work checks it between steps and registers
+    callbacks that release blocking resources (open sockets, audio) when it fires."""
+
+    def __init__(self, name="turn"):
+        self.name = name
+        self.reason = None
+        self.cancelled_at = None      # perf_counter() when Cancel() was called, for latency measurements
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def Cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.cancelled_at = perf_counter()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback error: {e}")
+        return True
+
+    def Check(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def Wait(self, timeout=None):
+        """Block until cancelled or timeout; True if cancelled."""
+        return self._event.wait(timeout)
+
+    def OnCancel(self, callback):
+        """Run callback once when cancelled (right away if already). Returns a function that unregisters it."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_current = contextvars.ContextVar("jarvis_cancel", default=None)
+
+
+# Make `token` the current token: `with Scope(token): ...`. Copied into threads by Tracing.Wrap,
+# asyncio.run and asyncio.to_thread, so backend modules find it without extra parameters.
+@contextmanager
+def Scope(token):
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def Current():
+    return _current.get()
+
+
+def Check():
+    token = _current.get()
+    if token is not None:
+        token.Check()
+
+
+def IsCancelled():
+    token = _current.get()
+    return token is not None and token.cancelled
+
+
+# time.sleep that wakes up (and raises Cancelled) as soon as the current turn is cancelled
+def Sleep(seconds):
+    token = _current.get()
+    if token is None:
+        sleep(seconds)
+    elif token.Wait(seconds):
+        raise Cancelled(token.reason)
+
+
+# Run `callback` if the current turn is cancelled while the block is running
+@contextmanager
+def Registered(callback):
+    token = _current.get()
+    remove = token.OnCancel(callback) if token is not None else (lambda: None)
+    try:
+        yield
+    finally:
+        remove()
+
+
+def AbortResponse(response):
+    """Shut down the socket under a streaming requests response, so a thread blocked reading it returns now."""
+    raw = response.raw
+    connection = getattr(raw, "_connection", None) or getattr(raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        # http.client hands the socket over to the response when the server closes the connection after it
+        socket_io = getattr(getattr(getattr(raw, "_fp", None), "fp", None), "raw", None)
+        sock = getattr(socket_io, "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def Request(method, url, session=None, stream=False, **kwargs):
+    """requests.request() that returns (raising Cancelled) as soon as the current turn is cancelled.
+
+    The request runs on a worker thread; if the turn is cancelled before the response arrives the
+    caller stops waiting immediately and the connection is dropped as soon as the headers come in,
+    so the body is never downloaded. With stream=True the caller reads the body itself and should
+    wrap that in `Registered(lambda: AbortResponse(response))`.
+    """
+    import requests
+
+    send = session.request if session is not None else requests.request
+    token = _current.get()
+    if token is None:
+        return send(method, url, stream=stream, **kwargs)
+    token.Check()
+
+    done = threading.Event()
+    result = {}
+
+    def run():
+        try:
+            response = send(method, url, stream=True, **kwargs)
+            if token.cancelled:
+                AbortResponse(response)
+                response.close()
+                return
+            if not stream:
+                response.content  # Read the body here, where blocking doesn't hold up cancellation
+            result["response"] = response
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            done.set()
+
+    remove = token.OnCancel(done.set)
+    try:
+        threading.Thread(target=run, name="CancellableRequest", daemon=True).start()
+        done.wait()
+        token.Check()
+        if "error" in result:
+            raise result["error"]
+        return result["response"]
+    finally:
+        remove()
+
+
+async def Guard(coro):
+    """Await a coroutine, cancelling its task when the current turn is cancelled."""
+    token = _current.get()
+    task = asyncio.ensure_future(coro)
+    if token is None:
+        return await task
+    loop = asyncio.get_running_loop()
+    remove = token.OnCancel(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if token.cancelled:
+            raise Cancelled(token.reason)
+        raise
+    finally:
+        remove()
+
+
+# --- Cancellation latency: time from Cancel() until the worker has unwound and the server connection is gone ---
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+    import Cancellation  # Use the module the backend imports, not this __main__ copy
+    from StandIns import StandInServer, Behaviour
+
+    os.chdir(tempfile.mkdtemp(prefix="jarvis-cancel-"))
+    import LLM
+    import RateLimit
+
+    llm = StandInServer(Behaviour(ttft=0.05, token_rate=20, tokens=400)).Start()        # Long, slow stream
+    slow = StandInServer(Behaviour(ttft=5.0, token_rate=20, tokens=400)).Start()        # Stuck before the first token
+    search = StandInServer(Behaviour(ttft=5.0)).Start()
+    LLM.RegisterProvider("stream", LLM.OpenAICompatibleProvider(llm.url + "/v1"))
+    LLM.RegisterProvider("stuck", LLM.OpenAICompatibleProvider(slow.url + "/v1"))
+    for name in ("stream", "stuck"):
+        RateLimit.Limiters[name] = RateLimit.Limiter(name, rpm=1e6, concurrency=64)
+
+    MaxUnwind = 0.1      # Seconds from Cancel() until the worker has returned
+    MaxRelease = 0.5     # ... and until the stand-in has seen the connection drop
+    failures = []
+
+    def measure(label, server, work, runs=20, cancel_after=0.3):
+        latencies, released = [], []
+        for _ in range(runs):
+            token = Cancellation.CancelToken()
+            finished = {}
+
+            def run():
+                with Cancellation.Scope(token):
+                    try:
+                        work()
+                        finished["outcome"] = "completed"
+                    except Cancellation.Cancelled:
+                        finished["outcome"] = "cancelled"
+                    except Exception as e:
+                        finished["outcome"] = repr(e)
+                finished["at"] = perf_counter()
+
+            worker = threading.Thread(target=run, daemon=True)
+            worker.start()
+            sleep(cancel_after)
+            token.Cancel("benchmark")
+            worker.join(10)
+            # Stand-ins only notice a dropped client when they next write, so this is measured mid-stream only
+            while server is not None and server.in_flight and perf_counter() - token.cancelled_at < 10:
+                sleep(0.001)
+            if finished.get("outcome") != "cancelled":
+                failures.append(f"{label}: {finished.get('outcome', 'still running')} instead of cancelled")
+                continue
+            latencies.append(finished["at"] - token.cancelled_at)
+            released.append(perf_counter() - token.cancelled_at)
+        if not latencies:
+            return
+        latencies.sort()
+        released.sort()
+        if latencies[-1] > MaxUnwind:
+            failures.append(f"{label}: unwound in {latencies[-1] * 1000:.0f} ms, over {MaxUnwind * 1000:.0f} ms")
+        if server is not None and released[-1] > MaxRelease:
+            failures.append(f"{label}: connection held {released[-1] * 1000:.0f} ms, over {MaxRelease * 1000:.0f} ms")
+        line = f"{label:<26} unwound p50 {latencies[len(latencies) // 2] * 1000:6.1f} ms  max {latencies[-1] * 1000:6.1f} ms"
+        if server is not None:
+            line += f"   server saw disconnect max {released[-1] * 1000:6.1f} ms"
+        print(line)
+
+    measure("LLM mid-stream", llm, lambda: LLM.Complete([{"role": "user", "content": "hi"}], provider="stream"))
+    measure("LLM before first token", None, lambda: LLM.Complete([{"role": "user", "content": "hi"}], provider="stuck"))
+    measure("search request", None, lambda: Cancellation.Request("POST", search.url + "/search", json={"q": "x"}))
+    measure("limiter wait", None, lambda: RateLimit.TokenBucket(0.1, 1).Acquire(2))
+    for server in (llm, slow, search):
+        server.Stop()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
@@ -1,6 +1,15 @@
-from groq import Groq
-from json import load, dump
+import Hedging
+import Tiering
+import LocalAnswers
+import Retrieval
+import atexit
+import asyncio
+import Tracing
+import Sessions
+from json import load, dump, JSONDecodeError
 import datetime
+from time import perf_counter
+from ResponseCache import Cache
 from dotenv import dotenv_values
 
 # Load environment variables from the .env file
@@ -9,10 +18,6 @@ env_vars = dotenv_values(".env")
 # Retrieve specific environment variables for username, assistant name, and API key
 Username = env_vars.get("Username")
 Assistantname = env_vars.get("Assistantname")
-GroqAPIKey = env_vars.get("GroqAPIKey")
-
-# Initialize the Groq client using the provided API key
-client = Groq(api_key=GroqAPIKey)
 
 # Initialize an empty list to store chat messages
 messages = []
@@ -38,6 +43,14 @@ except FileNotFoundError:
     with open(r"Data\ChatLog.json", "w") as f:
         dump([], f)
 
+# Load previously cached answers and save them again on exit
+Cache.Load()
+atexit.register(Cache.Save)
+
+# Index generated content, documents and past answers in the background; commit new passages on exit
+Retrieval.Index.Start()
+atexit.register(Retrieval.Index.Save)
+
 # Function to get real-time date and time information
 def RealtimeInformation():
     current_date_time = datetime.datetime.now() # Get the current date and time
@@ -62,53 +75,91 @@ def AnswerModifier(Answer):
     modified_answer = '\n'.join(non_empty_lines) # Join the cleaned lines back together
     return modified_answer
 
+# Streams the chatbot's answer as it is generated; the chat log is saved once it is complete
+@Tracing.Traced("chat")
+def ChatBotStream(Query):
+    # Load the existing chat log (the session's history when serving a client)
+    messages = Sessions.LoadChatLog()
+
+    # Append the user's query to the messages list
+    messages.append({"role": "user", "content": f"{Query}"})
+
+    # Deterministic questions (time, date, arithmetic, conversions, small talk) need no model call
+    Answer = LocalAnswers.Answer(Query)
+    if Answer is not None:
+        Tracing.Current().Set(local=True)
+        messages.append({"role": "assistant", "content": Answer})
+        Sessions.SaveChatLog(messages)
+        yield Answer
+        return
+
+    # Reuse the answer to a near-identical earlier question (time-sensitive queries are never cached)
+    with Tracing.Span("cache"):
+        Answer = Cache.Lookup(Query)
+    if Answer is not None:
+        messages.append({"role": "assistant", "content": Answer})
+        Sessions.SaveChatLog(messages)
+        yield Answer
+        return
+
+    # Simple turns go to the small model with a tight token cap, reasoning and long-form ones to the large model
+    tier = Tiering.Choose(Query)
+    Tracing.Current().Set(tier=tier.tier, complexity=round(tier.score, 2))
+
+    # Request a response through the LLM gateway (Groq), hedged with a smaller model if the first token is late
+    prompt = SystemChatBot + [{"role": "system", "content": RealtimeInformation()}] # Include system instructions and real-time info
+
+    # Passages from earlier answers, generated content and the user's documents that cover the question
+    with Tracing.Span("retrieval") as span:
+        notes = Retrieval.Index.Search(Query)
+        span.Set(passages=len(notes))
+    if notes:
+        prompt.append({"role": "system", "content": Retrieval.Prompt(notes)})
+    prompt += Sessions.Context(messages) # Include the recent chat history
+    chunks = []
+    start, ttft = perf_counter(), None
+    for text in Hedging.Stream(
+        prompt,
+        model=tier.model, # The tier's model
+        max_tokens=tier.max_tokens, # Limit the maximum tokens in the response
+        temperature=0.7, # Adjust response randomness (higher means more random)
+        top_p=1, # Use nucleus sampling to control diversity
+        stop=None # Allow the model to determine when to stop
+    ):
+        text = text.replace("</s>", "") # Clean up any unwanted tokens from the response
+        ttft = ttft if ttft is not None else perf_counter() - start
+        chunks.append(text)
+        yield text
+
+    Answer = "".join(chunks)
+    Tiering.Stats.Record(tier, perf_counter() - start, ttft, prompt, Answer)
+
+    # Append the chatbot's response to the messages list
+    messages.append({"role": "assistant", "content": Answer})
+    Cache.Add(Query, Answer)
+    if Sessions.Current() is None:
+        Retrieval.Index.AddAnswer(Query, Answer) # Other clients' sessions stay out of the shared index
+
+    # Save the updated chat log
+    Sessions.SaveChatLog(messages)
+
 # Main chatbot function to handle user queries
 def ChatBot(Query):
     """ This function sends the user's query to the chatbot and returns the AI's response. """
     try:
-        # Load the existing chat log from the JSON file
-        with open(r"Data\ChatLog.json", "r") as f:
-            messages = load(f)
-            
-        # Append the user's query to the messages list
-        messages.append({"role": "user", "content": f"{Query}"})
-
-        # Make a request to the Groq API for a response
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile", # Specify the AI model to use
-            messages=SystemChatBot + [{"role": "system", "content": RealtimeInformation()}] + messages, # Include system instructions, real-time info, and chat history
-            max_tokens=1024, # Limit the maximum tokens in the response
-            temperature=0.7, # Adjust response randomness (higher means more random)
-            top_p=1, # Use nucleus sampling to control diversity
-            stream=True, # Enable streaming response
-            stop=None # Allow the model to determine when to stop
-        )
-
-        Answer = "" # Initialize an empty string to store the AI's response
-
-        # Process the streamed response chunks
-        for chunk in completion:
-            if chunk.choices[0].delta.content: # Check if there's content in the current chunk
-                Answer += chunk.choices[0].delta.content # Append the content to the answer
-
-        Answer = Answer.replace("</s>", "") # Clean up any unwanted tokens from the response
-        
-        # Append the chatbot's response to the messages list
-        messages.append({"role": "assistant", "content": Answer})
-
-        # Save the updated chat log to the JSON file
-        with open(r"Data\ChatLog.json", "w") as f:
-            dump(messages, f, indent=4)
-
         # Return the formatted response
-        return AnswerModifier(Answer)
+        return AnswerModifier("".join(ChatBotStream(Query)))
 
-    except Exception as e:
-        # Handle errors by resetting the chat log
+    except JSONDecodeError as e:
+        # A corrupt chat log: start a fresh one and ask once more. Provider errors are not retried
+        # here; the LLM gateway already retried them with backoff, so they go to the caller.
         print(f"Error: {e}")
-        with open(r"Data\ChatLog.json", "w") as f:
-            dump([], f)
-        return ChatBot(Query) # Retry the query after resetting the log
+        Sessions.SaveChatLog([])
+        return AnswerModifier("".join(ChatBotStream(Query)))
+
+# Async version for the backend loop; the blocking Groq call runs on its bounded executor
+async def AChatBot(Query):
+    return await asyncio.to_thread(ChatBot, Query)
 
 if __name__ == "__main__":
     while True:
@@ -0,0 +1,218 @@
+class IntentTrie:
+    """Character trie over the router's intent keywords ("open", "generate image", ...)."""
+
+    def __init__(self, keywords):
+        self.root = {}
+        for keyword in keywords:
+            node = self.root
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[None] = keyword  # End of a keyword
+
+    def Match(self, text, final=False):
+        """Status of `text` as the start of a task.
+
+        Returns ("match", keyword) when text starts with a whole keyword followed by a
+        space or comma (or the end, once `final`), ("partial", None) when more characters
+        are needed to tell, and ("none", None) when no keyword can start this way.
+        """
+        node, best = self.root, None
+        for ch in text:
+            if None in node and ch in " ,":
+                best = node[None]  # Longest keyword so far that ends on a word boundary
+            node = node.get(ch)
+            if node is None:
+                return ("match", best) if best else ("none", None)
+        if best:
+            return "match", best
+        if None in node and final:
+            return "match", node[None]
+        return ("none", None) if final else ("partial", None)
+
+
+class StreamingDecisionParser:
+    """Splits the router's streamed decision into tasks as soon as each one is complete.
+
+    A comma ends a task only when the text after it starts with an intent keyword,
+    so arguments may contain commas ("content letter to john, the manager") and
+    numbers ("1,000"). Commas inside double quotes, parentheses or 'single-quoted'
+    arguments never split. A quote or parenthesis still open at the end of the stream
+    didn't group anything, so the decision is read again with it as a plain character.
+    Tasks that don't start with a keyword are dropped, like the old filter over `funcs`.
+    """
+
+    def __init__(self, keywords):
+        self.trie = keywords if isinstance(keywords, IntentTrie) else IntentTrie(keywords)
+        self.text = []         # Every character fed so far
+        self.plain = set()     # Offsets of quotes and parentheses found unclosed, read as plain characters
+        self.sent = 0          # Tasks returned by Feed()
+        self._reset()
+
+    def _reset(self):
+        self.current = []      # Characters of the task being read
+        self.after_comma = None  # Characters after a top-level comma that may start the next task
+        self.parens = []       # Offsets of the open parentheses
+        self.quote = None      # Open quote character
+        self.quote_at = 0      # Its offset
+
+    def _emit(self, text):
+        task = " ".join(text.split()).rstrip(" ,")  # A dangling comma isn't part of the argument ("open chrome,")
+        status, _ = self.trie.Match(task.lower(), final=True)
+        return task if task and status == "match" else None
+
+    def _resolve(self, final=False):
+        """Decide whether the text after the last comma starts a new task; returns a finished task or None."""
+        candidate = "".join(self.after_comma).lstrip().lower()
+        status, _ = self.trie.Match(candidate, final)
+        if status == "partial":
+            return None
+        if status == "match":
+            finished = self._emit("".join(self.current))
+            self.current = list("".join(self.after_comma).lstrip())
+            self.after_comma = None
+            return finished or ""
+        # Not a keyword: the comma belonged to the argument
+        self.current += [","] + self.after_comma
+        self.after_comma = None
+        return ""
+
+    def _read(self, start):
+        """Read self.text from offset `start` on; returns the tasks completed."""
+        tasks = []
+        for at in range(start, len(self.text)):
+            ch = self.text[at]
+            buffer = self.after_comma if self.after_comma is not None else self.current
+            if self.quote:
+                buffer.append(ch)
+                if ch == self.quote:
+                    self.quote = None
+                continue
+            if at in self.plain:
+                pass
+            elif ch == '"' or (ch == "'" and (not buffer or buffer[-1] == " ")):
+                self.quote, self.quote_at = ch, at
+            elif ch == "(":
+                self.parens.append(at)
+            elif ch == ")" and self.parens:
+                self.parens.pop()
+            elif ch == "," and not self.parens:
+                if self.after_comma is not None:
+                    finished = self._resolve(final=True)
+                    if finished:
+                        tasks.append(finished)
+                self.after_comma = []
+                continue
+            buffer.append(ch)
+            if self.after_comma is not None:
+                finished = self._resolve()
+                if finished:
+                    tasks.append(finished)
+        return tasks
+
+    def Feed(self, chunk):
+        """Consume streamed text; returns the tasks completed by it."""
+        start = len(self.text)
+        self.text += chunk.replace("\n", " ")
+        tasks = self._read(start)
+        self.sent += len(tasks)
+        return tasks
+
+    def Finish(self):
+        """End of stream: returns the remaining tasks."""
+        tasks = []
+        while self.quote or self.parens:
+            # Unclosed ("play 'song, close notepad", "what is f(x, open calculator"): read everything again with
+            # them as plain characters. Up to them nothing changes, so the tasks already sent come out first.
+            self.plain.update(self.parens + ([self.quote_at] if self.quote else []))
+            self._reset()
+            tasks = self._read(0)[self.sent:]
+        if self.after_comma is not None:
+            finished = self._resolve(final=True)
+            if finished:
+                tasks.append(finished)
+        last = self._emit("".join(self.current))
+        self.current = []
+        if last:
+            tasks.append(last)
+        return tasks
+
+
+def ParseDecision(text, keywords):
+    parser = StreamingDecisionParser(keywords)
+    return parser.Feed(text) + parser.Finish()
+
+
+# --- Correctness on split streams, and latency to the first task vs waiting for the whole decision ---
+if __name__ == "__main__":
+    import os
+    import sys
+    import random
+    import tempfile
+    from time import perf_counter
+
+    Keywords = ["exit", "general", "realtime", "open", "close", "play", "generate image", "system", "content",
+                "google search", "youtube search", "reminder"]
+    Cases = [
+        ("open chrome, open firefox", ["open chrome", "open firefox"]),
+        ("open chrome, general tell me about mahatma gandhi.", ["open chrome", "general tell me about mahatma gandhi."]),
+        ("content letter to john, the manager, play believer", ["content letter to john, the manager", "play believer"]),
+        ("general what is 1,000 plus 2,500?", ["general what is 1,000 plus 2,500?"]),
+        ('google search "rome, italy", youtube search pasta', ['google search "rome, italy"', "youtube search pasta"]),
+        ("general what's the time, reminder 11:00pm 5th aug dancing performance",
+         ["general what's the time", "reminder 11:00pm 5th aug dancing performance"]),
+        ("generate image of a cat, generate image of a dog", ["generate image of a cat", "generate image of a dog"]),
+        ("general who is he?, generalization is hard", ["general who is he?, generalization is hard"]),
+        ("system mute,\nopen youtube", ["system mute", "open youtube"]),
+        ("general what's up, open chrome, play 'song, close notepad",
+         ["general what's up", "open chrome", "play 'song", "close notepad"]),
+        ("play 'rock, paper, scissors', open \"notes, close it", ["play 'rock, paper, scissors'", 'open "notes', "close it"]),
+        ("general hi, 'oops, open chrome", ["general hi, 'oops", "open chrome"]),
+        ('general a, "b, open chrome', ['general a, "b', "open chrome"]),
+        ("general what is f(x, open calculator", ["general what is f(x", "open calculator"]),
+        ("general (a, 'b, open chrome, play (x", ["general (a, 'b", "open chrome", "play (x"]),
+        ("play (rock, paper), open 'notes, close (it", ["play (rock, paper)", "open 'notes", "close (it"]),
+        ("open chrome,", ["open chrome"]),
+        ("(query)", []),
+        ("exit", ["exit"]),
+    ]
+    failures = 0
+    rng = random.Random(7)
+    for text, expected in Cases:
+        for trial in range(50):
+            parser = StreamingDecisionParser(Keywords)
+            tasks, i = [], 0
+            while i < len(text):
+                step = rng.randint(1, 6)
+                tasks += parser.Feed(text[i:i + step])
+                i += step
+            tasks += parser.Finish()
+            if tasks != expected:
+                failures += 1
+                print(f"FAIL {text!r}: {tasks} != {expected}")
+                break
+    print(f"{len(Cases)} decisions x 50 random chunkings: {failures} failures")
+
+    from StandIns import StandInServer, Behaviour
+    decision = "open chrome, content letter to john, the manager about the new project deadline, play believer by imagine dragons"
+    router = StandInServer(Behaviour(ttft=0.15, token_rate=40), responder=lambda messages: decision).Start()
+    os.chdir(tempfile.mkdtemp(prefix="jarvis-parser-"))
+    import LLM
+    import Model
+    LLM.RegisterProvider("cohere", LLM.OpenAICompatibleProvider(router.url + "/v1"))
+
+    whole, first = [], []
+    for _ in range(10):
+        start = perf_counter()
+        Model.FirstLayerDMM("test")
+        whole.append(perf_counter() - start)
+        start = perf_counter()
+        for task in Model.FirstLayerDMMStream("test"):
+            first.append(perf_counter() - start)
+            break
+    whole.sort()
+    first.sort()
+    print(f"Time to first action: whole decision {whole[len(whole) // 2] * 1000:.0f} ms, "
+          f"streaming parser {first[len(first) // 2] * 1000:.0f} ms (p50 of 10)")
+    print("Tasks:", Model.FirstLayerDMM("test"))
+    router.Stop()
+    sys.exit(1 if failures else 0)
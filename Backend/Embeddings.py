@@ -0,0 +1,77 @@
+import re
+import zlib
+import threading
+import numpy as np
+
+# Words that carry no meaning for similarity
+StopWords = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "and", "or", "in", "on", "for", "with",
+    "me", "my", "i", "you", "your", "please", "can", "could", "would", "tell", "about", "do", "does", "did",
+}
+
+TokenPattern = re.compile(r"[a-z0-9]+")
+
+
+def Tokenize(text):
+    text = re.sub(r"['’]s\b", " is", text.lower())  # "what's" and "what is" should look the same
+    return [word for word in TokenPattern.findall(text) if word not in StopWords]
+
+
+class HashingVectorizer:
+    """Local TF-IDF embeddings with the hashing trick (word unigrams + bigrams), no vocabulary or network.
+
+    Document frequencies are learned incrementally with Fit(). Vectors are
+    L2-normalised so a dot product is the cosine similarity; TransformSparse()
+    returns (buckets, weights) for large `dim`, Transform() a dense vector.
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.df = np.zeros(dim, dtype=np.float32)
+        self.docs = 0
+        self._lock = threading.Lock()
+
+    def Features(self, text):
+        words = Tokenize(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _counts(self, text):
+        counts = {}
+        for feature in self.Features(text):
+            # crc32 is stable across runs (unlike hash()), so persisted vectors stay valid
+            h = zlib.crc32(feature.encode("utf-8"))
+            bucket = h % self.dim
+            counts[bucket] = counts.get(bucket, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        return counts
+
+    def Fit(self, text):
+        """Record one document's features for the IDF weights."""
+        buckets = [b for b, c in self._counts(text).items() if c]
+        with self._lock:
+            self.df[buckets] += 1
+            self.docs += 1
+
+    def Idf(self, buckets=None):
+        df = self.df if buckets is None else self.df[buckets]
+        return (np.log((1.0 + self.docs) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def TransformSparse(self, text):
+        counts = {b: c for b, c in self._counts(text).items() if c}
+        buckets = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        weights = np.sign(values) * np.log1p(np.abs(values)) * self.Idf(buckets)  # Sublinear TF x IDF
+        norm = np.linalg.norm(weights)
+        return buckets, (weights / norm if norm > 0 else weights)
+
+    def Transform(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        buckets, weights = self.TransformSparse(text)
+        vector[buckets] = weights
+        return vector
+
+    def TransformMany(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets, weights = self.TransformSparse(text)
+            matrix[row, buckets] = weights
+        return matrix
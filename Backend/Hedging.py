@@ -0,0 +1,217 @@
+import queue
+import threading
+from collections import deque
+from time import perf_counter
+from dotenv import dotenv_values
+import LLM
+import Tracing
+import Cancellation
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+# Second request sent when the first token is late ("off" disables hedging)
+HedgeModel = env_vars.get("HedgeModel") or "llama-3.1-8b-instant"
+HedgeProvider = env_vars.get("HedgeProvider")                          # Default: the primary's provider
+HedgePercentile = float(env_vars.get("HedgePercentile") or 95)         # Hedge once the wait passes this TTFT percentile
+HedgeMinDelay = float(env_vars.get("HedgeMinDelay") or 0.25)           # Never hedge sooner than this (s)
+HedgeDefaultDelay = float(env_vars.get("HedgeDefaultDelay") or 1.0)    # Until enough TTFTs have been seen (s)
+HedgeMinSamples = 20
+HedgeWindow = 200                                                      # Recent TTFTs kept per provider and model
+
+
+class Hedger:
+    """Sends a second request to a fallback model when the first token is late; the first stream to start wins.
+
+    The deadline is a percentile of recent time-to-first-token for that provider and model, so
+    only the slow tail gets hedged (about 100 - percentile % of calls). The losing stream is
+    cancelled, which closes its connection. A primary that fails before its first token
+    fails over to the fallback right away.
+    """
+
+    def __init__(self, model=HedgeModel, provider=HedgeProvider, percentile=HedgePercentile,
+                 min_delay=HedgeMinDelay, default_delay=HedgeDefaultDelay, min_samples=HedgeMinSamples, window=HedgeWindow):
+        self.model = None if (model or "").lower() in ("", "off", "none") else model
+        self.provider = provider
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.ttfts = {}  # (provider, model) -> recent TTFTs of primaries (lower bounds for the ones that lost)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_won = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def Deadline(self, provider, model):
+        with self._lock:
+            samples = sorted(self.ttfts.get((provider, model), ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100.0))
+        return max(self.min_delay, samples[index])
+
+    def _record(self, provider, model, ttft):
+        with self._lock:
+            self.ttfts.setdefault((provider, model), deque(maxlen=self.window)).append(ttft)
+
+    def Stream(self, messages, model=LLM.DefaultModel, provider="groq", **params):
+        """LLM.Stream(), hedged. Yields the text of whichever request started first."""
+        hedge_provider = self.provider or provider
+        if self.model is None or (self.model, hedge_provider) == (model, provider):
+            yield from LLM.Stream(messages, model, provider, **params)
+            return
+
+        events = queue.Queue()
+        tokens = {}
+        parent = Cancellation.Current()
+        start = perf_counter()
+
+        def launch(name, model, provider):
+            # Each attempt gets its own token, cancelled with the turn's, so the loser can be cancelled alone
+            token = tokens[name] = Cancellation.CancelToken(f"hedge {name}")
+            unlink = parent.OnCancel(lambda: token.Cancel(parent.reason)) if parent is not None else (lambda: None)
+
+            def run():
+                with Cancellation.Scope(token):
+                    try:
+                        for text in LLM.Stream(messages, model, provider, **params):
+                            events.put((name, "text", text))
+                        events.put((name, "end", None))
+                    except BaseException as e:
+                        events.put((name, "error", e))
+                    finally:
+                        unlink()
+
+            threading.Thread(target=Tracing.Wrap(run), name=f"Hedge-{name}", daemon=True).start()
+
+        with self._lock:
+            self.calls += 1
+        launch("primary", model, provider)
+        deadline = start + self.Deadline(provider, model)
+        winner = None
+        errors = {}
+        try:
+            while True:
+                waiting_to_hedge = winner is None and "hedge" not in tokens
+                timeout = max(0.0, min(0.05, deadline - perf_counter())) if waiting_to_hedge else 0.05
+                try:
+                    name, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    Cancellation.Check()
+                    if waiting_to_hedge and perf_counter() >= deadline:
+                        with self._lock:
+                            self.hedged += 1
+                        launch("hedge", self.model, hedge_provider)
+                    continue
+
+                if winner is not None and name != winner:
+                    continue  # Leftovers from the cancelled loser
+                if kind == "error":
+                    Cancellation.Check()
+                    errors[name] = payload
+                    if winner is not None:
+                        raise payload  # Failed mid-answer: nothing to fall back to without repeating text
+                    if "hedge" not in tokens:
+                        with self._lock:
+                            self.failovers += 1
+                        launch("hedge", self.model, hedge_provider)
+                    elif len(errors) == len(tokens):
+                        raise errors.get("primary", payload)
+                    continue
+
+                if winner is None:
+                    winner = name
+                    elapsed = perf_counter() - start
+                    # A primary that lost only tells us its TTFT was at least this long
+                    if "primary" not in errors:
+                        self._record(provider, model, elapsed)
+                    for other, token in tokens.items():
+                        if other != winner:
+                            token.Cancel("hedge lost")
+                    if winner == "hedge":
+                        with self._lock:
+                            self.hedge_won += 1
+                    span = Tracing.Current()
+                    if span is not None and "hedge" in tokens:
+                        span.Set(hedged=True, hedge_winner=winner)
+                if kind == "end":
+                    return
+                yield payload
+        finally:
+            for token in tokens.values():
+                token.Cancel("hedge finished")  # Stops the winner too if the caller stopped reading early
+
+    def AsDict(self):
+        with self._lock:
+            calls = self.calls or 1
+            return {"calls": self.calls, "hedged": self.hedged, "hedge_rate": self.hedged / calls,
+                    "hedge_won": self.hedge_won, "failovers": self.failovers}
+
+
+# Shared hedger used by Chatbot and RealtimeSearchEngine
+Hedge = Hedger()
+
+
+def Stream(messages, model=LLM.DefaultModel, provider="groq", **params):
+    return Hedge.Stream(messages, model, provider, **params)
+
+
+# --- Tail latency with and without hedging, against stand-ins with a slow tail ---
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import RateLimit
+    from StandIns import StandInServer, Behaviour
+
+    Calls = 400
+    Clients = 8
+
+    os.chdir(tempfile.mkdtemp(prefix="jarvis-hedge-"))
+    import SingleFlight
+    SingleFlight.Coalesce = False  # Independent clients that happen to send the same message: each call is measured
+    # 70b: lognormal TTFT around 250 ms, and 4% of requests stuck for 8x as long
+    primary = StandInServer(Behaviour(ttft=0.25, jitter=0.35, slow_rate=0.04, slow_factor=8, token_rate=400, tokens=40, seed=1)).Start()
+    fallback = StandInServer(Behaviour(ttft=0.12, jitter=0.2, token_rate=800, tokens=40, seed=2)).Start()
+    LLM.RegisterProvider("primary", LLM.OpenAICompatibleProvider(primary.url + "/v1"))
+    LLM.RegisterProvider("fallback", LLM.OpenAICompatibleProvider(fallback.url + "/v1"))
+    for name in ("primary", "fallback"):
+        RateLimit.Limiters[name] = RateLimit.Limiter(name, rpm=1e6, concurrency=64)
+
+    messages = [{"role": "user", "content": "hi"}]
+
+    def measure(label, stream):
+        def call(_):
+            start = perf_counter()
+            ttft = None
+            for _ in stream(messages, "large", "primary"):
+                if ttft is None:
+                    ttft = perf_counter() - start
+            return ttft, perf_counter() - start
+
+        with ThreadPoolExecutor(Clients) as pool:
+            results = list(pool.map(call, range(Calls)))
+        ttfts = sorted(r[0] for r in results)
+        totals = sorted(r[1] for r in results)
+        pick = lambda values, q: values[min(len(values) - 1, int(len(values) * q / 100.0))] * 1000
+        print(f"{label:<10} ttft p50 {pick(ttfts, 50):6.0f}  p95 {pick(ttfts, 95):6.0f}  p99 {pick(ttfts, 99):6.0f} ms   "
+              f"total p50 {pick(totals, 50):6.0f}  p99 {pick(totals, 99):6.0f} ms")
+        return pick(ttfts, 99)
+
+    plain = measure("plain", LLM.Stream)
+    hedger = Hedger(model="small", provider="fallback")
+    before = primary.requests + fallback.requests
+    hedged = measure("hedged", hedger.Stream)
+    sent = primary.requests + fallback.requests - before
+    stats = hedger.AsDict()
+    print(f"\nhedge rate {stats['hedge_rate'] * 100:.1f}% ({stats['hedged']} of {stats['calls']}), fallback won "
+          f"{stats['hedge_won']}, extra requests {(sent - Calls) / Calls * 100:.1f}%, deadline now "
+          f"{hedger.Deadline('primary', 'large') * 1000:.0f} ms")
+    print(f"ttft p99 {plain:.0f} -> {hedged:.0f} ms")
+    primary.Stop()
+    fallback.Stop()
+    sys.exit(0)
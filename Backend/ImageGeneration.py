@@ -1,10 +1,26 @@
 import asyncio
-import requests
 import os
+import sys
+import subprocess
 from time import sleep
 from random import randint
+from dotenv import dotenv_values
+import Tracing
+import RateLimit
+import SingleFlight
 
-# Function to open images (Windows specific)
+# Load environment variables (ImageAPIURL can point at a local stand-in server)
+env_vars = dotenv_values(".env")
+ImageAPIURL = env_vars.get("ImageAPIURL") or "https://image.pollinations.ai"
+
+# Open one image in the system viewer
+def open_image_file(image_path):
+    if hasattr(os, "startfile"):
+        os.startfile(image_path) # Windows me direct open karne ke liye best hai
+    else:
+        subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", image_path])
+
+# Function to open images
 def open_images(prompt):
     folder_path = r"Data"
     prompt = prompt.replace(" ", "_")
@@ -17,16 +33,26 @@ def open_images(prompt):
         try:
             if os.path.exists(image_path):
                 print(f"Opening image: {image_path}")
-                os.startfile(image_path) # Windows me direct open karne ke liye best hai
+                open_image_file(image_path)
                 sleep(1)
             else:
                 print(f"File not found: {image_path}")
         except IOError:
             print(f"Unable to open image: {image_path}")
 
+# The same prompt twice at once would pay for two images and race on Data/<prompt>.jpg: they share one
+Images = SingleFlight.GetGroup("image")
+
+# Returns the saved file path (or None) so the GUI gallery can show it inline
+async def generate_images(prompt: str, open_after: bool = True):
+    file_name = await Images.ADo(SingleFlight.Fingerprint(prompt), lambda: generate_image_file(prompt))
+    if file_name and open_after:
+        open_images(prompt)
+    return file_name
+
 # --- NEW API LOGIC (Pollinations AI) ---
 # Ye API free hai, fast hai, aur key nahi mangti
-async def generate_images(prompt: str):
+async def generate_image_file(prompt: str):
     print(f"Generating image for: {prompt}...")
     
     # Prompt ko URL safe banao
@@ -35,11 +61,12 @@ async def generate_images(prompt: str):
     # Pollinations AI URL (Direct Image Generation)
     # Seed add kiya taaki har baar alag image bane
     seed = randint(1, 10000)
-    url = f"https://image.pollinations.ai/prompt/{prompt_formatted}?width=1024&height=1024&seed={seed}&nologo=true"
+    url = f"{ImageAPIURL}/prompt/{prompt_formatted}?width=1024&height=1024&seed={seed}&nologo=true"
 
     try:
-        # Request bhejo (Sync request is fine here as it's fast)
-        response = requests.get(url)
+        # Request bhejo (worker thread me, taaki event loop block na ho)
+        with Tracing.Span("image.request"):
+            response = await asyncio.to_thread(RateLimit.Request, "pollinations", "GET", url)
         
         if response.status_code == 200:
             # Folder check
@@ -52,16 +79,24 @@ async def generate_images(prompt: str):
                 f.write(response.content)
             
             print(f"Image Saved: {file_name}")
-            open_images(prompt)
+            return file_name
         else:
             print(f"Error: {response.status_code} - Failed to generate.")
             
     except Exception as e:
         print(f"Connection Error: {e}")
 
+    return None
+
 # Wrapper Function
-def GenerateImages(prompt: str):
-    asyncio.run(generate_images(prompt))
+@Tracing.Traced("image")
+def GenerateImages(prompt: str, open_after: bool = True):
+    return asyncio.run(generate_images(prompt, open_after))
+
+# Async version for the backend loop (no asyncio.run per image)
+@Tracing.Traced("image")
+async def AGenerateImages(prompt: str, open_after: bool = True):
+    return await generate_images(prompt, open_after)
 
 # --- Main Listener Loop ---
 if __name__ == "__main__":
@@ -0,0 +1,347 @@
+import json
+import asyncio
+import threading
+from collections import deque
+from time import perf_counter, time
+from dotenv import dotenv_values
+from RateLimit import GetLimiter
+import Tracing
+import Cancellation
+import SingleFlight
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+GroqAPIKey = env_vars.get("GroqAPIKey")
+CohereAPIKey = env_vars.get("CohereAPIKey")
+
+# Point a provider at a local stand-in server (OpenAI-compatible /chat/completions), e.g.
+# GroqBaseURL=http://127.0.0.1:8001/v1
+GroqBaseURL = env_vars.get("GroqBaseURL")
+CohereBaseURL = env_vars.get("CohereBaseURL")
+
+DefaultModel = "llama-3.3-70b-versatile"
+
+# USD per million prompt and completion tokens, for cost estimates in metrics (unknown models cost 0)
+Prices = {
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+
+
+def Cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = Prices.get(model, (0.0, 0.0))
+    return ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1e6
+
+# Per-call metrics for the most recent calls
+Metrics = deque(maxlen=500)
+
+
+class CallMetrics:
+    """Timing and token counts for one LLM call."""
+
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.started_at = time()
+        self.start = perf_counter()
+        self.ttft = None              # Seconds until the first text chunk
+        self.duration = None          # Seconds until the stream finished
+        self.chunks = 0
+        self.chars = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.estimated = False        # True when the provider didn't report usage
+        self.tokens_per_s = None
+        self.retries = 0              # Attempts repeated after a throttled or failed call
+        self.cost = None              # USD, from Prices
+        self.error = None
+
+    def Finish(self, usage, messages):
+        self.duration = perf_counter() - self.start
+        self.prompt_tokens = usage.get("prompt_tokens")
+        self.completion_tokens = usage.get("completion_tokens")
+        if self.prompt_tokens is None or self.completion_tokens is None:
+            # Rough 4-chars-per-token estimate, so metrics exist for every provider
+            self.estimated = True
+            if self.prompt_tokens is None:
+                self.prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+            if self.completion_tokens is None:
+                self.completion_tokens = max(self.chunks, self.chars // 4)
+        self.cost = Cost(self.model, self.prompt_tokens, self.completion_tokens)
+        generating = self.duration - (self.ttft or 0.0)
+        if self.completion_tokens and generating > 0:
+            self.tokens_per_s = self.completion_tokens / generating
+
+    def AsDict(self):
+        return {
+            "provider": self.provider, "model": self.model, "started_at": self.started_at,
+            "ttft": self.ttft, "duration": self.duration, "chunks": self.chunks,
+            "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            "tokens_per_s": self.tokens_per_s, "estimated": self.estimated, "retries": self.retries,
+            "cost": self.cost, "error": self.error,
+        }
+
+
+# ---------------- Providers ----------------
+
+class Provider:
+    """A chat backend. Stream() yields text chunks and fills `usage` when the backend reports it."""
+
+    name = "provider"
+
+    def Stream(self, model, messages, usage, **params):
+        raise NotImplementedError
+
+# Providers put the response headers in usage["headers"] when they can, so the limiter sees
+# x-ratelimit-* budgets (and errors keep theirs, for Retry-After).
+
+
+class GroqProvider(Provider):
+    name = "groq"
+
+    def __init__(self, api_key, base_url=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        # One pooled client (and HTTP connection pool) per provider
+        with self._lock:
+            if self._client is None:
+                from groq import Groq
+                # No SDK retries: the gateway retries through the shared limiter, which also backs off
+                kwargs = {"base_url": self.base_url} if self.base_url else {}
+                self._client = Groq(api_key=self.api_key, max_retries=0, **kwargs)
+            return self._client
+
+    def Stream(self, model, messages, usage, **params):
+        raw = self.client().chat.completions.with_raw_response.create(model=model, messages=messages, stream=True, **params)
+        usage["headers"] = raw.headers
+        completion = raw.parse()
+        close = getattr(completion, "close", None)
+        try:
+            # Closing the stream from the cancelling thread ends the read loop early
+            with Cancellation.Registered(close or (lambda: None)):
+                for chunk in completion:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    # Groq reports usage on the final chunk
+                    x_groq = getattr(chunk, "x_groq", None)
+                    chunk_usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None)
+                    if chunk_usage is not None:
+                        usage["prompt_tokens"] = chunk_usage.prompt_tokens
+                        usage["completion_tokens"] = chunk_usage.completion_tokens
+        finally:
+            if close:
+                close()
+
+
+class CohereProvider(Provider):
+    """Cohere chat_stream; OpenAI-style messages are mapped to preamble/chat_history/message."""
+
+    name = "cohere"
+
+    def __init__(self, api_key, base_url=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import cohere
+                self._client = cohere.Client(api_key=self.api_key, base_url=self.base_url) if self.base_url else cohere.Client(api_key=self.api_key)
+            return self._client
+
+    def Stream(self, model, messages, usage, **params):
+        roles = {"user": "User", "assistant": "Chatbot"}
+        preamble = "\n".join(m["content"] for m in messages if m["role"] == "system")
+        turns = [m for m in messages if m["role"] != "system"]
+        history = [{"role": roles[m["role"]], "message": m["content"]} for m in turns[:-1]]
+
+        stream = self.client().chat_stream(
+            model=model,
+            message=turns[-1]["content"],
+            chat_history=history,
+            preamble=preamble or None,
+            prompt_truncation='OFF',
+            connectors=[],
+            **params
+        )
+        for event in stream:
+            if event.event_type == "text-generation":
+                yield event.text
+            elif event.event_type == "stream-end":
+                billed = getattr(getattr(getattr(event, "response", None), "meta", None), "billed_units", None)
+                if billed is not None:
+                    usage["prompt_tokens"] = billed.input_tokens
+                    usage["completion_tokens"] = billed.output_tokens
+
+
+class OpenAICompatibleProvider(Provider):
+    """Plain HTTP SSE against an OpenAI-compatible /chat/completions endpoint (local stand-ins)."""
+
+    name = "openai-compatible"
+
+    def __init__(self, base_url, api_key=None, timeout=60):
+        import requests
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.timeout = timeout
+        self.session = requests.Session()  # Keep-alive connection pool
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def Stream(self, model, messages, usage, **params):
+        params = {k: v for k, v in params.items() if v is not None}
+        body = {"model": model, "messages": messages, "stream": True, **params}
+        response = Cancellation.Request("POST", self.url, session=self.session, json=body, stream=True, timeout=self.timeout)
+        # A cancelled turn shuts the socket down, so the blocked read below returns right away
+        with response, Cancellation.Registered(lambda: Cancellation.AbortResponse(response)):
+            usage["headers"] = response.headers
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if event.get("usage"):
+                    usage["prompt_tokens"] = event["usage"].get("prompt_tokens")
+                    usage["completion_tokens"] = event["usage"].get("completion_tokens")
+                for choice in event.get("choices", []):
+                    text = choice.get("delta", {}).get("content")
+                    if text:
+                        yield text
+
+
+Providers = {}
+_providers_lock = threading.Lock()
+
+
+# Replace a provider, e.g. RegisterProvider("groq", OpenAICompatibleProvider("http://127.0.0.1:8001/v1"))
+def RegisterProvider(name, provider):
+    with _providers_lock:
+        Providers[name] = provider
+
+
+def GetProvider(name):
+    with _providers_lock:
+        provider = Providers.get(name)
+        if provider is None:
+            if name == "groq":
+                provider = OpenAICompatibleProvider(GroqBaseURL, GroqAPIKey) if GroqBaseURL else GroqProvider(GroqAPIKey)
+            elif name == "cohere":
+                provider = OpenAICompatibleProvider(CohereBaseURL, CohereAPIKey) if CohereBaseURL else CohereProvider(CohereAPIKey)
+            else:
+                raise KeyError(f"Unknown LLM provider: {name}")
+            Providers[name] = provider
+        return provider
+
+
+# ---------------- Gateway ----------------
+
+# Identical requests in flight at the same time (same provider, model, messages and parameters) are sent once
+Calls = SingleFlight.GetGroup("llm")
+
+
+def Stream(messages, model=DefaultModel, provider="groq", **params):
+    """Yield response text chunks; metrics for the call are appended to Metrics when it ends.
+
+    A throttled or failed call is retried by the provider's limiter, but only before the first
+    chunk: once text has been yielded the error goes to the caller. A call identical to one
+    already streaming shares it and gets every chunk from the start.
+    """
+    key = SingleFlight.Fingerprint(provider, model, messages, params)
+    return Calls.Stream(key, lambda: _stream(messages, model, provider, **params))
+
+
+def _stream(messages, model, provider, **params):
+    record = CallMetrics(provider, model)
+    span = Tracing.Begin("llm", provider=provider, model=model)
+    limiter = GetLimiter(provider)
+    usage = {}
+    error = None
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            try:
+                with limiter.Slot():
+                    try:
+                        for text in GetProvider(provider).Stream(model, messages, usage, **params):
+                            Cancellation.Check()
+                            if record.ttft is None:
+                                record.ttft = perf_counter() - record.start
+                                limiter.Observe(usage.pop("headers", None))
+                            record.chunks += 1
+                            record.chars += len(text)
+                            yield text
+                    except Exception:
+                        Cancellation.Check()  # A connection dropped by cancellation surfaces as Cancelled, not a network error
+                        raise
+                    Cancellation.Check()
+                break
+            except Exception as e:
+                if record.chunks or not limiter.Retry(attempt, e):
+                    raise
+                record.retries += 1
+    except BaseException as e:
+        record.error = repr(e)
+        error = e
+        raise
+    finally:
+        record.Finish(usage, messages)
+        Metrics.append(record)
+        span.Set(ttft=record.ttft, completion_tokens=record.completion_tokens, tokens_per_s=record.tokens_per_s,
+                 retries=record.retries, cost=record.cost)
+        span.End(error)
+
+
+def Complete(messages, model=DefaultModel, provider="groq", **params):
+    """Return the whole response; chunks are joined once instead of repeated string concatenation."""
+    return "".join(Stream(messages, model, provider, **params))
+
+
+async def AComplete(messages, model=DefaultModel, provider="groq", **params):
+    return await asyncio.to_thread(Complete, messages, model, provider, **params)
+
+
+async def AStream(messages, model=DefaultModel, provider="groq", **params):
+    """Async generator over Stream(); the blocking SDK iteration runs in a worker thread."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def pump():
+        try:
+            for text in Stream(messages, model, provider, **params):
+                loop.call_soon_threadsafe(queue.put_nowait, text)
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+
+    worker = loop.run_in_executor(None, pump)
+    while True:
+        item = await queue.get()
+        if item is done:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    await worker
+
+
+def LastMetrics():
+    return Metrics[-1] if Metrics else None
+
+
+if __name__ == "__main__":
+    while True:
+        prompt = input(">>> ")
+        for text in Stream([{"role": "user", "content": prompt}], max_tokens=512):
+            print(text, end="", flush=True)
+        print("\n", LastMetrics().AsDict())
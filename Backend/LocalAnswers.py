@@ -0,0 +1,324 @@
+import re
+import ast
+import math
+import random
+import datetime
+import operator
+import threading
+from dotenv import dotenv_values
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+Username = env_vars.get("Username")
+Assistantname = env_vars.get("Assistantname") or "Jarvis"
+
+# "off" sends every general question to the chat model again
+LocalAnswering = (env_vars.get("LocalAnswers") or "on").lower() != "off"
+
+
+def Normalize(query):
+    text = query.lower().strip()
+    text = re.sub(r"^(hey |ok |okay )?(jarvis|" + re.escape(Assistantname.lower()) + r")[, ]+", "", text)
+    text = re.sub(r"\b(please|can you|could you|tell me|do you know|jarvis)\b", " ", text)
+    text = text.replace("what's", "what is").replace("whats", "what is").replace("it's", "it is")
+    return re.sub(r"\s+", " ", text).strip(" ?.!,")
+
+
+def Number(value):
+    """A result as people say it: 425, 3.1069, 0.0005, 1.2e+12."""
+    if abs(value) >= 1e12 or (value and abs(value) < 1e-4):
+        return f"{value:.4g}"
+    if abs(value - round(value)) < 1e-9:
+        return f"{int(round(value))}"
+    return f"{value:.4f}".rstrip("0").rstrip(".")
+
+
+# ---------------- Time and date ----------------
+
+TimePattern = re.compile(r"^(what is the |what )?(current )?time( is it)?( now| right now)?$|^time$|^the time$")
+DatePattern = re.compile(r"^(what is )?(the |today's |todays )?(current )?date( today| is it( today)?)?$|^what is today$")
+DayPattern = re.compile(r"^(what |which )day( of the week)? is (it|today)( today)?$|^what is (the )?day( today)?$")
+MonthPattern = re.compile(r"^(what|which) month is (it|this)$|^what is the (current )?month$")
+YearPattern = re.compile(r"^(what|which) year is (it|this)$|^what is the (current )?year$")
+
+
+def TimeAndDate(text, now=None):
+    now = now or datetime.datetime.now()
+    if TimePattern.match(text):
+        return f"It's {now.strftime('%I:%M %p').lstrip('0')}."
+    if DatePattern.match(text):
+        return f"Today is {now.strftime('%A')}, {now.day} {now.strftime('%B %Y')}."
+    if DayPattern.match(text):
+        return f"It's {now.strftime('%A')}."
+    if MonthPattern.match(text):
+        return f"It's {now.strftime('%B')}."
+    if YearPattern.match(text):
+        return f"It's {now.year}."
+    return None
+
+
+# ---------------- Arithmetic ----------------
+
+# Spoken operators, rewritten to Python ones before parsing
+Spoken = [
+    (r"\bmultiplied by\b|\btimes\b|\binto\b|(?<=\d)\s*x\s*(?=\d)|×", "*"),
+    (r"\bdivided by\b|\bover\b|÷", "/"),
+    (r"\bplus\b|\badded to\b", "+"),
+    (r"\bminus\b", "-"),
+    (r"\bto the power( of)?\b|\braised to\b|\^", "**"),
+    (r"\bmod(ulo)?\b", "%"),
+]
+ArithmeticPrefix = re.compile(r"^(what is|calculate|compute|evaluate|solve|how much is)\s+")
+Decimal = r"\d+(?:\.\d+)?"
+PercentOf = re.compile(rf"^(-?{Decimal})\s*(%|percent) of (-?{Decimal})$")
+Squared = re.compile(rf"^(-?{Decimal}) (squared|cubed)$")
+SquareRoot = re.compile(rf"^(the )?square root of ({Decimal})$")
+Expression = re.compile(r"^[\d\s.+\-*/%()]+$")
+
+Operators = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+             ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+             ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+
+def Evaluate(node):
+    """Numbers and + - * / // % ** only; powers are kept below 1e300 so no query can hang the turn or overflow."""
+    if isinstance(node, ast.Expression):
+        return Evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and type(node.op) in Operators:
+        return Operators[type(node.op)](Evaluate(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in Operators:
+        left, right = Evaluate(node.left), Evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and (abs(right) > 100 or abs(left) > 1e6 or
+                                             (abs(left) > 1 and right * math.log10(abs(left)) > 300)):
+            raise ValueError("exponent too large")
+        return Operators[type(node.op)](left, right)
+    raise ValueError("not arithmetic")
+
+
+def Arithmetic(text):
+    expression = ArithmeticPrefix.sub("", text)
+    match = PercentOf.match(expression)
+    if match:
+        try:
+            return f"{Number(float(match[1]) / 100 * float(match[3]))}."
+        except (ValueError, OverflowError):
+            return None
+    match = Squared.match(expression)
+    if match:
+        try:
+            return f"{Number(float(match[1]) ** (2 if match[2] == 'squared' else 3))}."
+        except (ValueError, OverflowError):
+            return None
+    match = SquareRoot.match(expression)
+    if match:
+        try:
+            return f"{Number(math.sqrt(float(match[2])))}."
+        except (ValueError, OverflowError):
+            return None
+    for pattern, symbol in Spoken:
+        expression = re.sub(pattern, f" {symbol} ", expression)
+    # Something to compute: digits and at least one operator between them
+    if not Expression.match(expression) or not re.search(r"\d\s*[-+*/%]", expression):
+        return None
+    try:
+        return f"{Number(Evaluate(ast.parse(expression, mode='eval')))}."
+    except ZeroDivisionError:
+        return "That's undefined: you can't divide by zero."
+    except (SyntaxError, ValueError, OverflowError):
+        return None  # Products of large numbers can still be too big for a float
+
+
+# ---------------- Unit conversion ----------------
+
+# Factor to the base unit of each dimension (metre, kilogram, litre, second, byte, metre per second)
+Units = {
+    "length": {"km": 1000, "kilometre": 1000, "kilometer": 1000, "m": 1, "metre": 1, "meter": 1, "cm": 0.01,
+               "centimetre": 0.01, "centimeter": 0.01, "mm": 0.001, "millimetre": 0.001, "millimeter": 0.001,
+               "mile": 1609.344, "mi": 1609.344, "yard": 0.9144, "yd": 0.9144, "foot": 0.3048, "feet": 0.3048,
+               "ft": 0.3048, "inch": 0.0254, "inches": 0.0254, "in": 0.0254},
+    "mass": {"kg": 1, "kilogram": 1, "kilo": 1, "g": 0.001, "gram": 0.001, "gm": 0.001, "mg": 1e-6, "milligram": 1e-6,
+             "tonne": 1000, "ton": 1000, "lb": 0.45359237, "lbs": 0.45359237, "pound": 0.45359237,
+             "oz": 0.028349523125, "ounce": 0.028349523125},
+    "volume": {"l": 1, "litre": 1, "liter": 1, "ml": 0.001, "millilitre": 0.001, "milliliter": 0.001,
+               "gallon": 3.785411784, "gal": 3.785411784, "cup": 0.2365882365, "pint": 0.473176473},
+    "time": {"second": 1, "sec": 1, "s": 1, "minute": 60, "min": 60, "hour": 3600, "hr": 3600, "h": 3600,
+             "day": 86400, "week": 604800, "year": 31557600},
+    "data": {"byte": 1, "b": 1, "kb": 1e3, "kilobyte": 1e3, "mb": 1e6, "megabyte": 1e6, "gb": 1e9, "gigabyte": 1e9,
+             "tb": 1e12, "terabyte": 1e12},
+    "speed": {"km/h": 1 / 3.6, "kmph": 1 / 3.6, "kph": 1 / 3.6, "mph": 0.44704, "m/s": 1},
+}
+Temperatures = {"c": "C", "celsius": "C", "centigrade": "C", "f": "F", "fahrenheit": "F", "k": "K", "kelvin": "K"}
+Unit = r"([a-z/]+(?: per [a-z]+)?)"
+Conversion = re.compile(r"^(?:convert |what is |how much is )?(-?[\d.,]+) ?(?:degrees? )?" + Unit +
+                        r" (?:to|in|into|in to) (?:degrees? )?" + Unit + r"$")
+HowMany = re.compile(r"^how many (?:degrees? )?" + Unit + r" (?:are )?(?:there )?in (?:an? |one )?(-?[\d.,]+)? ?(?:degrees? )?" + Unit + r"$")
+
+
+def _unit(name):
+    name = name.strip().replace(" per hour", "/h").replace(" per second", "/s")
+    for candidate in (name, name.rstrip("s"), name[:-2] if name.endswith("es") else name):
+        if candidate in Temperatures:
+            return "temperature", Temperatures[candidate]
+        for dimension, units in Units.items():
+            if candidate in units:
+                return dimension, candidate
+    return None, None
+
+
+def _temperature(value, source, target):
+    kelvin = {"C": value + 273.15, "F": (value - 32) * 5 / 9 + 273.15, "K": value}[source]
+    return {"C": kelvin - 273.15, "F": (kelvin - 273.15) * 9 / 5 + 32, "K": kelvin}[target]
+
+
+def Convert(text):
+    match = Conversion.match(text)
+    if match:
+        amount, source, target = match[1], match[2], match[3]
+    else:
+        match = HowMany.match(text)
+        if not match:
+            return None
+        target, amount, source = match[1], match[2] or "1", match[3]
+    try:
+        value = float(amount.replace(",", ""))
+    except ValueError:
+        return None
+    source_dimension, source_unit = _unit(source)
+    target_dimension, target_unit = _unit(target)
+    if source_dimension is None or source_dimension != target_dimension:
+        return None
+    if source_dimension == "temperature":
+        return f"{Number(value)} °{source_unit} is {Number(_temperature(value, source_unit, target_unit))} °{target_unit}."
+    units = Units[source_dimension]
+    return f"{Number(value)} {source.strip()} is {Number(value * units[source_unit] / units[target_unit])} {target.strip()}."
+
+
+# ---------------- Small talk ----------------
+
+# Replies address the user by name when it is configured
+Name = f", {Username}" if Username else ""
+
+SmallTalk = [
+    (re.compile(r"^(hi|hello|hey|hii+|namaste|yo)( there)?$"),
+     [f"Hello{Name}! How can I help?", f"Hi{Name}, what can I do for you?"]),
+    (re.compile(r"^good (morning|afternoon|evening)$"), [f"Good {{0}}{Name}! How can I help?"]),
+    (re.compile(r"^good night$"), [f"Good night{Name}. Sleep well!"]),
+    (re.compile(r"^(thanks|thank you|thank you so much|thanks a lot|thx|ty)(,? i really liked it)?$"),
+     ["You're welcome!", "Happy to help!", "Anytime!"]),
+    (re.compile(r"^how are you( doing| today)?$"), ["I'm doing great, thanks for asking! How can I help you?"]),
+    (re.compile(r"^(ok|okay|cool|nice|great|alright|got it)$"), ["Great! Let me know if you need anything else."]),
+    (re.compile(r"^(who are you|what is your name|what are you)$"), [f"I'm {Assistantname}, your personal assistant."]),
+] + ([(re.compile(r"^(what is )?my name$"), [f"Your name is {Username}."])] if Username else [])
+
+
+def SmallTalkReply(text):
+    for pattern, replies in SmallTalk:
+        match = pattern.match(text)
+        if match:
+            return random.choice(replies).format(*match.groups())
+    return None
+
+
+class LocalAnswerEngine:
+    """Answers deterministic general questions without a model call: time and date, arithmetic,
+    unit conversions and small talk.
+
+    Patterns match the whole query, so "what's the time in london" or "why is 2+2 four" still
+    go to the chat model. Hits and misses are counted per handler.
+    """
+
+    def __init__(self, enabled=LocalAnswering):
+        self.enabled = enabled
+        self.handlers = [("time", TimeAndDate), ("arithmetic", Arithmetic), ("conversion", Convert), ("small talk", SmallTalkReply)]
+        self.queries = 0
+        self.hits = {name: 0 for name, _ in self.handlers}
+        self._lock = threading.Lock()
+
+    def Answer(self, query):
+        """The local answer to `query`, or None when the chat model should answer it."""
+        if not self.enabled:
+            return None
+        text = Normalize(query)
+        answer = None
+        for name, handler in self.handlers:
+            answer = handler(text)
+            if answer is not None:
+                break
+        with self._lock:
+            self.queries += 1
+            if answer is not None:
+                self.hits[name] += 1
+        return answer
+
+    def Matches(self, query):
+        """Whether Answer() would answer it; doesn't count towards the hit rate."""
+        if not self.enabled:
+            return False
+        text = Normalize(query)
+        return any(handler(text) is not None for _, handler in self.handlers)
+
+    def AsDict(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {"queries": self.queries, "hits": hits, "hit_rate": hits / self.queries if self.queries else 0.0,
+                    "by_handler": dict(self.hits)}
+
+
+# Shared engine used by Chatbot and the router
+Engine = LocalAnswerEngine()
+
+
+def Answer(query):
+    return Engine.Answer(query)
+
+
+# --- Checks on known answers, then hit rate and speed over the general queries the router sees ---
+if __name__ == "__main__":
+    import sys
+    from time import perf_counter
+    from RouterExamples import Examples, Evaluation
+    from Tiering import Corpus, HeldOut
+
+    now = datetime.datetime(2026, 10, 19, 15, 4)
+    Expected = [
+        ("what's the time?", "It's 3:04 PM."), ("what is today's date?", "Today is Monday, 19 October 2026."),
+        ("what day is it today?", "It's Monday."), ("calculate 25 times 17", "425."),
+        ("what is 15 percent of 200", "30."), ("what is 2+2", "4."), ("12 * (3 + 4)", "84."),
+        ("what is 7 divided by 0", "That's undefined: you can't divide by zero."), ("2 to the power of 10", "1024."),
+        ("square root of 144", "12."), ("convert 5 km to miles", "5 km is 3.1069 miles."),
+        ("100 fahrenheit to celsius", "100 °F is 37.7778 °C."), ("how many grams in a pound", "1 pound is 453.5924 grams."),
+        ("2.5 hours in minutes", "2.5 hours is 150 minutes."), ("convert 60 mph to km/h", "60 mph is 96.5606 km/h."),
+        ("thank you", ...), ("what's the time in london?", None), ("why is 2+2 four?", None),
+        ("how does a car engine work?", None), ("convert 5 km to kg", None), ("what is 9 to the power of 99999", None),
+        ("what is 100000 ** 100", None), ("what is 1.2.3 percent of 5", None), ("what is . percent of 5", None),
+        ("square root of 1.2.3", None), ("1.2.3 squared", None), ("what is 2.5 percent of 40", "1."),
+    ]
+    failures = 0
+    for query, expected in Expected:
+        text = Normalize(query)
+        try:
+            got = TimeAndDate(text, now) or Arithmetic(text) or Convert(text) or SmallTalkReply(text)
+        except Exception as e:
+            got = f"raised {e!r}"  # Any exception here would crash routing: always a failure
+        ok = got is not None if expected is ... else got == expected  # ... = any reply
+        failures += not ok
+        print(f"{'ok ' if ok else 'BAD'} {query!r:<40} -> {got!r}")
+    print(f"{len(Expected) - failures}/{len(Expected)} checks passed\n")
+
+    general = ([q for q, decision in Examples if decision.startswith("general")]
+               + [q for q, family in Evaluation if family == "general"] + [q for q, _ in Corpus + HeldOut])
+    general = list(dict.fromkeys(general))
+    engine = LocalAnswerEngine(enabled=True)
+    start = perf_counter()
+    answered = [(q, engine.Answer(q)) for q in general]
+    elapsed = perf_counter() - start
+    stats = engine.AsDict()
+    print(f"{stats['hits']}/{stats['queries']} general queries answered locally ({stats['hit_rate'] * 100:.0f}%), "
+          f"{elapsed / len(general) * 1e6:.0f} us/query  {stats['by_handler']}")
+    for query, answer in answered:
+        if answer is not None:
+            print(f"  {query!r:<45} -> {answer}")
+    sys.exit(1 if failures else 0)
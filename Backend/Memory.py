@@ -0,0 +1,125 @@
+import os
+import sys
+import types
+import tracemalloc
+from collections import deque
+from time import time
+
+# Module-level state of these files is what "retained" counts look at
+ProjectRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ProjectDirs = tuple(os.path.join(ProjectRoot, d) for d in ("Backend", "Frontend"))
+Containers = (list, dict, set, frozenset, deque)
+
+
+def RSS():
+    """Resident memory of this process in bytes."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return 0
+
+
+def _project_modules():
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if path.startswith(ProjectDirs):
+            yield name, module
+
+
+def _items(container):
+    # Preallocated slot lists (ResponseCache) hold None in free slots
+    return len(container) - container.count(None) if isinstance(container, list) else len(container)
+
+
+def _is_project_object(value):
+    module = sys.modules.get(getattr(type(value), "__module__", None))
+    return hasattr(value, "__dict__") and (getattr(module, "__file__", None) or "").startswith(ProjectDirs)
+
+
+def Retained():
+    """Items held in module-level containers of Jarvis' own modules, and in containers of module-level
+    objects (singletons such as Chatbot.Cache or Sessions.Store): {"Module.name": count}, largest first.
+
+    An object imported into several modules is counted once, under the module that defines its class.
+    """
+    found = {}  # id -> (key, container)
+    for name, module in _project_modules():
+        for attr, value in list(vars(module).items()):
+            if attr.startswith("__") or isinstance(value, (type, types.ModuleType, types.FunctionType)):
+                continue
+            if isinstance(value, Containers):
+                found.setdefault(id(value), (f"{name}.{attr}", value))
+            elif _is_project_object(value):
+                home = type(value).__module__ == name
+                for field, inner in list(vars(value).items()):
+                    if isinstance(inner, Containers) and (home or id(inner) not in found):
+                        found[id(inner)] = (f"{name}.{attr}.{field}", inner)
+    counts = {key: _items(container) for key, container in found.values()}
+    return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+
+def ByModule(retained=None):
+    """Retained items summed per module."""
+    totals = {}
+    for key, count in (retained if retained is not None else Retained()).items():
+        module = key.split(".", 1)[0]
+        totals[module] = totals.get(module, 0) + count
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def Panel(top=4):
+    """One line for the GUI: process memory and the modules holding the most objects."""
+    retained = ByModule()
+    parts = [f"{name} {count:,}" for name, count in list(retained.items())[:top]]
+    traced = f" · traced {tracemalloc.get_traced_memory()[0] / 2 ** 20:.0f} MB" if tracemalloc.is_tracing() else ""
+    return f"RSS {RSS() / 2 ** 20:.0f} MB{traced} | " + " · ".join(parts)
+
+
+class MemoryTracker:
+    """Samples of RSS, traced memory and retained objects over a long run, and where memory grew.
+
+    Start() takes a tracemalloc baseline; TopAllocators() compares the current heap with it by
+    source line, so what is still allocated at the end shows up, not what was freed on the way.
+    """
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.samples = []
+        self.baseline = None
+        self.started = None
+
+    def Start(self, trace=True):
+        self.started = time()
+        if trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self.baseline = tracemalloc.take_snapshot()
+        return self
+
+    def Sample(self, **extra):
+        sample = {"t": time() - (self.started or time()), "rss_mb": RSS() / 2 ** 20,
+                  "retained": sum(Retained().values()), **extra}
+        if tracemalloc.is_tracing():
+            sample["traced_mb"] = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        self.samples.append(sample)
+        return sample
+
+    def TopAllocators(self, limit=10):
+        """[(file:line, bytes grown, blocks grown)] since Start()."""
+        if self.baseline is None:
+            return []
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                  tracemalloc.Filter(False, "<unknown>"))
+        current = tracemalloc.take_snapshot().filter_traces(ignore)
+        stats = current.compare_to(self.baseline.filter_traces(ignore), "lineno")
+        return [(f"{os.path.relpath(s.traceback[0].filename, ProjectRoot) if s.traceback[0].filename.startswith(ProjectDirs) else s.traceback[0].filename}"
+                 f":{s.traceback[0].lineno}", s.size_diff, s.count_diff) for s in stats[:limit]]
+
+    def Stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -1,15 +1,22 @@
-import cohere
+import LLM
+import asyncio
+import Tracing
+import Sessions
 from rich import print
 from dotenv import dotenv_values
+from time import perf_counter
+from collections import deque
+from RouterExamples import ExampleBank
+from DecisionParser import IntentTrie, StreamingDecisionParser
+import BackendLoop
+import LocalAnswers
 
 # Load environment variables from the .env file
 env_vars = dotenv_values(".env")
 
-# Retrieve API key
-CohereAPIKey = env_vars.get("CohereAPIKey")
-
-# Create a Cohere client using the provided API key
-co = cohere.Client(api_key=CohereAPIKey)
+# "dynamic" sends only the nearest examples and the likely intent families; "static" sends the full preamble.
+# Static until `python Backend/RouterExamples.py --live` shows dynamic decides at least as accurately.
+RouterPrompt = (env_vars.get("RouterPrompt") or "static").lower()
 
 # Define a list of recognized function keywords for task categorization
 funcs = [
@@ -18,8 +25,11 @@ funcs = [
     "youtube search", "reminder"
 ]
 
-# Initialize an empty list to store user messages
-messages = []
+# Prefix trie used to split the streamed decision into tasks
+Intents = IntentTrie(funcs)
+
+# The most recent user messages (older ones are dropped, so a long-running app doesn't keep them all)
+messages = deque(maxlen=Sessions.QueryHistory)
 
 # Define the preamble that guides the AI model on how to categorize queries
 # (Note: Ye text video ke end mein dikhaye gaye text block se liya gaya hai)
@@ -59,52 +69,58 @@ ChatHistory = [
     {"role": "Chatbot", "message": "general chat with me."}
 ]
 
+# The same examples as gateway (OpenAI-style) messages
+RouterHistory = [{"role": "user" if turn["role"] == "User" else "assistant", "content": turn["message"]} for turn in ChatHistory]
+
+# Labelled examples for dynamic few-shot selection
+Examples = ExampleBank()
+
+def RouterMessages(prompt):
+    if RouterPrompt == "static":
+        return [{"role": "system", "content": preamble}] + RouterHistory + [{"role": "user", "content": prompt}]
+    return Examples.Messages(prompt)
+
+# Yields each task of the decision as soon as the router has streamed it completely
+@Tracing.Traced("router")
+def FirstLayerDMMStream(prompt: str = "test"):
+    # Add the user's query to the messages list (the session's, when serving a client)
+    session = Sessions.Current()
+    (session.queries if session is not None else messages).append({"role": "user", "content": f"{prompt}"})
+
+    span = Tracing.Current()
+    parser = StreamingDecisionParser(Intents)
+
+    # Record when the first task was ready on the router span
+    def timed(tasks):
+        if tasks and "first_task_ms" not in span.attrs:
+            span.Set(first_task_ms=round((perf_counter() - span.start) * 1000, 1))
+        return tasks
+
+    # Time, date, arithmetic, conversions and small talk are answered locally: no router call either
+    if LocalAnswers.Engine.Matches(prompt):
+        span.Set(local=True)
+        yield from timed([f"general {prompt}"])
+        return
+
+    # Stream the decision from the Cohere model through the LLM gateway
+    for chunk in LLM.Stream(
+        RouterMessages(prompt),
+        model='command-a-03-2025',
+        provider="cohere",
+        temperature=0.7
+    ):
+        yield from timed(parser.Feed(chunk))
+    yield from timed(parser.Finish())
+
 def FirstLayerDMM(prompt: str = "test"):
-    # Add the user's query to the messages list
-    messages.append({"role": "user", "content": f"{prompt}"})
+    return list(FirstLayerDMMStream(prompt))
 
-    # Create a streaming chat session with the Cohere model
-    stream = co.chat_stream(
-        model='command-a-03-2025',
-        message=prompt,
-        temperature=0.7,
-        chat_history=ChatHistory,
-        prompt_truncation='OFF',
-        connectors=[],
-        preamble=preamble
-    )
-
-    response = ""
-
-    # Iterate over events in the stream and capture text generation events
-    for event in stream:
-        if event.event_type == "text-generation":
-            response += event.text
-
-    # Remove newline characters and split responses into individual tasks
-    response = response.replace("\n", "")
-    response = response.split(",")
-
-    # Strip leading and trailing whitespaces from each task
-    response = [i.strip() for i in response]
-
-    temp = []
-
-    # Filter the tasks based on recognized function keywords
-    for task in response:
-        for func in funcs:
-            if task.startswith(func):
-                temp.append(task)
-
-    # Update the response with the filtered list of tasks
-    response = temp
-
-    # If the query itself is in the response (recursion logic from video), likely an error check
-    if "(query)" in response: 
-        newresponse = FirstLayerDMM(prompt=prompt)
-        return newresponse
-    else:
-        return response
+# Async versions for the backend loop; the blocking Cohere call runs on its bounded executor
+async def AFirstLayerDMM(prompt: str = "test"):
+    return await asyncio.to_thread(FirstLayerDMM, prompt)
+
+def AFirstLayerDMMStream(prompt: str = "test"):
+    return BackendLoop.Iterate(FirstLayerDMMStream, prompt)
 
 if __name__ == "__main__":
     while True:
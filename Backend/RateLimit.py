@@ -0,0 +1,400 @@
+import re
+import asyncio
+import random
+import threading
+from time import monotonic, time
+from email.utils import parsedate_to_datetime
+from contextlib import contextmanager, asynccontextmanager
+from dotenv import dotenv_values
+import Cancellation
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+# Default per-provider limits: (requests per minute, max concurrent requests)
+# Override in .env, e.g. GroqRPM=30 and GroqConcurrency=4
+DefaultLimits = {
+    "groq": (30, 4),
+    "cohere": (20, 2),
+    "serper": (60, 4),
+    "pollinations": (30, 2),
+}
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def TryAcquire(self, tokens=1.0):
+        """Take tokens if available; otherwise return how long to wait before trying again."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def Acquire(self, tokens=1.0):
+        while True:
+            wait = self.TryAcquire(tokens)
+            if wait <= 0:
+                return
+            Cancellation.Sleep(wait)  # A cancelled turn stops waiting for its turn
+
+    async def AAcquire(self, tokens=1.0):
+        while True:
+            wait = self.TryAcquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+# Retries after a throttled or failed call, with exponential backoff (unless the provider says when)
+MaxRetries = int(env_vars.get("ProviderRetries") or 3)
+BackoffBase = 0.5
+BackoffCap = 20.0
+
+# Statuses that mean "slow down": they also shrink the adaptive concurrency
+ThrottleStatuses = (429, 503, 529)
+
+
+class HTTPStatusError(Exception):
+    """A provider answered with a status worth retrying (see Classify); keeps the headers for Retry-After."""
+
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+def Classify(error):
+    """("throttled" | "transient" | None, headers) for an exception raised by a provider call.
+
+    Works with requests' HTTPError, the Groq and Cohere SDK errors (status_code / response)
+    and HTTPStatusError. Connection failures and 5xx are transient; None is not worth retrying.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status", None) or getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    headers = getattr(error, "headers", None) or getattr(response, "headers", None) or {}
+    if status in ThrottleStatuses:
+        return "throttled", headers
+    if isinstance(status, int) and status >= 500:
+        return "transient", headers
+    if status is None and (isinstance(error, OSError) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")):
+        return "transient", headers
+    return None, headers
+
+
+def _seconds(value):
+    """Header durations: "2", "1.5", Groq's "2m59.56s" / "450ms", or an HTTP date."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        scale = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+        return sum(float(n) * scale[u] for n, u in parts)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _lower(headers):
+    return {str(k).lower(): v for k, v in dict(headers or {}).items()}
+
+
+def RetryAfter(headers):
+    """Seconds the provider asked us to wait, from Retry-After(-ms) or an exhausted x-ratelimit budget."""
+    headers = _lower(headers)
+    if "retry-after-ms" in headers:
+        return _seconds(headers["retry-after-ms"]) / 1000.0
+    if "retry-after" in headers:
+        return _seconds(headers["retry-after"])
+    waits = [_seconds(headers.get(f"x-ratelimit-reset-{kind}"))
+             for kind in ("requests", "tokens") if str(headers.get(f"x-ratelimit-remaining-{kind}", "")).strip() == "0"]
+    waits = [w for w in waits if w is not None]
+    return max(waits) if waits else None
+
+
+class AdaptiveConcurrency:
+    """AIMD cap on in-flight requests: +1 per `limit` successes, halved when the provider throttles us.
+
+    At most one decrease per round trip: a throttle only counts if its request started after
+    the last decrease, so one burst of 429s doesn't collapse the limit to 1.
+    """
+
+    def __init__(self, maximum, minimum=1, decrease=0.5):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.decrease = decrease
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def Acquire(self):
+        with self._condition:
+            while self.in_flight >= max(self.minimum, int(self.limit)):
+                self._condition.wait(0.05)
+                Cancellation.Check()
+            self.in_flight += 1
+            return monotonic()
+
+    def Release(self, started, outcome="ok"):
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == "throttled" and started >= self._decreased_at:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._decreased_at = monotonic()
+            self._condition.notify_all()
+
+
+class Limiter:
+    """Request rate, adaptive in-flight cap and retry policy for one provider, shared by every module."""
+
+    def __init__(self, name, rpm, concurrency, retries=MaxRetries):
+        self.name = name
+        self.bucket = TokenBucket(rpm / 60.0, max(1, min(concurrency, rpm)))
+        self.concurrency = concurrency
+        self.adaptive = AdaptiveConcurrency(concurrency)
+        self.retries = retries
+        self.paused_until = 0.0  # monotonic(); set from Retry-After and exhausted x-ratelimit budgets
+        self.throttled = 0
+        self.retried = 0
+
+    def Observe(self, headers):
+        """Pause every caller of this provider if the response headers say the budget is used up."""
+        wait = RetryAfter(headers)
+        if wait:
+            self.paused_until = max(self.paused_until, monotonic() + wait)
+
+    def _wait_for_pause(self):
+        wait = self.paused_until - monotonic()
+        if wait > 0:
+            Cancellation.Sleep(wait)
+
+    @contextmanager
+    def Slot(self):
+        started = self.adaptive.Acquire()
+        outcome = "ok"
+        try:
+            self._wait_for_pause()
+            self.bucket.Acquire()
+            yield
+        except Exception as e:
+            outcome, headers = Classify(e)
+            if outcome == "throttled":
+                self.throttled += 1
+                self.Observe(headers)
+            raise
+        except BaseException:
+            outcome = None  # Cancelled: says nothing about the provider
+            raise
+        finally:
+            self.adaptive.Release(started, outcome)
+
+    @asynccontextmanager
+    async def ASlot(self):
+        # The adaptive cap is thread-based so sync and async callers share it
+        started = await asyncio.to_thread(self.adaptive.Acquire)
+        outcome = "ok"
+        try:
+            wait = self.paused_until - monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.bucket.AAcquire()
+            yield
+        except Exception as e:
+            outcome, headers = Classify(e)
+            if outcome == "throttled":
+                self.throttled += 1
+                self.Observe(headers)
+            raise
+        except BaseException:
+            outcome = None
+            raise
+        finally:
+            self.adaptive.Release(started, outcome)
+
+    def Retry(self, attempt, error):
+        """After failed attempt number `attempt`, sleep and return True if the call should be retried."""
+        kind, headers = Classify(error)
+        if kind is None or attempt > self.retries:
+            return False
+        delay = RetryAfter(headers)
+        if delay is None:
+            # Full jitter keeps clients that failed together from retrying together
+            delay = random.uniform(0, min(BackoffCap, BackoffBase * 2 ** (attempt - 1)))
+        self.retried += 1
+        Cancellation.Sleep(delay)
+        return True
+
+    def Call(self, func, *args, **kwargs):
+        """func(*args, **kwargs) inside a slot, retried with backoff when throttled or transiently failing."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with self.Slot():
+                    return func(*args, **kwargs)
+            except Exception as e:
+                if not self.Retry(attempt, e):
+                    raise
+
+    def AsDict(self):
+        return {"provider": self.name, "rpm": self.bucket.rate * 60, "concurrency": self.concurrency,
+                "adaptive_limit": round(self.adaptive.limit, 2), "in_flight": self.adaptive.in_flight,
+                "throttled": self.throttled, "retried": self.retried}
+
+
+Limiters = {}
+_limiters_lock = threading.Lock()
+
+
+# Shared limiter for a provider ("groq", "cohere", "serper", ...)
+def GetLimiter(provider):
+    with _limiters_lock:
+        limiter = Limiters.get(provider)
+        if limiter is None:
+            rpm, concurrency = DefaultLimits.get(provider, (60, 4))
+            prefix = provider.capitalize()
+            rpm = float(env_vars.get(f"{prefix}RPM") or rpm)
+            concurrency = int(env_vars.get(f"{prefix}Concurrency") or concurrency)
+            limiter = Limiters[provider] = Limiter(provider, rpm, concurrency)
+        return limiter
+
+
+def Request(provider, method, url, **kwargs):
+    """Cancellation.Request() through the provider's limiter, retried on 429/5xx and connection errors.
+
+    Other statuses (401, 404 ...) are returned to the caller as before.
+    """
+    limiter = GetLimiter(provider)
+
+    def send():
+        response = Cancellation.Request(method, url, **kwargs)
+        limiter.Observe(response.headers)
+        if response.status_code in ThrottleStatuses or response.status_code >= 500:
+            raise HTTPStatusError(response.status_code, response.headers)
+        return response
+
+    return limiter.Call(send)
+
+
+
+# --- Burst against a stand-in that enforces limits: immediate retries (the old ChatBot) vs this limiter,
+# then checks that fail the run: every limited call succeeds, 429s stay bounded, Retry-After is waited out ---
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+    import requests
+    from time import perf_counter
+    from concurrent.futures import ThreadPoolExecutor
+    import RateLimit  # Use the module the backend imports, not this __main__ copy
+    from StandIns import StandInServer, Behaviour
+
+    Requests = 80
+    Clients = 24
+    Limits = dict(rpm_limit=30, limit_window=5.0, concurrency_limit=4)  # 360 requests/min, 4 at once
+
+    os.chdir(tempfile.mkdtemp(prefix="jarvis-ratelimit-"))
+    import LLM
+    import SingleFlight
+    SingleFlight.Coalesce = False  # Independent clients that happen to send the same message: each call is measured
+
+    def run(label, limiter, call):
+        server = StandInServer(Behaviour(ttft=0.1, token_rate=400, tokens=20, **Limits)).Start()
+        LLM.RegisterProvider("limited", LLM.OpenAICompatibleProvider(server.url + "/v1"))
+        RateLimit.Limiters["limited"] = limiter
+        outcomes = []
+        started = perf_counter()
+        with ThreadPoolExecutor(Clients) as pool:
+            for outcome in pool.map(lambda _: call(), range(Requests)):
+                outcomes.append(outcome)
+        elapsed = perf_counter() - started
+        server.Stop()
+        print(f"{label:<30}{outcomes.count('ok'):>5}/{Requests} ok {server.requests:>6} sent {server.throttled:>5} x 429 "
+              f"{elapsed:>7.1f} s   peak in flight {server.max_in_flight}   before Retry-After ran out {server.early}")
+        return limiter, server, outcomes
+
+    messages = [{"role": "user", "content": "hi"}]
+
+    def immediate_retry():
+        # What ChatBot did: on any error, try again right away (capped here so the run ends)
+        for _ in range(200):
+            try:
+                LLM.Complete(messages, provider="limited")
+                return "ok"
+            except Exception:
+                continue
+        return "failed"
+
+    def gateway():
+        try:
+            LLM.Complete(messages, provider="limited")
+            return "ok"
+        except Exception:
+            return "failed"
+
+    fixed = RateLimit.Limiter("limited", rpm=1e6, concurrency=Clients, retries=0)
+    fixed.Observe = lambda headers: None
+    fixed.adaptive = RateLimit.AdaptiveConcurrency(Clients, minimum=Clients)
+    print(f"{Requests} requests from {Clients} threads; server allows {Limits['rpm_limit']} per "
+          f"{Limits['limit_window']:.0f} s and {Limits['concurrency_limit']} at once\n")
+    run("fixed limiter, retry at once", fixed, immediate_retry)
+    adaptive, server, outcomes = run("adaptive limiter with backoff",
+                                     RateLimit.Limiter("limited", rpm=1e6, concurrency=Clients, retries=6), gateway)
+    print(f"\nadaptive limiter after the burst: {adaptive.AsDict()}\n")
+
+    failures = []
+
+    def expect(condition, message):
+        print(f"{'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    expect(outcomes.count("ok") == Requests, f"burst: {outcomes.count('ok')}/{Requests} calls succeed")
+    expect(server.throttled <= Requests, f"burst: {server.throttled} x 429 for {Requests} calls (at most one per call)")
+
+    # Another client has used up the window: the first call gets a 429 with Retry-After, and nothing is sent
+    # again until it has passed. Later calls pause on the exhausted x-ratelimit budget instead of hitting 429.
+    server = StandInServer(Behaviour(ttft=0.02, rpm_limit=4, limit_window=2.0)).Start()
+    for _ in range(4):
+        requests.post(server.url + "/search", json={"q": "other client"}, timeout=5)
+    RateLimit.Limiters["retry-after"] = RateLimit.Limiter("retry-after", rpm=1e6, concurrency=1, retries=3)
+
+    def status(i):
+        try:
+            return RateLimit.Request("retry-after", "POST", server.url + "/search", json={"q": f"query {i}"}, timeout=10).status_code
+        except Exception as e:
+            return repr(e)
+
+    started = perf_counter()
+    statuses = [status(i) for i in range(6)]
+    elapsed = perf_counter() - started
+    server.Stop()
+    expect(statuses == [200] * 6, f"retry-after: statuses {statuses}")
+    expect(server.throttled == 1, f"retry-after: {server.throttled} x 429 (the first call only)")
+    expect(server.early == 0, f"retry-after: {server.early} requests sent before Retry-After ran out")
+    expect(elapsed >= 2.0, f"retry-after: 6 calls took {elapsed:.1f} s (at least the 2 s window)")
+    print(f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
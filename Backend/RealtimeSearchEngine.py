@@ -1,6 +1,11 @@
-import requests
-from groq import Groq
-from json import load, dump, dumps
+import Hedging
+import asyncio
+import Tracing
+import Sessions
+import WebPages
+import SearchProviders
+import SingleFlight
+from json import load, dump
 import datetime
 from dotenv import dotenv_values
 
@@ -10,11 +15,6 @@ env_vars = dotenv_values(".env")
 # Retrieve keys
 Username = env_vars.get("Username")
 Assistantname = env_vars.get("Assistantname")
-GroqAPIKey = env_vars.get("GroqAPIKey")
-SerperAPIKey = env_vars.get("SerperAPIKey")
-
-# Initialize Groq client
-client = Groq(api_key=GroqAPIKey)
 
 # Define System Prompt
 System = f"""Hello, I am {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which has real-time up-to-date information from the internet.
@@ -29,33 +29,21 @@ except FileNotFoundError:
     with open(r"Data\ChatLog.json", "w") as f:
         dump([], f)
 
-# --- SERPER.DEV SEARCH FUNCTION (100% Working) ---
+# Identical searches running at the same time (a repeated command, two sessions) share one request
+Searches = SingleFlight.GetGroup("search")
+
+# --- WEB SEARCH FUNCTION (Serper + HTML search, raced) ---
+@Tracing.Traced("search")
 def GoogleSearch(query):
+    return Searches.Do(SingleFlight.Fingerprint(query), lambda: _google_search(query))
+
+def _google_search(query):
     try:
-        url = "https://google.serper.dev/search"
-        
-        payload = dumps({
-            "q": query,
-            "num": 5  # Number of results
-        })
+        # Serper and the HTML search page are asked at once; their results are merged (see SearchProviders)
+        results = SearchProviders.Search(query, num=5)
         
-        headers = {
-            'X-API-KEY': SerperAPIKey,
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.request("POST", url, headers=headers, data=payload)
-        
-        if response.status_code != 200:
-            return "Error: Serper API request failed. Check your API Key."
-            
-        data = response.json()
-        
-        # Check if organic results exist
-        if 'organic' not in data:
+        if not results:
             return "No search results found."
-            
-        results = data['organic']
         
         Answer = f"The search results for '{query}' are:\n[start]\n"
         
@@ -66,6 +54,11 @@ def GoogleSearch(query):
             Answer += f"Title: {title}\nDescription: {snippet}\nLink: {link}\n\n"
             
         Answer += "[end]"
+
+        # The most relevant passages of the top pages themselves, read at once within a deadline
+        pages = WebPages.Context(query, results)
+        if pages:
+            Answer += "\n" + pages
         return Answer
         
     except Exception as e:
@@ -102,41 +95,40 @@ def Information():
     data += f"Time: {hour} hours, {minute} minutes, {second} seconds.\n"
     return data
 
-# Main Realtime Search Engine Function
-def RealtimeSearchEngine(prompt):
-    global SystemChatBot, messages
-    
-    with open(r"Data\ChatLog.json", "r") as f:
-        messages = load(f)
-    
+# Streams the answer built from the search results; the chat log is saved once it is complete
+@Tracing.Traced("realtime")
+def RealtimeSearchEngineStream(prompt):
+    messages = Sessions.LoadChatLog()
     messages.append({"role": "user", "content": f"{prompt}"})
-    
+
     #print(f"Searching via Serper for: {prompt}...") # Debug msg
-    
+
     search_results = GoogleSearch(prompt)
-    
-    completion = client.chat.completions.create(
-        model="llama-3.3-70b-versatile", 
-        messages=SystemChatBot + [{"role": "system", "content": search_results}] + [{"role": "system", "content": Information()}] + messages,
+
+    chunks = []
+    for text in Hedging.Stream(
+        SystemChatBot + [{"role": "system", "content": search_results}] + [{"role": "system", "content": Information()}] + Sessions.Context(messages),
+        model="llama-3.3-70b-versatile",
         max_tokens=2048,
         temperature=0.7,
         top_p=1,
-        stream=True,
         stop=None
-    )
-    
-    Answer = ""
-    for chunk in completion:
-        if chunk.choices[0].delta.content:
-            Answer += chunk.choices[0].delta.content
-            
-    Answer = Answer.strip().replace("</s>", "")
+    ):
+        text = text.replace("</s>", "")
+        chunks.append(text)
+        yield text
+
+    Answer = "".join(chunks).strip()
     messages.append({"role": "assistant", "content": Answer})
-    
-    with open(r"Data\ChatLog.json", "w") as f:
-        dump(messages, f, indent=4)
-        
-    return AnswerModifier(Answer=Answer)
+    Sessions.SaveChatLog(messages)
+
+# Main Realtime Search Engine Function
+def RealtimeSearchEngine(prompt):
+    return AnswerModifier(Answer="".join(RealtimeSearchEngineStream(prompt)).strip())
+
+# Async version for the backend loop; Serper and Groq calls run on its bounded executor
+async def ARealtimeSearchEngine(prompt):
+    return await asyncio.to_thread(RealtimeSearchEngine, prompt)
 
 if __name__ == "__main__":
     while True:
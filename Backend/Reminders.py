@@ -0,0 +1,391 @@
+import os
+import re
+import json
+import heapq
+import uuid
+import threading
+from datetime import datetime, timedelta
+from time import time
+
+# Append-only journal of reminder events ({"op": "add" | "fired" | "cancel", ...}), replayed on start
+ReminderFile = os.path.join("Data", "Reminders.jsonl")
+
+# The timer thread sleeps until the next reminder is due, but wakes at least this often
+# so that wall-clock jumps (sleep/hibernate, clock changes) are noticed
+MaxWait = 3600.0
+
+DefaultHour = 9  # Time used when only a date is given
+
+Months = {m: i + 1 for i, m in enumerate(["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"])}
+Weekdays = {d: i for i, d in enumerate(["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"])}
+Units = {"minute": 60, "min": 60, "hour": 3600, "hr": 3600, "day": 86400, "week": 604800}
+
+_month = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+TimeRe = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)|\b([01]?\d|2[0-3]):([0-5]\d)\b|\b(noon|midnight)\b")
+DayMonthRe = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?" + _month + r"(?:,?\s+(\d{4}))?\b")
+MonthDayRe = re.compile(r"\b" + _month + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b")
+NumericDateRe = re.compile(r"\b(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?\b")
+RelativeRe = re.compile(r"\bin\s+(\d+|an?|one)\s+(minute|min|hour|hr|day|week)s?\b")
+DayWordRe = re.compile(r"\b(today|tonight|tomorrow)\b")
+WeekdayRe = re.compile(r"\b(?:on\s+|next\s+|this\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b")
+Filler = re.compile(r"^(?:(?:remind me|reminder|to|for|about|that|at|on|of|by|me|i have|i've got)\b\s*)+|(?:\s+\b(?:at|on|by|for))+$")
+
+
+def ParseReminder(text, now=None):
+    """Split router text like '9:00pm 25th june business meeting' into (datetime, message).
+
+    Understands clock times (9pm, 9:30 pm, 21:30, noon), dates (25th june, june 25,
+    25/06), today/tonight/tomorrow, weekdays and 'in 10 minutes'. Raises ValueError
+    if the text has no recognisable time or date.
+    """
+    now = now or datetime.now()
+    lowered = text.lower()
+    spans = []
+
+    def take(match):
+        spans.append(match.span())
+        return match
+
+    relative = RelativeRe.search(lowered)
+    if relative:
+        take(relative)
+        amount = 1 if relative.group(1) in ("a", "an", "one") else int(relative.group(1))
+        due = now + timedelta(seconds=amount * Units[relative.group(2)])
+        return due.replace(microsecond=0), _message(text, spans)
+
+    hour = minute = None
+    match = TimeRe.search(lowered)
+    if match:
+        take(match)
+        if match.group(6):
+            hour, minute = (12, 0) if match.group(6) == "noon" else (0, 0)
+        elif match.group(3):
+            hour, minute = int(match.group(1)) % 12, int(match.group(2) or 0)
+            if match.group(3).startswith("p"):
+                hour += 12
+        else:
+            hour, minute = int(match.group(4)), int(match.group(5))
+        if hour > 23 or minute > 59:
+            raise ValueError(f"Invalid time in reminder: {match.group(0)!r}")
+
+    date, explicit_year = None, False
+    for pattern, order in ((DayMonthRe, "dm"), (MonthDayRe, "md"), (NumericDateRe, "num")):
+        match = pattern.search(lowered)
+        if not match:
+            continue
+        take(match)
+        if order == "dm":
+            day, month, year = int(match.group(1)), Months[match.group(2)], match.group(3)
+        elif order == "md":
+            month, day, year = Months[match.group(1)], int(match.group(2)), match.group(3)
+        else:
+            day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+        explicit_year = year is not None
+        year = int(year) if year else now.year
+        if year < 100:
+            year += 2000
+        try:
+            date = datetime(year, month, day).date()
+        except ValueError:
+            raise ValueError(f"Invalid date in reminder: {match.group(0)!r}")
+        break
+
+    if date is None:
+        match = DayWordRe.search(lowered)
+        if match:
+            take(match)
+            date = now.date() + timedelta(days=1 if match.group(1) == "tomorrow" else 0)
+            if match.group(1) == "tonight" and hour is None:
+                hour, minute = 20, 0
+        else:
+            match = WeekdayRe.search(lowered)
+            if match:
+                take(match)
+                ahead = (Weekdays[match.group(1)] - now.weekday()) % 7 or 7
+                date = now.date() + timedelta(days=ahead)
+
+    if hour is None and date is None:
+        raise ValueError(f"No time or date found in reminder: {text!r}")
+    if hour is None:
+        hour, minute = DefaultHour, 0
+
+    due = datetime.combine(date or now.date(), datetime.min.time()).replace(hour=hour, minute=minute)
+    if due <= now:
+        if date is None:
+            due += timedelta(days=1)  # A time that has already passed today means tomorrow
+        elif not explicit_year and due.date() < now.date():
+            due = due.replace(year=due.year + 1)  # '5th jan' in December means next January
+    return due, _message(text, spans)
+
+
+def _message(text, spans):
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+    message = Filler.sub("", " ".join(text.split()).strip(" ,.-")).strip(" ,.-")
+    return message or "Reminder"
+
+
+class Reminder:
+    def __init__(self, due, message, reminder_id=None, created=None):
+        self.id = reminder_id or uuid.uuid4().hex[:12]
+        self.due = due                # Epoch seconds
+        self.message = message
+        self.created = created or time()
+        self.late = False             # Set when it fires after its due time (e.g. Jarvis was closed)
+
+    def When(self):
+        return datetime.fromtimestamp(self.due).strftime("%I:%M %p, %d %b %Y").lstrip("0")
+
+    def AsDict(self):
+        return {"id": self.id, "due": self.due, "message": self.message, "created": self.created}
+
+
+class ReminderScheduler:
+    """Pending reminders in a min-heap, fired by one timer thread.
+
+    The thread sleeps on a Condition until the earliest reminder is due; adding
+    an earlier one wakes it. Every change is appended to a journal that is
+    replayed on start, and a reminder is journalled as fired only once it has
+    been delivered, so a restart never drops one: those that came due while
+    Jarvis was closed fire straight away, marked late, and one that was being
+    delivered when Jarvis stopped fires again.
+    """
+
+    def __init__(self, path=ReminderFile):
+        self.path = path
+        self.pending = {}          # id -> Reminder
+        self.heap = []             # (due, id); cancelled ids are skipped when popped
+        self.delivering = {}       # id -> Reminder popped as due but not yet journalled as fired
+        self.Listeners = []        # Called with each Reminder as it fires, from the timer thread
+        self._condition = threading.Condition()
+        self._journal = None
+        self._journal_lines = 0
+        self._thread = None
+        self._running = False
+        self._loaded = False
+
+    # ----- persistence -----
+
+    def Load(self):
+        with self._condition:
+            if self._loaded:
+                return
+            self._loaded = True
+            added, done, lines = {}, set(), 0
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        lines += 1
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            continue  # A torn last line from a crash
+                        if event.get("op") == "add":
+                            added[event["id"]] = event
+                        else:
+                            done.add(event.get("id"))
+            except FileNotFoundError:
+                pass
+            for reminder_id, event in added.items():
+                if reminder_id not in done:
+                    self.pending[reminder_id] = Reminder(event["due"], event["message"], reminder_id, event.get("created"))
+            self.heap = [(r.due, r.id) for r in self.pending.values()]
+            heapq.heapify(self.heap)
+            self._journal_lines = lines
+            if lines > 2 * len(self.pending) + 100:
+                self._compact()
+
+    def _compact(self):
+        if self._journal is not None:
+            self._journal.close()  # Reopened on the next write, so it appends to the compacted file
+            self._journal = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            for reminder in list(self.pending.values()) + list(self.delivering.values()):
+                f.write(json.dumps({"op": "add", **reminder.AsDict()}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        self._journal_lines = len(self.pending) + len(self.delivering)
+
+    def _write(self, event):
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._journal = open(self.path, "a", encoding="utf-8")
+        self._journal.write(json.dumps(event) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal_lines += 1
+
+    # ----- public API -----
+
+    def Add(self, due, message):
+        """Schedule `message` at `due` (datetime or epoch seconds); returns the Reminder."""
+        self.Load()
+        if isinstance(due, datetime):
+            due = due.timestamp()
+        reminder = Reminder(float(due), message)
+        with self._condition:
+            self._write({"op": "add", **reminder.AsDict()})
+            self.pending[reminder.id] = reminder
+            heapq.heappush(self.heap, (reminder.due, reminder.id))
+            if self.heap[0][1] == reminder.id:
+                self._condition.notify()  # New earliest reminder: the timer thread re-computes its wait
+        return reminder
+
+    def AddFromText(self, text, now=None):
+        due, message = ParseReminder(text, now)
+        return self.Add(due, message)
+
+    def Cancel(self, reminder_id):
+        with self._condition:
+            if self.pending.pop(reminder_id, None) is None:
+                return False
+            self._write({"op": "cancel", "id": reminder_id})
+            return True
+
+    def Pending(self):
+        with self._condition:
+            return sorted(self.pending.values(), key=lambda r: r.due)
+
+    # ----- timer thread -----
+
+    def Start(self):
+        self.Load()
+        with self._condition:
+            if self._thread is not None:
+                return self
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="ReminderTimer", daemon=True)
+            self._thread.start()
+        return self
+
+    def Stop(self):
+        with self._condition:
+            self._running = False
+            thread, self._thread = self._thread, None
+            self._condition.notify()
+        if thread is not None:
+            thread.join(5)
+        with self._condition:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _due(self):
+        """Pop everything that is due or wait for the next one."""
+        with self._condition:
+            while self._running:
+                now = time()
+                fired = []
+                while self.heap and self.heap[0][0] <= now:
+                    due, reminder_id = heapq.heappop(self.heap)
+                    reminder = self.pending.pop(reminder_id, None)
+                    if reminder is None:
+                        continue  # Cancelled
+                    reminder.late = now - due > 60
+                    self.delivering[reminder_id] = reminder
+                    fired.append(reminder)
+                if fired:
+                    return fired
+                timeout = min(self.heap[0][0] - now, MaxWait) if self.heap else MaxWait
+                self._condition.wait(timeout)
+            return []
+
+    def _run(self):
+        while self._running:
+            for reminder in self._due():
+                self._deliver(reminder)
+                # Journalled after delivery: a crash in between repeats the reminder instead of losing it
+                with self._condition:
+                    self.delivering.pop(reminder.id, None)
+                    self._write({"op": "fired", "id": reminder.id, "at": time()})
+                    if self._journal_lines > 2 * len(self.pending) + 1000:
+                        self._compact()
+
+    def _deliver(self, reminder):
+        if not self.Listeners:
+            print(f"Reminder: {reminder.message} ({reminder.When()})")
+        for listener in list(self.Listeners):
+            try:
+                listener(reminder)
+            except Exception as e:
+                print(f"Reminder listener error: {e}")
+
+
+# Shared scheduler; the GUI registers a listener and starts it
+Scheduler = ReminderScheduler()
+
+
+# --- Benchmark: 10k pending reminders, firing accuracy and restart without loss or duplicates ---
+if __name__ == "__main__":
+    import tempfile
+    from time import perf_counter, sleep
+
+    now = datetime(2025, 6, 20, 18, 30)
+    for text in ["9:00pm 25th june business meeting", "11:00pm 5th aug dancing performance", "7am tomorrow gym",
+                 "in 10 minutes check the oven", "june 3 pay rent", "noon on friday lunch with rahul", "25/12 christmas party",
+                 "8:15 call mom", "tonight watch the match", "15th jan 2026 passport renewal"]:
+        due, message = ParseReminder(text, now)
+        print(f"{text!r:45} -> {due:%Y-%m-%d %H:%M}  {message!r}")
+
+    path = os.path.join(tempfile.mkdtemp(prefix="jarvis-reminders-"), "Reminders.jsonl")
+    scheduler = ReminderScheduler(path)
+    fired, lateness = [], []
+    lock = threading.Lock()
+
+    def on_fire(reminder):
+        with lock:
+            fired.append(reminder.id)
+            lateness.append(time() - reminder.due)
+
+    scheduler.Listeners.append(on_fire)
+    scheduler.Start()
+
+    count = 10_000
+    start = perf_counter()
+    base = time()
+    ids = [scheduler.Add(base + 3600 + i, f"far reminder {i}").id for i in range(count)]
+    print(f"\nAdded {count} reminders in {perf_counter() - start:.2f} s ({(perf_counter() - start) / count * 1e6:.0f} us each, fsync per add)")
+
+    soon = [scheduler.Add(time() + 0.2 + i * 0.01, f"soon {i}").id for i in range(200)]
+    sleep(2.5)
+    lateness.sort()
+    print(f"Fired {len(fired)}/200 due reminders; lateness p50 {lateness[len(lateness) // 2] * 1000:.1f} ms, "
+          f"max {lateness[-1] * 1000:.1f} ms")
+
+    # Restart: some due while 'closed', none may fire twice
+    later = [scheduler.Add(time() + 0.5 + i * 0.01, f"while closed {i}").id for i in range(100)]
+    scheduler.Stop()
+    sleep(1.8)
+    before = len(fired)
+    restarted = ReminderScheduler(path)
+    restarted.Listeners.append(on_fire)
+    restarted.Start()
+    sleep(0.5)
+    restarted.Stop()
+    duplicates = len(fired) - len(set(fired))
+    missed = [i for i in soon + later if i not in set(fired)]
+    print(f"After restart: {len(fired) - before} late reminders fired, {duplicates} duplicates, {len(missed)} missed, "
+          f"{len(restarted.pending)} still pending")
+
+    # Crash while delivering: the reminder isn't journalled as fired yet, so it fires again after the restart
+    crashed, refired = [], []
+    crashing = ReminderScheduler(path)
+
+    def crash(reminder):
+        crashed.append(reminder.id)
+        raise SystemExit  # Ends the timer thread here, like the process dying mid-delivery
+
+    crashing.Listeners.append(crash)
+    crashing.Start()
+    reminder_id = crashing.Add(time() + 0.1, "during a crash").id
+    sleep(0.5)
+    crashing.Stop()
+    restarted = ReminderScheduler(path)
+    restarted.Listeners.append(lambda reminder: refired.append(reminder.id))
+    restarted.Start()
+    sleep(0.5)
+    restarted.Stop()
+    print(f"Crash during delivery: shown {crashed.count(reminder_id)}x before, {refired.count(reminder_id)}x after the restart")
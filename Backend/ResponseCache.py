@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import threading
+from array import array
+from time import perf_counter, time
+import numpy as np
+from dotenv import dotenv_values
+from Embeddings import HashingVectorizer
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+# Cosine similarity needed to reuse an answer, and how many answers to keep
+CacheThreshold = float(env_vars.get("CacheThreshold") or 0.9)
+CacheCapacity = int(env_vars.get("CacheCapacity") or 20000)
+
+CacheFile = os.path.join("Data", "ResponseCache")
+
+# Queries whose answer depends on when they are asked or on earlier turns are never cached
+TimeSensitive = re.compile(
+    r"\b(time|date|day|today|tonight|tomorrow|yesterday|now|current|currently|latest|recent|news|weather|"
+    r"this (week|month|year)|price|stock|score|live|reminder|remind|"
+    r"he|she|him|her|his|hers|they|them|their|it|its|that|this|those|these|more|again|previous|last)\b",
+    re.IGNORECASE,
+)
+
+
+def Normalize(query):
+    return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+
+class ResponseCache:
+    """Semantic cache of question -> answer pairs.
+
+    Queries are embedded locally into sparse hashed TF-IDF vectors and kept in
+    an inverted index (bucket -> slots, weights), so a lookup only touches the
+    postings of the query's own features; np.bincount turns them into cosine
+    scores for every cached question at once. Capacity is fixed; when full the
+    least recently used entry is evicted and its postings are dropped lazily.
+    """
+
+    def __init__(self, capacity=CacheCapacity, threshold=CacheThreshold, dim=2 ** 18, path=CacheFile):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.path = path
+        self.vectorizer = HashingVectorizer(dim)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.generation = np.zeros(capacity, dtype=np.int32)  # Bumped when a slot is reused
+        self.queries = [None] * capacity
+        self.answers = [None] * capacity
+        self.vectors = [None] * capacity  # slot -> (buckets, weights), kept for compaction and Save()
+        self.exact = {}                   # normalized query -> slot
+        self.postings = {}                # bucket -> (array of slots, array of weights, array of generations)
+        self.stale = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.enabled = True
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def Cacheable(query):
+        return not TimeSensitive.search(query)
+
+    def _score(self, buckets, weights, rerank=8):
+        """Best (slot, cosine) for a query vector.
+
+        Postings of very common features (low IDF, e.g. "what") are skipped when
+        gathering candidates; the top candidates are then re-scored exactly.
+        """
+        common_limit = max(1000, self.size // 20)
+        slots, values = [], []
+        for bucket, weight in zip(buckets.tolist(), weights.tolist()):
+            posting = self.postings.get(bucket)
+            if posting is None or len(posting[0]) > common_limit:
+                continue
+            posting_slots = np.frombuffer(posting[0], dtype=np.int32)
+            live = np.frombuffer(posting[2], dtype=np.int32) == self.generation[posting_slots]
+            slots.append(posting_slots[live])
+            values.append(np.frombuffer(posting[1], dtype=np.float32)[live] * weight)
+        if not slots:
+            return None, 0.0
+
+        partial = np.bincount(np.concatenate(slots), np.concatenate(values))
+        touched = np.flatnonzero(partial)
+        if len(touched) > rerank:
+            touched = touched[np.argpartition(partial[touched], -rerank)[-rerank:]]
+
+        query = dict(zip(buckets.tolist(), weights.tolist()))
+        best, best_score = None, 0.0
+        for slot in touched.tolist():
+            entry_buckets, entry_weights = self.vectors[slot]
+            score = sum(query.get(b, 0.0) * w for b, w in zip(entry_buckets.tolist(), entry_weights.tolist()))
+            if score > best_score:
+                best, best_score = slot, score
+        return best, best_score
+
+    def Lookup(self, query):
+        """Return a cached answer for a similar question, or None."""
+        if not self.enabled:
+            return None
+        if not self.Cacheable(query):
+            self.skipped += 1
+            return None
+
+        key = Normalize(query)
+        with self._lock:
+            slot = self.exact.get(key)
+            if slot is None:
+                best, score = self._score(*self.vectorizer.TransformSparse(query))
+                if best is not None and score >= self.threshold:
+                    slot = best
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.last_used[slot] = time()
+            return self.answers[slot]
+
+    def _index(self, slot, buckets, weights):
+        generation = int(self.generation[slot])
+        for bucket, weight in zip(buckets.tolist(), weights.tolist()):
+            posting = self.postings.get(bucket)
+            if posting is None:
+                posting = self.postings[bucket] = (array("i"), array("f"), array("i"))
+            posting[0].append(slot)
+            posting[1].append(weight)
+            posting[2].append(generation)
+
+    def _compact(self):
+        """Rebuild the postings once evicted entries outnumber live ones."""
+        self.postings = {}
+        for slot in range(self.size):
+            self._index(slot, *self.vectors[slot])
+        self.stale = 0
+
+    def Add(self, query, answer):
+        if not self.enabled or not self.Cacheable(query) or not answer:
+            return
+        key = Normalize(query)
+        self.vectorizer.Fit(query)
+        buckets, weights = self.vectorizer.TransformSparse(query)
+        with self._lock:
+            slot = self.exact.get(key)
+            if slot is None:
+                if self.size < self.capacity:
+                    slot = self.size
+                    self.size += 1
+                else:
+                    slot = int(self.last_used[:self.size].argmin())  # Evict the least recently used answer
+                    self.exact.pop(Normalize(self.queries[slot]), None)
+                self.exact[key] = slot
+            if self.vectors[slot] is not None:
+                self.generation[slot] += 1
+                self.stale += len(self.vectors[slot][0])
+            self.vectors[slot] = (buckets, weights)
+            self.queries[slot] = query
+            self.answers[slot] = answer
+            self.last_used[slot] = time()
+            self._index(slot, buckets, weights)
+            if self.stale > self.size * 16:
+                self._compact()
+
+    def Stats(self):
+        lookups = self.hits + self.misses
+        postings = sum(len(p[0]) for p in self.postings.values())
+        return {"entries": self.size, "hits": self.hits, "misses": self.misses, "skipped": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "index_mb": (postings * 12 + self.last_used.nbytes + self.generation.nbytes) / 2 ** 20}
+
+    # ----- persistence -----
+
+    def Save(self):
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            entries = [{"query": self.queries[i], "answer": self.answers[i], "last_used": float(self.last_used[i]),
+                        "buckets": self.vectors[i][0].tolist(), "weights": self.vectors[i][1].tolist()}
+                       for i in range(self.size)]
+            np.save(self.path + ".df.tmp.npy", self.vectorizer.df)
+            with open(self.path + ".tmp.json", "w", encoding="utf-8") as f:
+                json.dump({"docs": self.vectorizer.docs, "entries": entries}, f)
+            os.replace(self.path + ".df.tmp.npy", self.path + ".df.npy")
+            os.replace(self.path + ".tmp.json", self.path + ".json")
+
+    def Load(self):
+        try:
+            df = np.load(self.path + ".df.npy")
+            with open(self.path + ".json", "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError, OSError):
+            return
+        if df.shape != self.vectorizer.df.shape:
+            return
+        with self._lock:
+            self.vectorizer.df[:] = df
+            self.vectorizer.docs = int(data["docs"])
+            for slot, entry in enumerate(data["entries"][:self.capacity]):
+                self.queries[slot] = entry["query"]
+                self.answers[slot] = entry["answer"]
+                self.last_used[slot] = entry["last_used"]
+                self.vectors[slot] = (np.array(entry["buckets"], dtype=np.int32), np.array(entry["weights"], dtype=np.float32))
+                self.exact[Normalize(entry["query"])] = slot
+                self.size = slot + 1
+            self._compact()
+
+
+# Shared cache used by Chatbot
+Cache = ResponseCache()
+
+
+# --- Benchmark: lookup latency at 100k cached entries ---
+if __name__ == "__main__":
+    import random
+
+    random.seed(3)
+    subjects = ["python", "java", "rust", "akbar", "gravity", "photosynthesis", "democracy", "inflation", "mitochondria",
+                "black holes", "machine learning", "the roman empire", "chess", "yoga", "blockchain", "the himalayas"]
+    templates = ["what is {}?", "explain {} simply", "give me a summary of {}", "why is {} important?",
+                 "how does {} work?", "what are the basics of {}?", "history of {}", "pros and cons of {}"]
+
+    entries = 100_000
+    cache = ResponseCache(capacity=entries, path=None)
+    start = perf_counter()
+    for i in range(entries):
+        question = random.choice(templates).format(random.choice(subjects)) + f" variant {i}"
+        cache.Add(question, f"answer {i}")
+    print(f"Filled {entries} entries in {perf_counter() - start:.1f} s, index {cache.Stats()['index_mb']:.0f} MB")
+
+    timings = []
+    for i in range(2000):
+        query = random.choice(templates).format(random.choice(subjects)) + f" variant {random.randrange(entries)}"
+        start = perf_counter()
+        cache.Lookup(query)
+        timings.append(perf_counter() - start)
+    timings.sort()
+    print(f"Lookup at {entries}: p50 {timings[len(timings) // 2] * 1000:.2f} ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.2f} ms")
+    print(cache.Stats())
+
+    demo = ResponseCache(capacity=100, path=None)
+    demo.Add("what is python programming language?", "Python is a programming language.")
+    for query in ["What is the Python programming language", "what's python programming language?", "what's the time?", "who is he?"]:
+        print(f"{query!r} -> {demo.Lookup(query)!r}")
@@ -0,0 +1,476 @@
+import os
+import re
+import json
+import glob
+import zlib
+import shutil
+import hashlib
+import threading
+from array import array
+from collections import Counter
+import numpy as np
+from dotenv import dotenv_values
+from Embeddings import Tokenize
+import Sessions
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+RetrievalPassages = int(env_vars.get("RetrievalPassages") or 3)         # Passages added to a chat prompt (0 = off)
+RetrievalCoverage = float(env_vars.get("RetrievalCoverage") or 0.5)     # Share of the question's words a passage must contain
+
+IndexPath = os.path.join("Data", "Index")
+DocumentsPath = os.path.join("Data", "Documents")   # Drop .txt, .md or .html files here to make them searchable
+ContentFiles = os.path.join("Data", "*.txt")         # Written by Automation.Content
+
+PassageWords = 120     # Passages are cut at paragraph boundaries to about this many words
+VectorDim = 128
+FlushEvery = 50_000    # Passages whose postings are kept in memory before they are written as a segment
+MaxSegments = 8        # More than this and all segments are merged into one
+K1, B = 1.2, 0.75      # BM25
+FusionK = 60           # Reciprocal rank fusion
+Candidates = 50        # From each of BM25 and the vector search
+
+
+# Hashes of words seen so far; crc32 is stable across runs, unlike hash()
+_hashes = {}
+
+
+def Terms(words):
+    """{term hash: count} of a passage's words for BM25."""
+    if len(_hashes) > 2_000_000:
+        _hashes.clear()
+    terms = {}
+    for word, count in Counter(words).items():
+        term = _hashes.get(word)
+        if term is None:
+            term = _hashes[word] = zlib.crc32(word.encode("utf-8"))
+        terms[term] = terms.get(term, 0) + count
+    return terms
+
+
+def Vector(words, dim=VectorDim):
+    """Signed hashing of character trigrams, L2-normalised: finds "photosynthetic" from "photosynthesis"
+    where word-level BM25 doesn't. Computed with numpy, stable across runs."""
+    data = np.frombuffer(f"  {' '.join(words)}  ".encode("utf-8"), dtype=np.uint8).astype(np.uint32)
+    if len(data) < 3:
+        return np.zeros(dim, dtype=np.float32)
+    grams = (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+    mixed = grams * np.uint32(2654435761)  # Knuth's multiplicative hash, wraps mod 2**32
+    vector = np.bincount((mixed >> 8) % dim, np.where(mixed & 1, 1.0, -1.0), minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+# Question words say nothing about which passage answers
+QuestionWords = {"what", "when", "where", "which", "who", "whom", "why", "how", "many", "much"}
+
+
+def Stems(text):
+    """Words of the text cut to 4 letters, so "rule" matches "ruled" when checking coverage."""
+    return {w[:4] for w in Tokenize(text) if w not in QuestionWords}
+
+
+def Chunk(text, words=PassageWords):
+    """Split text into passages of about `words` words, keeping paragraphs together where they fit."""
+    passages, current = [], []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        tokens = paragraph.split()
+        while len(tokens) > words:
+            if current:
+                passages.append(" ".join(current))
+                current = []
+            passages.append(" ".join(tokens[:words]))
+            tokens = tokens[words:]
+        if current and len(current) + len(tokens) > words:
+            passages.append(" ".join(current))
+            current = []
+        current += tokens
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class Segment:
+    """BM25 postings of a batch of passages, read from disk through memory maps.
+
+    terms: sorted term hashes; starts[i]:starts[i + 1] is the slice of docs (passage ids)
+    and tfs (term frequencies) for terms[i].
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.terms, self.starts, self.docs, self.tfs = (np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                                                        for name in ("terms", "starts", "docs", "tfs"))
+
+    def Postings(self, term):
+        i = int(np.searchsorted(self.terms, term))
+        if i < len(self.terms) and self.terms[i] == term:
+            return self.docs[self.starts[i]:self.starts[i + 1]], self.tfs[self.starts[i]:self.starts[i + 1]]
+        return None
+
+    def Flat(self):
+        return np.repeat(np.asarray(self.terms), np.diff(self.starts)), np.asarray(self.docs), np.asarray(self.tfs)
+
+    @staticmethod
+    def Write(path, terms, docs, tfs):
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        unique, starts = np.unique(terms, return_index=True)
+        temporary = path + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name, values in (("terms", unique.astype(np.uint32)), ("starts", np.append(starts, len(terms)).astype(np.int64)),
+                             ("docs", docs.astype(np.int32)), ("tfs", tfs.astype(np.uint16))):
+            np.save(os.path.join(temporary, f"{name}.npy"), values)
+        os.replace(temporary, path)
+        return Segment(path)
+
+
+class PassageIndex:
+    """Local search over generated content, past answers and the user's documents: BM25 plus vectors.
+
+    Passage text, lengths and vectors are appended to flat files and read through np.memmap;
+    postings of new passages are kept in memory and written as an immutable segment every
+    FlushEvery passages (or on Save). Only meta.json says what is committed, so an
+    interrupted run loses at most the passages added since the last Save, and Sync() adds them again.
+    Results of BM25 and the vector search are combined with reciprocal rank fusion.
+    """
+
+    Files = {"texts": np.uint8, "offsets": np.int64, "lengths": np.uint16, "vectors": np.float32, "owners": np.int32}
+
+    def __init__(self, path=IndexPath, dim=VectorDim):
+        self.path = path
+        self.dim = dim
+        self.count = 0
+        self.text_bytes = 0
+        self.total_length = 0
+        self.segments = []
+        self.next_segment = 0
+        self.sources = {}         # key -> {"stamp", "first", "count", "id"}
+        self.source_keys = []     # id -> key
+        self.deleted = set()      # Passages of sources that changed or disappeared
+        self.pending = {}         # term -> (array of passage ids, array of term frequencies), not yet in a segment
+        self.pending_passages = 0
+        self._handles = None
+        self._maps = None
+        self._thread = None
+        self._lock = threading.RLock()
+        self._load()
+
+    # ----- storage -----
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if meta.get("dim") != self.dim:
+            return
+        self.count, self.text_bytes, self.total_length = meta["count"], meta["text_bytes"], meta["total_length"]
+        self.next_segment = meta["next_segment"]
+        self.sources = meta["sources"]
+        self.source_keys = [None] * len(self.sources)
+        for key, source in self.sources.items():
+            self.source_keys[source["id"]] = key
+        self.deleted = set(meta["deleted"])
+        self.segments = [Segment(os.path.join(self.path, name)) for name in meta["segments"]]
+        # Drop whatever was appended after the last commit
+        sizes = {"texts": self.text_bytes, "offsets": self.count * 8, "lengths": self.count * 2,
+                 "vectors": self.count * self.dim * 4, "owners": self.count * 4}
+        for name, size in sizes.items():
+            if os.path.exists(self._file(name)) and os.path.getsize(self._file(name)) > size:
+                with open(self._file(name), "r+b") as f:
+                    f.truncate(size)
+
+    def _open(self):
+        if self._handles is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._handles = {name: open(self._file(name), "ab") for name in self.Files}
+        return self._handles
+
+    def _mapped(self):
+        """Memory maps of the passage files, reopened after appends."""
+        if self._maps is None or self._maps["count"] != self.count:
+            for handle in (self._handles or {}).values():
+                handle.flush()
+            self._maps = {"count": self.count}
+            for name, dtype in self.Files.items():
+                size = os.path.getsize(self._file(name)) if os.path.exists(self._file(name)) else 0
+                self._maps[name] = np.memmap(self._file(name), dtype=dtype, mode="r") if size else np.zeros(0, dtype)
+            self._maps["vectors"] = self._maps["vectors"].reshape(-1, self.dim)
+        return self._maps
+
+    def Save(self):
+        """Write the pending postings as a segment and commit everything added so far."""
+        with self._lock:
+            if self._handles is None and not self.pending:
+                return
+            if self.pending:
+                terms = np.fromiter((t for t, (docs, _) in self.pending.items() for _ in range(len(docs))), dtype=np.uint32)
+                docs = np.concatenate([np.frombuffer(d, dtype=np.int32) for d, _ in self.pending.values()])
+                tfs = np.concatenate([np.frombuffer(t, dtype=np.uint16) for _, t in self.pending.values()])
+                self.segments.append(Segment.Write(os.path.join(self.path, f"segment{self.next_segment}"), terms, docs, tfs))
+                self.next_segment += 1
+                self.pending, self.pending_passages = {}, 0
+                if len(self.segments) > MaxSegments:
+                    self._merge()
+            for handle in (self._handles or {}).values():
+                handle.flush()
+                os.fsync(handle.fileno())
+            meta = {"dim": self.dim, "count": self.count, "text_bytes": self.text_bytes, "total_length": self.total_length,
+                    "next_segment": self.next_segment, "segments": [os.path.basename(s.path) for s in self.segments],
+                    "sources": self.sources, "deleted": sorted(self.deleted)}
+            with open(os.path.join(self.path, "meta.tmp.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(os.path.join(self.path, "meta.tmp.json"), os.path.join(self.path, "meta.json"))
+            for name in os.listdir(self.path):
+                if name.startswith("segment") and name not in meta["segments"]:
+                    shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)  # Merged away
+
+    def _merge(self):
+        parts = [segment.Flat() for segment in self.segments]
+        terms, docs, tfs = (np.concatenate([p[i] for p in parts]) for i in range(3))
+        if self.deleted:
+            keep = ~np.isin(docs, np.fromiter(self.deleted, dtype=np.int32))
+            terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+        self.segments = [Segment.Write(os.path.join(self.path, f"segment{self.next_segment}"), terms, docs, tfs)]
+        self.next_segment += 1
+
+    # ----- adding -----
+
+    def Add(self, key, passages, stamp=""):
+        """Index the passages of one source (a file, a chat answer ...), replacing its earlier version."""
+        with self._lock:
+            handles = self._open()
+            old = self.sources.get(key)
+            if old is not None:
+                self.deleted.update(range(old["first"], old["first"] + old["count"]))
+                source_id = old["id"]
+            else:
+                source_id = len(self.source_keys)
+                self.source_keys.append(key)
+            first = self.count
+            raws, offsets, lengths, vectors = [], [], [], []
+            for text in passages:
+                raw = text.encode("utf-8")
+                words = Tokenize(text)
+                for term, tf in Terms(words).items():
+                    entry = self.pending.get(term)
+                    if entry is None:
+                        entry = self.pending[term] = (array("i"), array("H"))
+                    entry[0].append(self.count)
+                    entry[1].append(tf if tf < 65535 else 65535)
+                self.text_bytes += len(raw)
+                raws.append(raw)
+                offsets.append(self.text_bytes)
+                lengths.append(min(len(words), 65535))
+                vectors.append(Vector(words, self.dim))
+                self.total_length += len(words)
+                self.count += 1
+            if raws:
+                handles["texts"].write(b"".join(raws))
+                handles["offsets"].write(np.array(offsets, dtype=np.int64).tobytes())
+                handles["lengths"].write(np.array(lengths, dtype=np.uint16).tobytes())
+                handles["vectors"].write(np.array(vectors, dtype=np.float32).tobytes())
+                handles["owners"].write(np.full(len(raws), source_id, dtype=np.int32).tobytes())
+            self.pending_passages += len(raws)
+            self.sources[key] = {"stamp": stamp, "first": first, "count": self.count - first, "id": source_id}
+            if self.pending_passages >= FlushEvery:
+                self.Save()
+            return self.count - first
+
+    def Remove(self, key):
+        with self._lock:
+            source = self.sources.pop(key, None)
+            if source is not None:
+                self.deleted.update(range(source["first"], source["first"] + source["count"]))
+
+    def AddAnswer(self, query, answer):
+        """A chat answer, with its question, as soon as it is given."""
+        key = "chat:" + hashlib.sha1(answer.encode("utf-8")).hexdigest()[:16]
+        if key not in self.sources and answer.strip():
+            self.Add(key, Chunk(f"{query}\n{answer}"))
+
+    def AddFile(self, path):
+        """A content file or document, unless it hasn't changed since it was indexed; returns passages added."""
+        stat = os.stat(path)
+        stamp = f"{stat.st_mtime_ns}:{stat.st_size}"
+        key = "file:" + path
+        if self.sources.get(key, {}).get("stamp") == stamp:
+            return 0
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if path.endswith((".html", ".htm")):
+            from WebPages import Extract
+            title, paragraphs = Extract(text)
+            text = "\n".join([title] + paragraphs)
+        return self.Add(key, Chunk(text), stamp)
+
+    def Sync(self):
+        """Index new and changed content files, documents and ChatLog.json answers; returns passages added."""
+        added = 0
+        files = glob.glob(ContentFiles) + [p for ext in ("txt", "md", "html", "htm")
+                                          for p in glob.glob(os.path.join(DocumentsPath, "**", f"*.{ext}"), recursive=True)]
+        for path in files:
+            added += self.AddFile(path)
+        present = {"file:" + p for p in files}
+        for key in [k for k in self.sources if k.startswith("file:") and k not in present]:
+            self.Remove(key)
+        try:
+            with open(Sessions.ChatLogPath, "r", encoding="utf-8") as f:
+                log = json.load(f)
+        except (FileNotFoundError, ValueError):
+            log = []
+        for question, answer in zip(log, log[1:]):
+            if question.get("role") == "user" and answer.get("role") == "assistant":
+                before = self.count
+                self.AddAnswer(question.get("content", ""), answer.get("content", ""))
+                added += self.count - before
+        self.Save()
+        return added
+
+    def Start(self):
+        """Sync in the background, so the first question doesn't wait for it."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.Sync, name="RetrievalSync", daemon=True)
+            self._thread.start()
+
+    # ----- searching -----
+
+    def _bm25(self, query, maps):
+        docs, weights = [], []
+        live = self.count - len(self.deleted)
+        average = self.total_length / self.count
+        for term in Terms(Tokenize(query)):
+            found = [p for p in (s.Postings(term) for s in self.segments) if p is not None]
+            if term in self.pending:
+                found.append((np.frombuffer(self.pending[term][0], dtype=np.int32), np.frombuffer(self.pending[term][1], dtype=np.uint16)))
+            if not found:
+                continue
+            term_docs = np.concatenate([d for d, _ in found])
+            tfs = np.concatenate([t for _, t in found]).astype(np.float32)
+            idf = np.log(1 + (live - len(term_docs) + 0.5) / (len(term_docs) + 0.5))
+            lengths = maps["lengths"][term_docs]
+            docs.append(term_docs)
+            weights.append(idf * tfs * (K1 + 1) / (tfs + K1 * (1 - B + B * lengths / average)))
+        if not docs:
+            return np.zeros(0, dtype=np.float64)
+        return np.bincount(np.concatenate(docs), np.concatenate(weights), minlength=self.count)
+
+    def _top(self, scores, count):
+        count = min(count + len(self.deleted), len(scores))
+        if count == 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [int(i) for i in top if scores[i] > 0 and int(i) not in self.deleted][:Candidates]
+
+    def Text(self, passage, maps=None):
+        maps = maps or self._mapped()
+        start = int(maps["offsets"][passage - 1]) if passage else 0
+        return bytes(maps["texts"][start:int(maps["offsets"][passage])]).decode("utf-8")
+
+    def Search(self, query, k=RetrievalPassages, coverage=RetrievalCoverage):
+        """Up to k (score, text, source) for the passages that best match the query and contain at least
+        `coverage` of its words."""
+        words = Stems(query)
+        with self._lock:
+            if not self.count or not words or k <= 0:
+                return []
+            maps = self._mapped()
+            ranked = {}
+            for scores in (self._bm25(query, maps), maps["vectors"][:self.count] @ Vector(Tokenize(query), self.dim)):
+                for rank, passage in enumerate(self._top(scores, Candidates)):
+                    ranked[passage] = ranked.get(passage, 0.0) + 1.0 / (FusionK + rank + 1)
+            results = []
+            for passage, score in sorted(ranked.items(), key=lambda item: -item[1]):
+                text = self.Text(passage, maps)
+                if len(words & Stems(text)) >= coverage * len(words):
+                    results.append((score, text, self.source_keys[int(maps["owners"][passage])]))
+                    if len(results) == k:
+                        break
+            return results
+
+    def Stats(self):
+        with self._lock:
+            size = sum(os.path.getsize(os.path.join(root, f)) for root, _, names in os.walk(self.path) for f in names) \
+                if os.path.isdir(self.path) else 0
+            return {"passages": self.count, "sources": len(self.sources), "deleted": len(self.deleted),
+                    "segments": len(self.segments), "pending": self.pending_passages, "disk_mb": size / 2 ** 20}
+
+
+def Prompt(results):
+    """System message text for the chat model with the retrieved passages."""
+    return ("Notes from earlier answers, generated content and the user's documents; use them if they help:\n[start]\n"
+            + "\n\n".join(text for _, text, _ in results) + "\n[end]")
+
+
+# Shared index used by Chatbot
+Index = PassageIndex()
+
+
+# --- Benchmark: build throughput and query latency on synthetic passages (1M by default) ---
+if __name__ == "__main__":
+    import sys
+    import argparse
+    import tempfile
+    from time import perf_counter
+
+    parser = argparse.ArgumentParser(description="Build a passage index and measure query latency")
+    parser.add_argument("-n", "--passages", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    # Zipf-distributed vocabulary, like real text: a few very common words and a long tail
+    rng = np.random.default_rng(7)
+    syllables = ["ka", "ri", "to", "men", "sa", "lo", "vi", "dra", "nu", "pe", "zor", "qui", "bel", "tan", "ox", "fi"]
+    vocabulary = np.array(["".join(rng.choice(syllables, rng.integers(2, 5))) + str(i % 7) for i in range(30000)])
+    ranks = np.minimum(rng.zipf(1.15, size=(args.passages, 60)) - 1, len(vocabulary) - 1)
+
+    directory = tempfile.mkdtemp(prefix="jarvis-index-")
+    index = PassageIndex(os.path.join(directory, "Index"))
+    start = perf_counter()
+    batch = 1000
+    for first in range(0, args.passages, batch):
+        index.Add(f"doc{first}", [" ".join(vocabulary[row]) for row in ranks[first:first + batch]])
+        if (first + batch) % 200_000 == 0:
+            elapsed = perf_counter() - start
+            print(f"  {first + batch} passages, {(first + batch) / elapsed:,.0f} passages/s", file=sys.stderr)
+    index.Save()
+    build = perf_counter() - start
+    stats = index.Stats()
+    print(f"Built {args.passages:,} passages in {build:.1f} s ({args.passages / build:,.0f} passages/s), "
+          f"{stats['segments']} segment(s), {stats['disk_mb']:.0f} MB on disk")
+
+    start = perf_counter()
+    index = PassageIndex(os.path.join(directory, "Index"))
+    index.Search("warm up")
+    print(f"Reopened from disk (memory-mapped) in {(perf_counter() - start) * 1000:.0f} ms")
+
+    # Queries are 4 of the rarer words of a random passage; it should come back first
+    timings, found = [], 0
+    for _ in range(args.queries):
+        target = int(rng.integers(args.passages))
+        words = sorted(set(ranks[target].tolist()), reverse=True)[:4]
+        query = " ".join(vocabulary[words])
+        start = perf_counter()
+        results = index.Search(query, k=3, coverage=0.0)
+        timings.append(perf_counter() - start)
+        found += any(text == " ".join(vocabulary[ranks[target]]) for _, text, _ in results)
+    timings.sort()
+    print(f"Query at {args.passages:,} passages: p50 {timings[len(timings) // 2] * 1000:.1f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1000:.1f} ms; source passage in the top 3 for {found}/{args.queries}")
+
+    demo = PassageIndex(os.path.join(directory, "Demo"))
+    demo.Add("file:Data/photosynthesis.txt", Chunk("Photosynthesis is how plants turn light, water and carbon dioxide into glucose and oxygen.\n\n"
+                                                   "It happens in the chloroplasts, mostly in the leaves."))
+    demo.AddAnswer("who was akbar?", "Akbar was the third Mughal emperor, who ruled from 1556 to 1605.")
+    for query in ("how do plants make glucose from light", "photosynthetic leaves", "when did akbar rule", "price of gold"):
+        print(f"{query!r} -> {[(source, text[:60]) for _, text, source in demo.Search(query)]}")
+    shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(0)
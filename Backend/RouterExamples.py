@@ -0,0 +1,287 @@
+import re
+import threading
+import numpy as np
+from Embeddings import HashingVectorizer
+
+# Short per-family instructions; only the families likely for a query are sent
+Header = ("You are a very accurate Decision-Making Model, which decides what kind of a query is given to you.\n"
+          "*** Do not answer any query, just decide what kind of query is given to you. ***")
+
+Instructions = {
+    "general": "-> 'general (query)' if a chatbot can answer it without up-to-date information: chit-chat, advice, "
+               "explanations, incomplete queries or ones with only pronouns ('who is he?'), and questions about the time or date.",
+    "realtime": "-> 'realtime (query)' if it needs up-to-date information: news, headlines, prices, current office "
+                "holders, recent updates, or asks about a specific person or thing.",
+    "open": "-> 'open (application or website name)' to open an app or website; one 'open' task per app.",
+    "close": "-> 'close (application name)' to close an app; one 'close' task per app.",
+    "play": "-> 'play (song name)' to play a song; one 'play' task per song.",
+    "generate image": "-> 'generate image (image prompt)' to create an image; one task per image.",
+    "reminder": "-> 'reminder (datetime with message)' to set a reminder, e.g. 'set a reminder at 9:00pm on 25th june "
+                "for my business meeting.' -> 'reminder 9:00pm 25th june business meeting'.",
+    "system": "-> 'system (task name)' for mute, unmute, volume up, volume down; one task each.",
+    "content": "-> 'content (topic)' to write content such as an application, code, email, essay, letter or poem.",
+    "google search": "-> 'google search (topic)' to search a topic on google.",
+    "youtube search": "-> 'youtube search (topic)' to search a topic on youtube.",
+    "exit": "-> 'exit' if the user says goodbye or wants to end the conversation.",
+}
+
+Footer = ("*** If the query asks for several tasks, list them separated by commas, like 'open facebook, open telegram, close whatsapp'. ***\n"
+          "*** Respond with 'general (query)' if you can't decide or the task is not one of the above. ***")
+
+# Families always described: the general/realtime split is the most common decision and 'general' is the fallback
+AlwaysIncluded = ("general", "realtime")
+
+# Labelled query -> decision pairs the router sees as few-shot examples
+Examples = [
+    ("how are you?", "general how are you?"),
+    ("do you like pizza?", "general do you like pizza?"),
+    ("chat with me.", "general chat with me."),
+    ("who was akbar?", "general who was akbar?"),
+    ("how can i study more effectively?", "general how can i study more effectively?"),
+    ("can you help me with this math problem?", "general can you help me with this math problem?"),
+    ("thanks, i really liked it.", "general thanks, i really liked it."),
+    ("what is python programming language?", "general what is python programming language?"),
+    ("who is he?", "general who is he?"),
+    ("what's his networth?", "general what's his networth?"),
+    ("tell me more about him.", "general tell me more about him."),
+    ("what's the time?", "general what's the time?"),
+    ("what day is it today?", "general what day is it today?"),
+    ("what is today's date?", "general what is today's date?"),
+    ("explain photosynthesis in simple words", "general explain photosynthesis in simple words"),
+    ("tell me a joke", "general tell me a joke"),
+    ("what is the capital of france?", "general what is the capital of france?"),
+    ("how does a car engine work?", "general how does a car engine work?"),
+    ("give me some tips to sleep better", "general give me some tips to sleep better"),
+    ("what is the difference between ram and rom?", "general what is the difference between ram and rom?"),
+    ("translate good morning into hindi", "general translate good morning into hindi"),
+    ("i am feeling bored", "general i am feeling bored"),
+    ("who wrote the ramayana?", "general who wrote the ramayana?"),
+    ("calculate 25 times 17", "general calculate 25 times 17"),
+    ("who is indian prime minister", "realtime who is indian prime minister"),
+    ("tell me about facebook's recent update.", "realtime tell me about facebook's recent update."),
+    ("tell me news about coronavirus.", "realtime tell me news about coronavirus."),
+    ("who is akshay kumar", "realtime who is akshay kumar"),
+    ("what is today's news?", "realtime what is today's news?"),
+    ("what is today's headline?", "realtime what is today's headline?"),
+    ("what is the price of gold today?", "realtime what is the price of gold today?"),
+    ("what's the weather in delhi?", "realtime what's the weather in delhi?"),
+    ("who won yesterday's cricket match?", "realtime who won yesterday's cricket match?"),
+    ("what is the bitcoin price right now?", "realtime what is the bitcoin price right now?"),
+    ("tell me about elon musk", "realtime tell me about elon musk"),
+    ("latest iphone launch details", "realtime latest iphone launch details"),
+    ("who is the ceo of google?", "realtime who is the ceo of google?"),
+    ("what is the current repo rate?", "realtime what is the current repo rate?"),
+    ("open chrome", "open chrome"),
+    ("open chrome and firefox", "open chrome, open firefox"),
+    ("open facebook, instagram and telegram", "open facebook, open instagram, open telegram"),
+    ("please open notepad", "open notepad"),
+    ("launch visual studio code", "open visual studio code"),
+    ("can you open youtube for me", "open youtube"),
+    ("start spotify", "open spotify"),
+    ("open whatsapp", "open whatsapp"),
+    ("close notepad", "close notepad"),
+    ("close chrome and spotify", "close chrome, close spotify"),
+    ("shut down whatsapp", "close whatsapp"),
+    ("exit microsoft word", "close microsoft word"),
+    ("close facebook", "close facebook"),
+    ("play afsanay by ys", "play afsanay by ys"),
+    ("play let her go", "play let her go"),
+    ("play some lofi music", "play some lofi music"),
+    ("play shape of you and then believer", "play shape of you, play believer"),
+    ("put on kesariya", "play kesariya"),
+    ("generate image of a lion", "generate image of a lion"),
+    ("generate image of a cat and a dog", "generate image of a cat, generate image of a dog"),
+    ("create a picture of a sunset over mountains", "generate image of a sunset over mountains"),
+    ("draw an image of a futuristic city", "generate image of a futuristic city"),
+    ("make an image of iron man", "generate image of iron man"),
+    ("set a reminder at 9:00pm on 25th june for my business meeting.", "reminder 9:00pm 25th june business meeting"),
+    ("remind me to call mom at 7pm tomorrow", "reminder 7:00pm tomorrow call mom"),
+    ("remind me in 10 minutes to check the oven", "reminder in 10 minutes check the oven"),
+    ("set an alarm reminder for 6am gym", "reminder 6:00am gym"),
+    ("what is today's date and by the way remind me that i have a dancing performance on 5th aug at 11pm",
+     "general what is today's date, reminder 11:00pm 5th aug dancing performance"),
+    ("mute", "system mute"),
+    ("unmute the system", "system unmute"),
+    ("volume up", "system volume up"),
+    ("turn the volume down", "system volume down"),
+    ("increase the volume and unmute", "system volume up, system unmute"),
+    ("write an application for sick leave", "content application for sick leave"),
+    ("can you write a application and open it in notepad", "content application"),
+    ("write a poem about the rain", "content poem about the rain"),
+    ("write python code for bubble sort", "content python code for bubble sort"),
+    ("draft an email to my manager asking for a day off", "content email to my manager asking for a day off"),
+    ("write an essay on climate change", "content essay on climate change"),
+    ("write a cover letter for a software job", "content cover letter for a software job"),
+    ("search python tutorials on google", "google search python tutorials"),
+    ("google search best laptops under 50000", "google search best laptops under 50000"),
+    ("look up the history of rome on google", "google search history of rome"),
+    ("search for restaurants near me", "google search restaurants near me"),
+    ("search cooking videos on youtube", "youtube search cooking videos"),
+    ("youtube search carryminati latest video", "youtube search carryminati latest video"),
+    ("find guitar lessons on youtube", "youtube search guitar lessons"),
+    ("bye jarvis.", "exit"),
+    ("goodbye", "exit"),
+    ("see you later, that's all for now", "exit"),
+    ("open chrome and tell me about mahatma gandhi.", "open chrome, general tell me about mahatma gandhi."),
+    ("open spotify and play believer", "open spotify, play believer"),
+    ("close notepad and write a letter to my friend", "close notepad, content letter to my friend"),
+    ("mute the volume and open youtube", "system mute, open youtube"),
+    ("what's the news today and generate image of a robot", "realtime what's the news today, generate image of a robot"),
+]
+
+# Words that make a family likely even when no similar example is retrieved
+Triggers = {
+    "open": re.compile(r"\b(open|launch|start)\b"),
+    "close": re.compile(r"\b(close|shut|quit|exit (?!jarvis))\b"),
+    "play": re.compile(r"\b(play|put on)\b"),
+    "generate image": re.compile(r"\b(image|picture|photo|draw|wallpaper)\b"),
+    "reminder": re.compile(r"\b(remind|reminder|alarm)\b"),
+    "system": re.compile(r"\b(mute|unmute|volume)\b"),
+    "content": re.compile(r"\b(write|draft|compose)\b"),
+    "google search": re.compile(r"\b(google|search|look up)\b"),
+    "youtube search": re.compile(r"\byoutube\b"),
+    "exit": re.compile(r"\b(bye|goodbye|see you)\b"),
+    "realtime": re.compile(r"\b(news|latest|today|price|weather|current|recent)\b"),
+}
+
+
+def Families(decision):
+    """Task families in a decision like 'open chrome, general tell me about gandhi'."""
+    found = []
+    for task in decision.split(","):
+        task = task.strip()
+        family = next((f for f in sorted(Instructions, key=len, reverse=True) if task.startswith(f)), None)
+        if family and family not in found:
+            found.append(family)
+    return found
+
+
+class ExampleBank:
+    """Labelled router examples in a local similarity index.
+
+    For each query the k most similar examples are sent as few-shot turns, and only
+    the instructions of families that appear among the nearest neighbours (or whose
+    trigger words occur in the query) are included in the system prompt.
+    """
+
+    def __init__(self, examples=Examples, k=6, neighbours=10, dim=4096):
+        self.k = k
+        self.neighbours = neighbours
+        self.vectorizer = HashingVectorizer(dim)
+        self.queries, self.decisions = [], []
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self._lock = threading.Lock()
+        for query, _ in examples:
+            self.vectorizer.Fit(query)
+        self.Add(examples)
+
+    def Add(self, examples):
+        with self._lock:
+            self.queries += [q for q, _ in examples]
+            self.decisions += [d for _, d in examples]
+            self.matrix = self.vectorizer.TransformMany(self.queries)  # Re-weighted with the current IDF
+
+    def Nearest(self, query, count):
+        with self._lock:
+            scores = self.matrix @ self.vectorizer.Transform(query)
+            count = min(count, len(scores))
+            top = np.argpartition(-scores, count - 1)[:count]
+            top = top[np.argsort(-scores[top])]
+            return [(self.queries[i], self.decisions[i], float(scores[i])) for i in top]
+
+    def Select(self, query):
+        """(families, examples) for the prompt; examples are ordered least to most similar."""
+        nearest = self.Nearest(query, max(self.k, self.neighbours))
+        families = list(AlwaysIncluded)
+        lowered = query.lower()
+        for _, decision, score in nearest:
+            if score > 0:
+                families += [f for f in Families(decision) if f not in families]
+        families += [f for f, pattern in Triggers.items() if f not in families and pattern.search(lowered)]
+        examples = [(q, d) for q, d, _ in nearest[:self.k]][::-1]
+        return families, examples
+
+    def Messages(self, query):
+        """Gateway messages for one router call: compact instructions, the nearest examples, then the query."""
+        families, examples = self.Select(query)
+        system = "\n".join([Header] + [Instructions[f] for f in Instructions if f in families] + [Footer])
+        messages = [{"role": "system", "content": system}]
+        for example_query, decision in examples:
+            messages.append({"role": "user", "content": example_query})
+            messages.append({"role": "assistant", "content": decision})
+        messages.append({"role": "user", "content": query})
+        return messages
+
+
+# --- Benchmark: static preamble vs dynamic few-shot prompt ---
+# Prompt size and selection time are measured locally; latency uses a Cohere stand-in whose
+# time to first token grows with prompt length. With --live the real router model is called
+# and decision accuracy is compared on the held-out queries below.
+Evaluation = [
+    ("who is the president of america?", "realtime"), ("what's the score of the india match?", "realtime"),
+    ("tell me about the latest mars mission", "realtime"), ("how is the stock market doing today?", "realtime"),
+    ("what is machine learning?", "general"), ("how do i make tea?", "general"), ("you are awesome", "general"),
+    ("what's the date today?", "general"), ("who is she?", "general"), ("explain black holes", "general"),
+    ("open telegram and discord", "open"), ("could you open calculator", "open"), ("launch steam", "open"),
+    ("close discord", "close"), ("please close all chrome windows", "close"),
+    ("play tum hi ho", "play"), ("play the new taylor swift song", "play"),
+    ("generate image of a dragon flying", "generate image"), ("create an image of a beach at night", "generate image"),
+    ("remind me at 8am tomorrow to submit the report", "reminder"), ("set a reminder for 3pm on 2nd july dentist", "reminder"),
+    ("mute the sound", "system"), ("volume down please", "system"),
+    ("write a leave application for my son", "content"), ("write a java program to reverse a string", "content"),
+    ("search best phones 2024 on google", "google search"), ("google the meaning of serendipity", "google search"),
+    ("search funny cat videos on youtube", "youtube search"), ("youtube search lo-fi beats", "youtube search"),
+    ("bye bye jarvis", "exit"), ("ok goodbye, talk later", "exit"),
+    ("open notepad and write a poem about love", "open"), ("play despacito and increase volume", "play"),
+]
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import argparse
+    import tempfile
+    from time import perf_counter
+
+    parser = argparse.ArgumentParser(description="Compare the static router prompt with dynamic few-shot selection")
+    parser.add_argument("--live", action="store_true", help="call the real router model (needs CohereAPIKey in .env)")
+    parser.add_argument("--prefill-rate", type=float, default=2000.0, help="stand-in prompt tokens per second")
+    args = parser.parse_args()
+
+    if not args.live:
+        from StandIns import StandInServer, Behaviour, RouterResponder
+        router = StandInServer(Behaviour(ttft=0.08, prefill_rate=args.prefill_rate), responder=RouterResponder).Start()
+        os.chdir(tempfile.mkdtemp(prefix="jarvis-router-"))
+    import LLM
+    import Model
+    if not args.live:
+        LLM.RegisterProvider("cohere", LLM.OpenAICompatibleProvider(router.url + "/v1"))
+        import RateLimit
+        RateLimit.Limiters["cohere"] = RateLimit.Limiter("cohere", rpm=1e6, concurrency=8)
+
+    bank = ExampleBank()
+    Model.RouterPrompt = "static"
+    static = Model.RouterMessages
+    results = {}
+    described = {"static": lambda q: Instructions, "dynamic": lambda q: bank.Select(q)[0]}
+    for name, build in (("static", static), ("dynamic", bank.Messages)):
+        sizes, build_times, latencies, covered, correct = [], [], [], 0, 0
+        for query, family in Evaluation:
+            start = perf_counter()
+            messages = build(query)
+            build_times.append(perf_counter() - start)
+            sizes.append(sum(len(m["content"]) for m in messages))
+            covered += family in described[name](query)
+            start = perf_counter()
+            decision = LLM.Complete(messages, model="command-a-03-2025", provider="cohere", temperature=0.7)
+            latencies.append(perf_counter() - start)
+            correct += family in Families(decision.lower())
+        latencies.sort()
+        results[name] = sizes
+        print(f"{name:<8} prompt {sum(sizes) / len(sizes):7.0f} chars (~{sum(sizes) / len(sizes) / 4:5.0f} tokens)   "
+              f"build {sum(build_times) / len(build_times) * 1e6:6.0f} us   latency p50 {latencies[len(latencies) // 2] * 1000:6.1f} ms"
+              f"   family instructions present {covered}/{len(Evaluation)}"
+              + (f"   decisions correct {correct}/{len(Evaluation)}" if args.live else ""))
+    print(f"Prompt size reduced by {(1 - sum(results['dynamic']) / sum(results['static'])) * 100:.0f}%")
+    if not args.live:
+        router.Stop()
+    sys.exit(0)
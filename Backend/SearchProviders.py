@@ -0,0 +1,375 @@
+import queue
+import threading
+from json import dumps
+from time import perf_counter, monotonic
+from urllib.parse import urlparse, parse_qs, urlunparse
+from concurrent.futures import ThreadPoolExecutor
+from bs4 import BeautifulSoup
+from dotenv import dotenv_values
+import Tracing
+import RateLimit
+import Cancellation
+from WebPages import Parser, UserAgent
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+SerperAPIKey = env_vars.get("SerperAPIKey")
+SerperURL = env_vars.get("SerperURL") or "https://google.serper.dev/search"
+HTMLSearchURL = env_vars.get("HTMLSearchURL") or "https://html.duckduckgo.com/html/"   # DuckDuckGo's page without scripts
+
+SearchProviders = [name.strip() for name in (env_vars.get("SearchProviders") or "serper,html").split(",") if name.strip()]
+SearchMode = (env_vars.get("SearchMode") or "merge").lower()      # "merge" the answers that arrive in time, or take the "first" good one
+SearchDeadline = float(env_vars.get("SearchDeadline") or 4.0)     # Seconds before the search gives up on every provider
+SearchGrace = float(env_vars.get("SearchGrace") or 0.3)           # Merge mode: how long the others get once one has answered
+BackupDelay = float(env_vars.get("SearchBackupDelay") or 1.0)     # Demoted providers are asked this late, or once the rest failed
+SlowAfter = float(env_vars.get("SearchSlowAfter") or 2.0)         # Average seconds from which a provider is demoted
+FailuresToDemote = 3                                              # Failures in a row (errors, or nothing by the deadline) that demote a provider
+DemoteFor = 60.0                                                  # Seconds a demoted provider waits behind the others
+LatencyWeight = 0.3                                               # Weight of the newest call in a provider's average latency
+Poll = 0.05
+
+
+class SearchError(Exception):
+    """A provider answered, but not with results (bad key, blocked, unexpected page)."""
+
+
+# ---------------- Providers ----------------
+# Each returns [{"title", "snippet", "link"}] best first; errors are raised, "no results" is [].
+
+class SerperProvider:
+    """Google results through the Serper API."""
+
+    def __init__(self, url=None, api_key=None):
+        self.url = url
+        self.api_key = api_key
+
+    def Search(self, query, num, timeout):
+        payload = dumps({"q": query, "num": num})
+        headers = {"X-API-KEY": self.api_key or SerperAPIKey or "", "Content-Type": "application/json"}
+        # Through the shared Serper limiter, which retries 429s and 5xx with backoff
+        response = RateLimit.Request("serper", "POST", self.url or SerperURL, headers=headers, data=payload, timeout=timeout)
+        if response.status_code != 200:
+            raise SearchError(f"Serper answered {response.status_code}; check your API key")
+        return [{"title": result.get("title", "No Title"), "snippet": result.get("snippet", "No Description"),
+                 "link": result.get("link", "#")} for result in response.json().get("organic", [])[:num]]
+
+
+class HTMLSearchProvider:
+    """Results scraped from a search engine's HTML page (DuckDuckGo's layout), for when Serper is slow, down or unpaid."""
+
+    def __init__(self, url=None):
+        self.url = url
+
+    def Search(self, query, num, timeout):
+        response = RateLimit.Request("html", "GET", self.url or HTMLSearchURL, params={"q": query},
+                                     headers={"User-Agent": UserAgent}, timeout=timeout)
+        if response.status_code != 200:
+            raise SearchError(f"HTML search answered {response.status_code}")
+        soup = BeautifulSoup(response.text, Parser)
+        results = []
+        for result in soup.select("div.result"):
+            anchor = result.select_one("a.result__a")
+            if anchor is None or "result--ad" in (result.get("class") or []):
+                continue
+            snippet = result.select_one(".result__snippet")
+            results.append({"title": anchor.get_text(" ", strip=True),
+                            "snippet": snippet.get_text(" ", strip=True) if snippet else "No Description",
+                            "link": _target(anchor.get("href", ""))})
+            if len(results) >= num:
+                break
+        if not results and soup.find(class_="no-results") is None:
+            raise SearchError("HTML search page had no results block (blocked or changed layout)")
+        return results
+
+
+def _target(href):
+    # DuckDuckGo links go through a redirect: //duckduckgo.com/l/?uddg=<the result's URL>
+    parsed = urlparse(href)
+    if parsed.path == "/l/" and "uddg" in parse_qs(parsed.query):
+        return parse_qs(parsed.query)["uddg"][0]
+    return href if parsed.scheme else "https:" + href if href.startswith("//") else href
+
+
+Providers = {}
+_providers_lock = threading.Lock()
+
+
+def RegisterProvider(name, provider):
+    with _providers_lock:
+        Providers[name] = provider
+
+
+def GetProvider(name):
+    with _providers_lock:
+        provider = Providers.get(name)
+        if provider is None:
+            if name == "serper":
+                provider = SerperProvider()
+            elif name == "html":
+                provider = HTMLSearchProvider()
+            else:
+                raise KeyError(f"Unknown search provider: {name}")
+            Providers[name] = provider
+        return provider
+
+
+# ---------------- Health ----------------
+
+class ProviderHealth:
+    """Recent latency and failures of one provider. A provider that keeps failing or is slow on average
+    is demoted for a while: it is asked only as a backup until DemoteFor has passed, then races again."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latency = None        # Moving average, seconds
+        self.calls = 0
+        self.failures = 0
+        self.streak = 0            # Failures in a row
+        self.wins = 0              # Searches this provider answered first
+        self.demotions = 0
+        self.demoted_until = 0.0   # monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def demoted(self):
+        return monotonic() < self.demoted_until
+
+    def Record(self, seconds, ok):
+        with self._lock:
+            self.calls += 1
+            self.failures += not ok
+            self.streak = 0 if ok else self.streak + 1
+            self.latency = seconds if self.latency is None else self.latency + LatencyWeight * (seconds - self.latency)
+            if self.streak >= FailuresToDemote or (self.latency > SlowAfter and self.calls >= 2):
+                if not self.demoted:
+                    self.demotions += 1
+                self.demoted_until = monotonic() + DemoteFor
+                self.latency = None  # Judged on new calls only once it is back, so one slow spell doesn't demote it for good
+
+    def AsDict(self):
+        return {"provider": self.name, "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+                "calls": self.calls, "failures": self.failures, "wins": self.wins, "demoted": self.demoted,
+                "demotions": self.demotions}
+
+
+# ---------------- Racing ----------------
+
+def _key(link):
+    # The same page under http/https, with or without www, a trailing slash or a #fragment
+    parsed = urlparse(link)
+    host = parsed.netloc.lower().removeprefix("www.")
+    return urlunparse(("", host, parsed.path.rstrip("/") or "/", "", parsed.query, ""))
+
+
+def Merge(answers, num):
+    """Results of several providers as one list: their rankings interleaved, each page once."""
+    merged, seen = [], {}
+    for rank in range(max((len(results) for results in answers), default=0)):
+        for results in answers:
+            if rank >= len(results):
+                continue
+            result = results[rank]
+            key = _key(result["link"])
+            if key in seen:
+                kept = seen[key]
+                if len(result.get("snippet") or "") > len(kept.get("snippet") or ""):
+                    kept["snippet"] = result["snippet"]  # Keep the fuller description of the two
+                continue
+            seen[key] = dict(result)
+            merged.append(seen[key])
+    return merged[:num]
+
+
+class SearchRace:
+    """Asks every provider at once and answers with the first good results (mode "first") or with the
+    results of everyone who answered shortly after it (mode "merge"), all within a deadline.
+
+    Healthy providers start right away, fastest first; demoted ones only after BackupDelay or once
+    the others have failed. Calls the race stops waiting for run on in the background until the
+    deadline, so their provider's health sees how slow it really was; each has its own cancel token,
+    cancelled at the deadline or with the turn, which closes its connection.
+    """
+
+    def __init__(self, names=None, mode=SearchMode, deadline=SearchDeadline, grace=SearchGrace, backup_delay=BackupDelay):
+        self.names = list(names if names is not None else SearchProviders)
+        self.mode = mode
+        self.deadline = deadline
+        self.grace = grace
+        self.backup_delay = backup_delay
+        self.health = {name: ProviderHealth(name) for name in self.names}
+        self.executor = ThreadPoolExecutor(4 * len(self.names), thread_name_prefix="Search")
+        self.searches = 0
+        self.failed = 0
+        self.late = 0  # Provider answers that came after the race had returned
+
+    def Order(self):
+        """(racing now, backups): healthy providers by average latency, then the demoted ones."""
+        ranked = sorted(self.names, key=lambda name: (self.health[name].demoted, self.health[name].latency or 0.0))
+        healthy = [name for name in ranked if not self.health[name].demoted]
+        if not healthy:
+            return ranked, []  # All demoted: nobody to wait for, ask them all
+        return healthy, [name for name in ranked if name not in healthy]
+
+    def _call(self, name, query, num, token, until, events):
+        # Not traced: it may outlive the turn, whose trace would then end with it
+        health = self.health[name]
+        start = perf_counter()
+        with Cancellation.Scope(token):
+            try:
+                results = GetProvider(name).Search(query, num, timeout=(1.0, max(0.1, until - monotonic())))
+            except Cancellation.Cancelled:
+                if token.reason == "search deadline":
+                    health.Record(perf_counter() - start, False)  # Nothing by the deadline: as bad as an error
+                return
+            except Exception as e:
+                health.Record(perf_counter() - start, False)
+                events.put((name, e, perf_counter() - start))
+                return
+        health.Record(perf_counter() - start, True)
+        events.put((name, results, perf_counter() - start))
+
+    def Search(self, query, num=5):
+        """Merged results (possibly []) from the providers that answered in time; raises if all of them failed."""
+        racing, backups = self.Order()
+        events = queue.Queue()
+        parent = Cancellation.Current()
+        tokens = {}
+        start = monotonic()
+        until = start + self.deadline
+
+        def launch(name):
+            token = tokens[name] = Cancellation.CancelToken(f"search {name}")
+            unlink = parent.OnCancel(lambda: token.Cancel(parent.reason)) if parent is not None else (lambda: None)
+            future = self.executor.submit(self._call, name, query, num, token, until, events)
+            future.add_done_callback(lambda _: unlink())
+
+        for name in racing:
+            launch(name)
+        answers, errors, timings, first_at = {}, {}, {}, None
+        try:
+            while True:
+                now = monotonic()
+                finished = len(answers) + len(errors)
+                if backups and (now >= start + self.backup_delay or (finished == len(tokens) and not any(answers.values()))):
+                    for name in backups:
+                        launch(name)
+                    backups = []
+                if finished == len(tokens) and (not backups or first_at is not None):
+                    break  # Backups are only for when nobody has answered
+                if first_at is not None and (self.mode == "first" or now >= first_at + self.grace):
+                    break
+                if now >= until:
+                    break
+                try:
+                    name, outcome, seconds = events.get(timeout=Poll)
+                except queue.Empty:
+                    Cancellation.Check()
+                    continue
+                timings[name] = round(seconds * 1000)
+                if isinstance(outcome, Exception):
+                    errors[name] = outcome
+                    continue
+                answers[name] = outcome
+                if outcome and first_at is None:
+                    first_at = monotonic()
+                    self.health[name].wins += 1
+        except BaseException:
+            for token in tokens.values():
+                token.Cancel("search cancelled")
+            raise
+
+        late = [name for name in tokens if name not in answers and name not in errors]
+        if late:
+            self.late += len(late)
+            # Left running so health learns their real latency, but never past the deadline
+            timer = threading.Timer(max(0.0, until - monotonic()), lambda: [tokens[name].Cancel("search deadline") for name in late])
+            timer.daemon = True
+            timer.start()
+        self.searches += 1
+        good = [results for results in answers.values() if results]  # In the order they arrived
+        span = Tracing.Current()
+        if span is not None:
+            span.Set(providers=timings, failed=list(errors), late=late)
+        if not answers:
+            self.failed += 1
+            if errors:
+                raise next(iter(errors.values()))
+            raise TimeoutError(f"No search provider answered within {self.deadline:.1f} s")
+        if not good:
+            return []
+        return Merge(good, num) if self.mode == "merge" else good[0]
+
+    def AsDict(self):
+        return {"searches": self.searches, "failed": self.failed, "late": self.late, "mode": self.mode,
+                "providers": [self.health[name].AsDict() for name in self.names]}
+
+
+# Shared race used by RealtimeSearchEngine
+Race = SearchRace()
+
+
+def Search(query, num=5):
+    return Race.Search(query, num)
+
+
+# --- Serper alone vs racing it against the HTML search page, against local stand-ins ---
+if __name__ == "__main__":
+    import os
+    import sys
+    import argparse
+    import tempfile
+    from StandIns import StandInServer, Behaviour
+
+    parser = argparse.ArgumentParser(description="Racing search providers against local stand-ins")
+    parser.add_argument("-n", "--searches", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="jarvis-search-"))
+    # Serper: fast, but with a slow tail and some 5xx (retried with backoff); the HTML page: slower and steadier
+    serper = StandInServer(Behaviour(ttft=0.35, jitter=0.3, slow_rate=0.05, slow_factor=10, failure_rate=0.03, seed=1)).Start()
+    html = StandInServer(Behaviour(ttft=0.6, jitter=0.2, failure_rate=0.01, seed=2)).Start()
+    html.pages_url = serper.url  # Both find some of the same pages, which the merge lists once
+    RegisterProvider("serper", SerperProvider(serper.url + "/search"))
+    RegisterProvider("html", HTMLSearchProvider(html.url + "/html"))
+    for name in ("serper", "html"):
+        RateLimit.Limiters[name] = RateLimit.Limiter(name, rpm=1e6, concurrency=64)
+
+    def run(label, race, searches=args.searches):
+        def one(i):
+            start = perf_counter()
+            try:
+                results = race.Search(f"topic {i}")
+            except Exception:
+                results = None
+            return perf_counter() - start, results
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            outcomes = list(pool.map(one, range(searches)))
+        latencies = sorted(seconds for seconds, _ in outcomes)
+        answered = [results for _, results in outcomes if results]
+        pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q / 100.0))] * 1000
+        print(f"{label:<22} p50 {pick(50):6.0f}  p95 {pick(95):6.0f}  p99 {pick(99):6.0f} ms   "
+              f"errors {searches - len(answered):>3}/{searches}   results {sum(map(len, answered)) / max(1, len(answered)):.1f}")
+        return outcomes
+
+    run("serper only", SearchRace(["serper"]))
+    run("race, first answer", SearchRace(["serper", "html"], mode="first"))
+    run("race, merged", SearchRace(["serper", "html"], mode="merge"))
+
+    # Serper slows down to ~3 s: it is demoted after a few searches and the HTML page answers alone
+    race = SearchRace(["serper", "html"], mode="merge")
+    run("before the slowdown", race, 40)
+    serper.behaviour.ttft, serper.behaviour.slow_rate, serper.behaviour.failure_rate = 3.0, 0.0, 0.0
+    outcomes = run("Serper slowed to 3 s", race, 40)
+    for health in race.AsDict()["providers"]:
+        print(f"  {health['provider']:<7} demoted {str(health['demoted']):<5} demotions {health['demotions']}  calls {health['calls']}  "
+              f"failures {health['failures']}  first to answer {health['wins']}")
+    print("\nMerged results (Serper's pages 0-4 and the HTML page's 1, 0, 5, 6, 7):")
+    serper.behaviour.ttft = 0.35
+    both = SearchRace(["serper", "html"], mode="merge", grace=SearchDeadline)  # Waits for both, to show the merge
+    print("\n".join(f"  {r['link']}  {r['title']}" for r in both.Search("merged example")))
+    for server in (serper, html):
+        server.Stop()
+    sys.exit(0)
@@ -0,0 +1,479 @@
+"""Headless server: the assistant over HTTP and WebSocket, for several clients at once.
+
+Run from the project root:
+
+    python Backend/Server.py
+    python Backend/Server.py --benchmark
+
+Every client works in its own session (see Sessions.py), so conversations don't mix the
+way they would in the single Data/ChatLog.json of the desktop app. At most ServerWorkers
+requests run at once, up to ServerQueue more wait for a slot, and the rest get a 503.
+Requests of one session run one at a time, in order.
+
+    POST   /sessions                                -> {"session": id}
+    GET    /sessions/{id}, DELETE /sessions/{id}
+    GET    /health                                  -> pool and session counts, duplicate calls coalesced, search provider health
+    POST   /router     {"session", "query"}         -> NDJSON {"task": ...} as the router streams them
+    POST   /chat       {"session", "query"}         -> NDJSON {"delta": ...} ..., then {"answer": ...}
+    POST   /realtime   {"session", "query"}         -> the same, answered from a web search
+    POST   /image      {"session", "prompt"}        -> {"image": path}
+    POST   /automation {"session", "tasks": [...]}  -> {"ok": bool}
+    POST   /turn       {"session", "query"}         -> NDJSON events of a whole turn (router, then each task)
+    GET    /ws?session=id                           -> WebSocket: send {"query": ...} or {"type": "cancel"},
+                                                       receive the /turn events
+
+Without "session" a new session is created; its id comes back in the X-Session header
+(and in the first WebSocket message).
+"""
+import os
+import json
+import asyncio
+import weakref
+import argparse
+from time import perf_counter
+from contextlib import asynccontextmanager
+
+from aiohttp import web, WSMsgType
+from dotenv import dotenv_values
+
+import BackendLoop
+import Cancellation
+import Sessions
+import Tracing
+import SingleFlight
+import SearchProviders
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+ServerHost = env_vars.get("ServerHost") or "127.0.0.1"
+ServerPort = int(env_vars.get("ServerPort") or 8765)
+ServerWorkers = int(env_vars.get("ServerWorkers") or BackendLoop.BackendWorkers)  # Requests served at once
+ServerQueue = int(env_vars.get("ServerQueue") or 64)                             # Requests waiting for a worker
+
+# Tasks handed to Automation (the rest are answered, searched or drawn here)
+AutomationPrefixes = ("open ", "close ", "play ", "content ", "google search ", "youtube search ", "system ", "reminder ")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WorkerPool:
+    """Admission control: `workers` requests run at once and up to `queue` more wait, in arrival order."""
+
+    def __init__(self, workers=ServerWorkers, queue=ServerQueue):
+        self.workers = workers
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(workers)
+
+    @asynccontextmanager
+    async def Slot(self):
+        if self._semaphore.locked() and self.waiting >= self.queue:
+            self.rejected += 1
+            raise QueueFull(f"{self.active} requests running and {self.waiting} waiting")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.served += 1
+            self._semaphore.release()
+
+    def AsDict(self):
+        return {"workers": self.workers, "queue": self.queue, "active": self.active,
+                "waiting": self.waiting, "served": self.served, "rejected": self.rejected}
+
+
+class AssistantServer:
+    def __init__(self, workers=ServerWorkers, queue=ServerQueue, store=None):
+        import Model
+        import Chatbot
+        import RealtimeSearchEngine
+        import ImageGeneration
+        self.Model, self.Chatbot = Model, Chatbot
+        self.RealtimeSearchEngine, self.ImageGeneration = RealtimeSearchEngine, ImageGeneration
+        try:
+            import Automation
+        except Exception as e:
+            print(f"Automation endpoints disabled (import failed: {e})")
+            Automation = None
+        self.Automation = Automation
+        self.store = store or Sessions.Store
+        self.workers, self.queue = workers, queue
+        self.pool = None
+        self._locks = weakref.WeakKeyDictionary()  # Session -> asyncio.Lock
+
+    def App(self):
+        app = web.Application(middlewares=[self._errors])
+        app.add_routes([
+            web.post("/sessions", self.create_session),
+            web.get("/sessions/{id}", self.get_session),
+            web.delete("/sessions/{id}", self.delete_session),
+            web.get("/health", self.health),
+            web.post("/router", self.router),
+            web.post("/chat", self.chat),
+            web.post("/realtime", self.realtime),
+            web.post("/image", self.image),
+            web.post("/automation", self.automation),
+            web.post("/turn", self.turn),
+            web.get("/ws", self.websocket),
+        ])
+        return app
+
+    async def Serve(self, host=ServerHost, port=ServerPort, started=None):
+        """Serve until cancelled. `started` (an asyncio.Event) is set once the port is open."""
+        self.pool = WorkerPool(self.workers, self.queue)  # Created on the loop that serves
+        # Handlers are cancelled when their client disconnects, which cancels the turn's token
+        runner = web.AppRunner(self.App(), handler_cancellation=True)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        self.port = runner.addresses[0][1]
+        print(f"Serving on http://{host}:{self.port} ({self.workers} workers, queue {self.queue})")
+        if started is not None:
+            started.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    # ---------------- Plumbing ----------------
+
+    @web.middleware
+    async def _errors(self, request, handler):
+        try:
+            return await handler(request)
+        except QueueFull as e:
+            raise web.HTTPServiceUnavailable(text=json.dumps({"error": f"Server busy: {e}"}),
+                                             content_type="application/json", headers={"Retry-After": "1"})
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+
+    def _session(self, session_id):
+        if not session_id:
+            return self.store.Create()
+        session = self.store.Get(session_id)
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": f"Unknown session {session_id}"}),
+                                   content_type="application/json")
+        return session
+
+    async def _body(self, request, field):
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            raise ValueError("Request body must be JSON")
+        value = body.get(field)
+        if not value:
+            raise ValueError(f"Missing '{field}'")
+        return self._session(body.get("session")), value
+
+    @asynccontextmanager
+    async def Request(self, session, name, token=None, **attrs):
+        """The session's turn lock, a worker slot, and the session, cancel token and trace as context."""
+        token = token or Cancellation.CancelToken(name)
+        lock = self._locks.setdefault(session, asyncio.Lock())
+        async with lock, self.pool.Slot():
+            with Sessions.Scope(session), Cancellation.Scope(token), \
+                    Tracing.StartTrace(name, session=session.id, **attrs):
+                try:
+                    yield token
+                except (asyncio.CancelledError, ConnectionResetError):
+                    token.Cancel("client disconnected")
+                    raise
+
+    async def _ndjson(self, request, session, events):
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "X-Session": session.id})
+        await response.prepare(request)
+        async for event in events:
+            await response.write((json.dumps(event) + "\n").encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def _answer(self, stream_function, modifier, query):
+        chunks = []
+        async for text in BackendLoop.Iterate(stream_function, query):
+            chunks.append(text)
+            yield {"delta": text}
+        yield {"answer": modifier("".join(chunks).strip())}
+
+    async def _automation(self, tasks):
+        if self.Automation is None:
+            raise RuntimeError("Automation is not available on this host")
+        return await Cancellation.Guard(self.Automation.Automation(tasks))
+
+    # ---------------- Sessions ----------------
+
+    async def create_session(self, request):
+        session = self.store.Create()
+        return web.json_response({"session": session.id}, status=201)
+
+    async def get_session(self, request):
+        return web.json_response(self._session(request.match_info["id"]).AsDict())
+
+    async def delete_session(self, request):
+        if not self.store.Drop(request.match_info["id"]):
+            raise web.HTTPNotFound()
+        return web.json_response({"deleted": request.match_info["id"]})
+
+    async def health(self, request):
+        return web.json_response({"status": "ok", "sessions": len(self.store), **self.pool.AsDict(),
+                                  "coalesced": SingleFlight.Stats(), "search": SearchProviders.Race.AsDict()})
+
+    # ---------------- Single stages ----------------
+
+    async def router(self, request):
+        session, query = await self._body(request, "query")
+        async with self.Request(session, "router", query=query):
+            tasks = BackendLoop.Iterate(self.Model.FirstLayerDMMStream, query)
+            return await self._ndjson(request, session, ({"task": task} async for task in tasks))
+
+    async def chat(self, request):
+        session, query = await self._body(request, "query")
+        async with self.Request(session, "chat", query=query):
+            return await self._ndjson(request, session, self._answer(
+                self.Chatbot.ChatBotStream, self.Chatbot.AnswerModifier, query))
+
+    async def realtime(self, request):
+        session, query = await self._body(request, "query")
+        async with self.Request(session, "realtime", query=query):
+            return await self._ndjson(request, session, self._answer(
+                self.RealtimeSearchEngine.RealtimeSearchEngineStream, self.RealtimeSearchEngine.AnswerModifier, query))
+
+    async def image(self, request):
+        session, prompt = await self._body(request, "prompt")
+        async with self.Request(session, "image", prompt=prompt):
+            path = await self.ImageGeneration.AGenerateImages(prompt, open_after=False)
+        if path is None:
+            raise web.HTTPBadGateway(text=json.dumps({"error": "Image generation failed"}), content_type="application/json")
+        return web.json_response({"image": path}, headers={"X-Session": session.id})
+
+    async def automation(self, request):
+        session, tasks = await self._body(request, "tasks")
+        if isinstance(tasks, str):
+            tasks = [tasks]
+        async with self.Request(session, "automation", tasks=len(tasks)):
+            try:
+                ok = await self._automation(tasks)
+            except RuntimeError as e:
+                raise web.HTTPNotImplemented(text=json.dumps({"error": str(e)}), content_type="application/json")
+        return web.json_response({"ok": bool(ok)}, headers={"X-Session": session.id})
+
+    # ---------------- Whole turns ----------------
+
+    async def Turn(self, query):
+        """Events of one turn: each routed task as the router streams it, then that task's result."""
+        started = perf_counter()
+        decision = []
+        try:
+            async for task in BackendLoop.Iterate(self.Model.FirstLayerDMMStream, query):
+                decision.append(task)
+                yield {"type": "task", "task": task}
+                async for event in self._run_task(task, query):
+                    yield event
+        except Exception as e:
+            if decision:
+                yield {"type": "error", "message": f"Router failed: {e}"}
+            else:
+                # Like the desktop app: without a decision the query is answered as a general question
+                decision.append(f"general {query}")
+                yield {"type": "task", "task": decision[0]}
+                async for event in self._run_task(decision[0], query):
+                    yield event
+        yield {"type": "done", "tasks": decision, "elapsed_ms": round((perf_counter() - started) * 1000, 1)}
+
+    async def _run_task(self, task, query):
+        try:
+            if task.startswith("realtime "):
+                async for event in self._answer(self.RealtimeSearchEngine.RealtimeSearchEngineStream,
+                                                self.RealtimeSearchEngine.AnswerModifier, task.removeprefix("realtime ")):
+                    yield self._event(task, event)
+
+            elif task.startswith("generate image"):
+                prompt = task.removeprefix("generate image").strip() or query
+                path = await self.ImageGeneration.AGenerateImages(prompt, open_after=False)
+                if path:
+                    yield {"type": "image", "task": task, "path": path}
+                else:
+                    yield {"type": "error", "task": task, "message": "Image generation failed"}
+
+            elif task.startswith(AutomationPrefixes):
+                yield {"type": "executed", "task": task, "ok": bool(await self._automation([task]))}
+
+            elif task != "exit":  # "exit" closes the desktop app; a server client just disconnects
+                async for event in self._answer(self.Chatbot.ChatBotStream, self.Chatbot.AnswerModifier,
+                                                task.removeprefix("general ")):
+                    yield self._event(task, event)
+        except Exception as e:
+            yield {"type": "error", "task": task, "message": str(e)}
+
+    @staticmethod
+    def _event(task, event):
+        if "delta" in event:
+            return {"type": "delta", "task": task, "text": event["delta"]}
+        return {"type": "answer", "task": task, "text": event["answer"]}
+
+    async def turn(self, request):
+        session, query = await self._body(request, "query")
+        async with self.Request(session, "turn", query=query):
+            return await self._ndjson(request, session, self.Turn(query))
+
+    async def websocket(self, request):
+        session = self._session(request.query.get("session"))
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        await ws.send_json({"type": "session", "session": session.id})
+        current = None  # (task, token) of the running turn
+
+        async def run(query, token):
+            try:
+                async with self.Request(session, "turn", token=token, query=query):
+                    async for event in self.Turn(query):
+                        await ws.send_json(event)
+            except QueueFull as e:
+                await ws.send_json({"type": "error", "message": f"Server busy: {e}"})
+            except Cancellation.Cancelled:
+                if not ws.closed:
+                    await ws.send_json({"type": "cancelled", "query": query})
+
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(message.data)
+                except json.JSONDecodeError:
+                    await ws.send_json({"type": "error", "message": "Messages must be JSON"})
+                    continue
+                # A new query replaces the running turn, like typing over the desktop app
+                if current is not None:
+                    current[1].Cancel("new query" if data.get("query") else "cancelled")
+                if data.get("query"):
+                    token = Cancellation.CancelToken("turn")
+                    current = (asyncio.ensure_future(run(data["query"], token)), token)
+        finally:
+            if current is not None:
+                current[1].Cancel("client disconnected")
+                await asyncio.gather(current[0], return_exceptions=True)
+        return ws
+
+
+def Main():
+    parser = argparse.ArgumentParser(description="Serve the assistant over HTTP and WebSocket")
+    parser.add_argument("--host", default=ServerHost)
+    parser.add_argument("--port", type=int, default=ServerPort)
+    parser.add_argument("--workers", type=int, default=ServerWorkers, help="requests served at once")
+    parser.add_argument("--queue", type=int, default=ServerQueue, help="requests waiting for a worker before 503s")
+    parser.add_argument("--benchmark", action="store_true", help="measure throughput against local stand-ins instead")
+    parser.add_argument("--sessions", default="1,2,4,8,16,32", help="benchmark: concurrent sessions per step")
+    parser.add_argument("--turns", type=int, default=8, help="benchmark: turns per session")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        Benchmark(args)
+        return
+
+    server = AssistantServer(args.workers, args.queue)
+    BackendLoop.Loop.Start()
+    try:
+        BackendLoop.Run(server.Serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        BackendLoop.Loop.Stop()
+
+
+# --- Benchmark: turns per second and latency as concurrent sessions grow, against local stand-ins ---
+def Benchmark(args):
+    import tempfile
+    import aiohttp
+    from StandIns import StandInServer, Behaviour, RouterResponder
+    from Benchmark import Queries, Percentile
+
+    servers = {
+        "groq": StandInServer(Behaviour(ttft=0.25, jitter=0.3, token_rate=250, tokens=80, seed=1)).Start(),
+        "cohere": StandInServer(Behaviour(ttft=0.15, jitter=0.3, seed=2), responder=RouterResponder).Start(),
+        "serper": StandInServer(Behaviour(ttft=0.2, jitter=0.3, seed=3)).Start(),
+        "image": StandInServer(Behaviour(ttft=0.5, jitter=0.3, seed=4)).Start(),
+    }
+    workdir = tempfile.mkdtemp(prefix="jarvis-server-")
+    os.makedirs(os.path.join(workdir, "Data"), exist_ok=True)
+    os.chdir(workdir)  # Backend modules read and write Data/ relative to the working directory
+
+    import LLM
+    import RateLimit
+    LLM.RegisterProvider("groq", LLM.OpenAICompatibleProvider(servers["groq"].url + "/v1"))
+    LLM.RegisterProvider("cohere", LLM.OpenAICompatibleProvider(servers["cohere"].url + "/v1"))
+    for name in ("groq", "cohere", "serper", "html", "pollinations"):
+        RateLimit.Limiters[name] = RateLimit.Limiter(name, rpm=1e6, concurrency=256)  # Measure the server, not our own throttling
+
+    server = AssistantServer(args.workers, args.queue)
+    SearchProviders.SerperURL = servers["serper"].url + "/search"
+    SearchProviders.HTMLSearchURL = servers["serper"].url + "/html"
+    server.ImageGeneration.ImageAPIURL = servers["image"].url
+    server.Chatbot.Cache.enabled = False
+    if server.Automation is not None:
+        server.Automation.ContentEditor = None
+
+    async def client(http, base, index, latencies, errors):
+        async with http.post(base + "/sessions") as response:
+            session = (await response.json())["session"]
+        for turn in range(args.turns):
+            query = f"{Queries[(index + turn) % len(Queries)]} client {index}"
+            start = perf_counter()
+            async with http.post(base + "/turn", json={"session": session, "query": query}) as response:
+                if response.status != 200:
+                    errors.append(response.status)
+                    continue
+                async for line in response.content:
+                    event = json.loads(line)
+                    if event["type"] == "error" and "Automation" not in event["message"]:
+                        errors.append(event["message"])
+            latencies.append(perf_counter() - start)
+        return session
+
+    async def run():
+        started = asyncio.Event()
+        serving = asyncio.ensure_future(server.Serve("127.0.0.1", 0, started))
+        await started.wait()
+        base = f"http://127.0.0.1:{server.port}"
+        print(f"\n{'sessions':>8}{'turns/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}{'isolated':>10}")
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=600)) as http:
+            for count in [int(n) for n in args.sessions.split(",")]:
+                latencies, errors = [], []
+                start = perf_counter()
+                ids = await asyncio.gather(*(client(http, base, i, latencies, errors) for i in range(count)))
+                elapsed = perf_counter() - start
+                # Each session's history holds only its own client's queries
+                isolated = all(message["content"].endswith(f"client {i}")
+                               for i, session_id in enumerate(ids)
+                               for message in server.store.Get(session_id).history if message["role"] == "user")
+                print(f"{count:>8}{len(latencies) / elapsed:>10.1f}{Percentile(latencies, 50) * 1000:>10.0f}"
+                      f"{Percentile(latencies, 95) * 1000:>10.0f}{len(errors):>8}{str(isolated):>10}")
+                for session_id in ids:
+                    server.store.Drop(session_id)
+        serving.cancel()
+        await asyncio.gather(serving, return_exceptions=True)
+
+    BackendLoop.Loop.Start()
+    try:
+        BackendLoop.Run(run())
+    finally:
+        BackendLoop.Loop.Stop()
+        for stand_in in servers.values():
+            stand_in.Stop()
+
+
+if __name__ == "__main__":
+    Main()
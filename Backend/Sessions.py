@@ -0,0 +1,191 @@
+import os
+import uuid
+import threading
+import contextvars
+from time import time
+from json import load, dump, dumps
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from dotenv import dotenv_values
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+# Sessions kept in memory by the server, and seconds of inactivity before one is dropped
+MaxSessions = int(env_vars.get("ServerSessions") or 256)
+SessionIdle = float(env_vars.get("SessionIdle") or 1800)
+
+# Chat messages sent to the model with each question, and routed queries remembered per conversation
+ChatContext = int(env_vars.get("ChatContext") or 20)
+QueryHistory = int(env_vars.get("QueryHistory") or 100)
+
+# The desktop app has a single conversation, stored here
+ChatLogPath = r"Data\ChatLog.json"
+
+
+class Session:
+    """Conversation state of one client: chat history (what ChatLog.json holds for the GUI) and routed queries."""
+
+    def __init__(self, session_id=None):
+        self.id = session_id or uuid.uuid4().hex[:12]
+        self.history = []
+        self.queries = deque(maxlen=QueryHistory)
+        self.created = time()
+        self.last_used = self.created
+        self._lock = threading.Lock()
+
+    def Load(self):
+        with self._lock:
+            self.last_used = time()
+            return list(self.history)
+
+    def Save(self, messages):
+        with self._lock:
+            self.last_used = time()
+            self.history = list(messages)
+
+    def AsDict(self):
+        return {"session": self.id, "messages": len(self.history), "queries": len(self.queries),
+                "created": self.created, "last_used": self.last_used}
+
+
+_current = contextvars.ContextVar("jarvis_session", default=None)
+
+
+# Make `session` the current one: `with Scope(session): ...`. Like the cancel token it follows the
+# turn into worker threads, so Chatbot and RealtimeSearchEngine use its history instead of ChatLog.json.
+@contextmanager
+def Scope(session):
+    reset = _current.set(session)
+    try:
+        yield session
+    finally:
+        _current.reset(reset)
+
+
+def Current():
+    return _current.get()
+
+
+class ChatLogFile:
+    """Data\\ChatLog.json, parsed once and kept in memory.
+
+    Every turn used to read and rewrite the whole file, which gets slower as the conversation
+    grows. Now the file is only read again if something else changed it, and messages added
+    at the end are appended in place (same indented JSON array as json.dump writes).
+    """
+
+    def __init__(self, path=ChatLogPath):
+        self.path = path
+        self.messages = None
+        self.stamp = None
+        self._lock = threading.Lock()
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def Load(self):
+        with self._lock:
+            if self.messages is None or self._stamp() != self.stamp:
+                with open(self.path, "r") as f:
+                    self.messages = load(f)
+                self.stamp = self._stamp()
+            return list(self.messages)
+
+    def Save(self, messages):
+        with self._lock:
+            known = self.messages
+            if (known and len(messages) > len(known) and messages[:len(known)] == known
+                    and self._stamp() == self.stamp and self._append(messages[len(known):])):
+                pass
+            else:
+                with open(self.path, "w") as f:
+                    dump(messages, f, indent=4)
+            self.messages = list(messages)
+            self.stamp = self._stamp()
+
+    def _append(self, added):
+        """Replace the closing bracket with the new messages; False if the file doesn't end as expected."""
+        with open(self.path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            f.seek(max(0, end - 2))
+            if f.read() != b"\n]":
+                return False
+            f.seek(end - 2)
+            items = ",\n".join("    " + dumps(m, indent=4).replace("\n", "\n    ") for m in added)
+            f.write(f",\n{items}\n]".encode())
+        return True
+
+
+# Shared by Chatbot and RealtimeSearchEngine
+ChatLog = ChatLogFile()
+
+
+def LoadChatLog():
+    """The current conversation: the session's history, or Data\\ChatLog.json outside a session."""
+    session = _current.get()
+    if session is not None:
+        return session.Load()
+    return ChatLog.Load()
+
+
+def SaveChatLog(messages):
+    session = _current.get()
+    if session is not None:
+        session.Save(messages)
+        return
+    ChatLog.Save(messages)
+
+
+def Context(messages):
+    """The most recent messages of a conversation, sent to the model with the next question."""
+    return messages[-ChatContext:] if ChatContext > 0 else []
+
+
+class SessionStore:
+    """In-memory sessions by id. The least recently used one is dropped past `capacity`, idle ones after `idle` seconds."""
+
+    def __init__(self, capacity=MaxSessions, idle=SessionIdle):
+        self.capacity = capacity
+        self.idle = idle
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def Create(self):
+        session = Session()
+        with self._lock:
+            self.sessions[session.id] = session
+            self._evict()
+        return session
+
+    def Get(self, session_id):
+        """The session with this id, or None if it doesn't exist (or has expired)."""
+        with self._lock:
+            self._evict()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def Drop(self, session_id):
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _evict(self):
+        cutoff = time() - self.idle
+        for session_id in [sid for sid, s in self.sessions.items() if s.last_used < cutoff]:
+            del self.sessions[session_id]
+        while len(self.sessions) > self.capacity:
+            self.sessions.popitem(last=False)
+
+
+# Sessions of the server
+Store = SessionStore()
@@ -0,0 +1,287 @@
+import json
+import asyncio
+import hashlib
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future
+from dotenv import dotenv_values
+import Tracing
+import Cancellation
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+Coalesce = (env_vars.get("Coalesce") or "on").lower() not in ("off", "false", "0", "no")
+Poll = 0.05  # Seconds between cancellation checks while waiting for a shared call
+
+
+def Fingerprint(*parts, **named):
+    """Stable key for a request: the same arguments (lists, dicts, strings ...) give the same key."""
+    text = json.dumps([parts, named], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One underlying execution and everything its callers need: the result, or the chunks streamed so far."""
+
+    def __init__(self, key):
+        self.key = key
+        self.token = Cancellation.CancelToken("single flight")
+        self.callers = 0
+        self.chunks = []
+        self.future = Future()
+        self.changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+
+class Group:
+    """Single-flight for one kind of call: concurrent calls with the same key share one execution.
+
+    The execution runs on its own thread with its own cancel token, so a caller that is cancelled
+    (a double-clicked send cancels the first turn) leaves without taking the others down; it is only
+    cancelled once every caller has left. The key is dropped when the call ends, so results are never
+    reused by later calls; that is ResponseCache's job.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.flights = {}
+        self.calls = 0
+        self.executions = 0
+        self.absorbed = 0  # Calls that shared another call's execution instead of making their own
+        self._lock = threading.Lock()
+
+    def _join(self, key, work, stream=False):
+        with self._lock:
+            self.calls += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight(key)
+                self.executions += 1
+            else:
+                self.absorbed += 1
+            flight.callers += 1
+        if leader:
+            threading.Thread(target=Tracing.Wrap(lambda: self._run(flight, work, stream)),
+                             name=f"Flight-{self.name}", daemon=True).start()
+        return flight, leader
+
+    def _leave(self, flight):
+        with self._lock:
+            flight.callers -= 1
+            abandoned = flight.callers == 0 and not flight.done
+            if abandoned and self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+        if abandoned:
+            flight.token.Cancel("every caller left")
+
+    def _run(self, flight, work, stream):
+        with Cancellation.Scope(flight.token):
+            try:
+                if stream:
+                    for chunk in work():
+                        with flight.changed:
+                            flight.chunks.append(chunk)
+                            flight.changed.notify_all()
+                    result = None
+                else:
+                    result = work()
+                    if asyncio.iscoroutine(result):
+                        result = asyncio.run(Cancellation.Guard(result))
+                error = None
+            except BaseException as e:
+                error = e
+        with self._lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+        with flight.changed:
+            if error is None:
+                flight.future.set_result(result)
+            else:
+                flight.future.set_exception(error)
+            flight.changed.notify_all()
+
+    def Do(self, key, work):
+        """work() once for all concurrent calls with this key; every caller gets its result or exception."""
+        if not Coalesce:
+            return work()
+        flight, leader = self._join(key, work)
+        try:
+            with Tracing.Span("coalesced", group=self.name) if not leader else nullcontext(), \
+                    Cancellation.Registered(lambda: _wake(flight)):
+                with flight.changed:
+                    while not flight.done and not Cancellation.IsCancelled():
+                        flight.changed.wait(Poll)
+                Cancellation.Check()
+                return flight.future.result()
+        finally:
+            self._leave(flight)
+
+    async def ADo(self, key, work):
+        """Do() for coroutines: work() returns a coroutine, run once on the flight's thread."""
+        if not Coalesce:
+            return await work()
+        flight, leader = self._join(key, work)
+        try:
+            with Tracing.Span("coalesced", group=self.name) if not leader else nullcontext():
+                # Shielded: a cancelled caller stops waiting without cancelling the shared call
+                return await asyncio.shield(asyncio.wrap_future(flight.future))
+        finally:
+            self._leave(flight)
+
+    def Stream(self, key, work):
+        """Iterate work() once for all concurrent calls with this key; each caller gets every chunk from the start."""
+        if not Coalesce:
+            yield from work()
+            return
+        flight, leader = self._join(key, work, stream=True)
+        span = Tracing.Begin("coalesced", group=self.name) if not leader else None
+        error = None
+        sent = 0
+        try:
+            with Cancellation.Registered(lambda: _wake(flight)):
+                while True:
+                    with flight.changed:
+                        if sent == len(flight.chunks) and not flight.done and not Cancellation.IsCancelled():
+                            flight.changed.wait(Poll)
+                        chunks = flight.chunks[sent:]
+                        done = flight.done
+                    Cancellation.Check()
+                    for chunk in chunks:
+                        yield chunk
+                    sent += len(chunks)
+                    if done and sent == len(flight.chunks):
+                        break
+            flight.future.result()  # Raises the shared call's exception, after the chunks it got out
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._leave(flight)
+            if span is not None:
+                span.End(error)
+
+    def AsDict(self):
+        with self._lock:
+            in_flight = len(self.flights)
+        return {"group": self.name, "calls": self.calls, "executions": self.executions,
+                "absorbed": self.absorbed, "in_flight": in_flight}
+
+
+# Wakes the callers waiting on a flight, so a cancelled one leaves right away
+def _wake(flight):
+    with flight.changed:
+        flight.changed.notify_all()
+
+
+Groups = {}
+_groups_lock = threading.Lock()
+
+
+# Shared group for a kind of call ("search", "image", "tts", "llm")
+def GetGroup(name):
+    with _groups_lock:
+        group = Groups.get(name)
+        if group is None:
+            group = Groups[name] = Group(name)
+        return group
+
+
+def Stats():
+    """Counters of every group: calls, executions and the duplicates absorbed."""
+    with _groups_lock:
+        groups = list(Groups.values())
+    return {group.name: group.AsDict() for group in groups}
+
+
+# --- Duplicate bursts (a double-clicked send, a repeated voice command) against local stand-ins ---
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from time import perf_counter, sleep
+    from concurrent.futures import ThreadPoolExecutor
+    import SingleFlight  # The module the backend imports, not this __main__ copy
+    from StandIns import StandInServer, Behaviour
+
+    Bursts = 20
+    Copies = 4  # Identical calls per burst
+
+    servers = {
+        "llm": StandInServer(Behaviour(ttft=0.15, token_rate=300, tokens=60, seed=1)).Start(),
+        "serper": StandInServer(Behaviour(ttft=0.2, seed=2)).Start(),
+        "image": StandInServer(Behaviour(ttft=0.3, seed=3)).Start(),
+    }
+    os.chdir(tempfile.mkdtemp(prefix="jarvis-flight-"))
+    os.makedirs("Data", exist_ok=True)
+    import LLM
+    import RateLimit
+    import ImageGeneration
+    import SearchProviders
+    import RealtimeSearchEngine
+    LLM.RegisterProvider("groq", LLM.OpenAICompatibleProvider(servers["llm"].url + "/v1"))
+    SearchProviders.SerperURL = servers["serper"].url + "/search"
+    SearchProviders.HTMLSearchURL = servers["serper"].url + "/html"
+    ImageGeneration.ImageAPIURL = servers["image"].url
+    for name in ("groq", "serper", "html", "pollinations"):
+        RateLimit.Limiters[name] = RateLimit.Limiter(name, rpm=1e6, concurrency=64)
+
+    calls = {
+        "llm": (servers["llm"], lambda i: LLM.Complete([{"role": "user", "content": f"question {i}"}])),
+        "search": (servers["serper"], lambda i: RealtimeSearchEngine.GoogleSearch(f"query {i}")),
+        "image": (servers["image"], lambda i: ImageGeneration.GenerateImages(f"picture {i}", False)),
+    }
+
+    print(f"{Bursts} bursts of {Copies} identical calls")
+    print(f"{'':<8}{'coalesce':>10}{'upstream':>10}{'absorbed':>10}{'p50 ms':>9}{'p95 ms':>9}  same result")
+    with ThreadPoolExecutor(Copies) as pool:
+        for name, (server, call) in calls.items():
+            for coalesce in (False, True):
+                SingleFlight.Coalesce = coalesce
+                group = SingleFlight.Groups[name]
+                absorbed, sent = group.absorbed, server.requests
+                latencies, same = [], True
+
+                def timed(i):
+                    start = perf_counter()
+                    result = call(i)
+                    return result, perf_counter() - start
+
+                for burst in range(Bursts):
+                    results = list(pool.map(timed, [burst + (1000 if coalesce else 0)] * Copies))
+                    latencies += [seconds for _, seconds in results]
+                    same = same and len({str(result) for result, _ in results}) == 1
+                latencies.sort()
+                print(f"{name:<8}{'on' if coalesce else 'off':>10}{server.requests - sent:>10}{group.absorbed - absorbed:>10}"
+                      f"{latencies[len(latencies) // 2] * 1000:>9.0f}{latencies[int(len(latencies) * 0.95)] * 1000:>9.0f}  {same}")
+
+    # The first caller is cancelled (a new turn replaced it): the second still gets the whole answer
+    SingleFlight.Coalesce = True
+    first_token = Cancellation.CancelToken("first")
+    outcome = {}
+
+    def first():
+        with Cancellation.Scope(first_token):
+            try:
+                LLM.Complete([{"role": "user", "content": "shared"}])
+            except Cancellation.Cancelled:
+                outcome["first"] = "cancelled"
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    while not SingleFlight.Groups["llm"].flights:
+        sleep(0.001)
+    sent = servers["llm"].requests
+    second = threading.Thread(target=lambda: outcome.setdefault("second", LLM.Complete([{"role": "user", "content": "shared"}])))
+    second.start()
+    first_token.Cancel("replaced")
+    thread.join()
+    second.join()
+    print(f"\nFirst caller {outcome.get('first')}, second got {len(outcome.get('second', ''))} chars "
+          f"from {servers['llm'].requests - sent} new upstream request(s)")
+    print(SingleFlight.Stats())
+    for server in servers.values():
+        server.Stop()
@@ -6,6 +6,7 @@ from webdriver_manager.chrome import ChromeDriverManager
 from dotenv import dotenv_values
 import os
 import mtranslate as mt
+import Tracing
 
 # Load environment variables
 env_vars = dotenv_values(".env")
@@ -70,9 +71,15 @@ chrome_options.add_argument("--use-fake-ui-for-media-stream")
 chrome_options.add_argument("--use-fake-device-for-media-stream")
 chrome_options.add_argument("--headless=new") # Browser hide karne ke liye
 
-# Initialize Service and Driver
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=chrome_options)
+# Chrome is started on first use, so with the wake word on it only runs once "Jarvis" has been heard
+driver = None
+
+def Driver():
+    global driver
+    if driver is None:
+        service = Service(ChromeDriverManager().install())
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+    return driver
 
 TempDirPath = rf"{current_dir}/Frontend/Files"
 
@@ -99,11 +106,15 @@ def QueryModifier(Query):
 
     return new_query.capitalize()
 
+@Tracing.Traced("stt.translate")
 def UniversalTranslator(Text):
     english_translation = mt.translate(Text, "en", "auto")
     return english_translation.capitalize()
 
-def SpeechRecognition():
+@Tracing.Traced("stt")
+def SpeechRecognition(on_speech=None):
+    """Return the next spoken query. on_speech() runs as soon as speech is heard, before translation (used for barge-in)."""
+    driver = Driver()
     driver.get("file:///" + Link)
     driver.find_element(by=By.ID, value="start").click()
 
@@ -113,6 +124,9 @@ def SpeechRecognition():
 
             if Text:
                 driver.find_element(by=By.ID, value="end").click() # Clear output for next command
+                driver.get("about:blank") # The page restarts recognition when it ends; leaving it releases the microphone
+                if on_speech:
+                    on_speech()
                 
                 if InputLanguage.lower() == "en" or "en" in InputLanguage.lower():
                     return QueryModifier(Text)
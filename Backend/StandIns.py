@@ -0,0 +1,304 @@
+import json
+import math
+import random
+import threading
+from collections import deque
+from time import sleep, monotonic
+from urllib.parse import urlparse, unquote, parse_qs, quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Words the fake LLM streams back
+Vocabulary = ("the assistant answers with a short and accurate reply about the topic using simple words "
+              "so that the user can understand it quickly and act on it").split()
+
+
+class Behaviour:
+    """How a stand-in server responds: latency, token rate and injected failures."""
+
+    def __init__(self, ttft=0.05, jitter=0.0, token_rate=200.0, tokens=60, failure_rate=0.0,
+                 failure_status=500, slow_rate=0.0, slow_factor=10.0, prefill_rate=None, rpm_limit=None,
+                 concurrency_limit=None, limit_window=60.0, seed=None):
+        self.ttft = ttft                  # Median seconds before the first byte
+        self.jitter = jitter              # Lognormal sigma applied to ttft (0 = fixed)
+        self.token_rate = token_rate      # Tokens per second once streaming
+        self.tokens = tokens              # Tokens per LLM answer
+        self.failure_rate = failure_rate  # Fraction of requests answered with failure_status
+        self.failure_status = failure_status
+        self.slow_rate = slow_rate        # Fraction of requests whose ttft is multiplied by slow_factor
+        self.slow_factor = slow_factor
+        self.prefill_rate = prefill_rate  # Prompt tokens per second added before the first token (None = free)
+        self.rpm_limit = rpm_limit        # Requests per rolling window before answering 429 (None = unlimited)
+        self.concurrency_limit = concurrency_limit  # In-flight requests before answering 429
+        self.limit_window = limit_window  # Seconds rpm_limit applies to (shorter than a minute keeps tests quick)
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def Delay(self):
+        with self._lock:
+            delay = self.ttft * (math.exp(self.random.gauss(0, self.jitter)) if self.jitter else 1.0)
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                delay *= self.slow_factor
+            return delay
+
+    def Fails(self):
+        with self._lock:
+            return self.failure_rate > 0 and self.random.random() < self.failure_rate
+
+
+# Router stand-in: answers like the Cohere decision model would for simple queries
+def RouterResponder(messages):
+    query = messages[-1]["content"].strip().rstrip("?.!").lower()
+    for prefix in ("open ", "close ", "play ", "generate image ", "content ", "google search ", "youtube search ", "system "):
+        if query.startswith(prefix):
+            return query
+    if query.startswith(("write ", "draft ")):
+        return f"content {query.split(' ', 1)[1]}"
+    if any(word in query for word in ("latest", "news", "who is", "today's", "price", "weather")):
+        return f"realtime {query}"
+    if query in ("bye", "bye jarvis", "exit"):
+        return "exit"
+    return f"general {query}"
+
+
+def TextResponder(tokens):
+    def respond(messages):
+        return " ".join(Vocabulary[i % len(Vocabulary)] for i in range(tokens)) + "."
+    return respond
+
+
+class StandInServer:
+    """Local HTTP server that imitates Groq/Cohere (OpenAI-compatible SSE), Serper, an HTML search page, the result pages and Pollinations."""
+
+    def __init__(self, behaviour=None, responder=None, host="127.0.0.1", port=0):
+        self.behaviour = behaviour or Behaviour()
+        self.responder = responder or TextResponder(self.behaviour.tokens)
+        self.pages_url = None  # Where search result links point (another stand-in's pages); this one by default
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.throttled = 0
+        self.early = 0  # Requests that arrived before the Retry-After this server last sent had run out
+        self._retry_until = 0.0
+        self._window = deque()  # Arrival times of admitted requests in the current window
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def Start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="StandInServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def Stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _enter(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _admit(self):
+        """Enforce rpm_limit / concurrency_limit like a provider would; returns (admitted, rate-limit headers)."""
+        behaviour = self.behaviour
+        window = behaviour.limit_window
+        if behaviour.rpm_limit is None and behaviour.concurrency_limit is None:
+            return True, {}
+        with self._lock:
+            now = monotonic()
+            if now < self._retry_until:
+                self.early += 1
+            while self._window and self._window[0] <= now - window:
+                self._window.popleft()
+            headers = {}
+            if behaviour.rpm_limit is not None:
+                remaining = behaviour.rpm_limit - len(self._window)
+                reset = (self._window[0] + window - now) if self._window else 0.0
+                headers = {"x-ratelimit-limit-requests": str(behaviour.rpm_limit),
+                           "x-ratelimit-remaining-requests": str(max(0, remaining - 1)),
+                           "x-ratelimit-reset-requests": f"{reset:.2f}s"}
+                if remaining <= 0:
+                    self.throttled += 1
+                    headers["retry-after"] = str(max(1, math.ceil(reset)))
+                    self._retry_until = max(self._retry_until, now + int(headers["retry-after"]))
+                    return False, headers
+            if behaviour.concurrency_limit is not None and self.in_flight > behaviour.concurrency_limit:
+                self.throttled += 1  # Too many at once: no Retry-After, the client has to back off on its own
+                return False, headers
+            self._window.append(now)
+            return True, headers
+
+    def _exit(self, failed):
+        with self._lock:
+            self.in_flight -= 1
+            self.failures += failed
+
+    # ----- routes -----
+
+    def _chat(self, handler, body):
+        text = self.responder(body.get("messages", []))
+        words = text.split(" ")[:body.get("max_tokens") or None]  # One word per token, cut at the cap
+        prompt = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        if self.behaviour.prefill_rate:
+            sleep(prompt / self.behaviour.prefill_rate)  # Longer prompts take longer to the first token
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        self._limit_headers(handler)
+        handler.end_headers()
+        interval = 1.0 / self.behaviour.token_rate if self.behaviour.token_rate else 0.0
+        started = monotonic()
+        for i, word in enumerate(words):
+            chunk = {"choices": [{"delta": {"content": word if i == 0 else " " + word}}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+            if interval:
+                # Pace against the start time so the rate holds even with slow writes
+                sleep(max(0.0, started + (i + 1) * interval - monotonic()))
+        usage = {"choices": [], "usage": {"prompt_tokens": prompt, "completion_tokens": len(words)}}
+        handler.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+    def _search(self, handler, body):
+        query = body.get("q", "")
+        results = [{"title": f"{query} - result {i}", "snippet": f"Snippet {i} about {query}.",
+                    "link": f"{self.pages_url or self.url}/page/{i}?q={query.replace(' ', '+')}"} for i in range(body.get("num", 5))]
+        self._json(handler, {"organic": results})
+
+    def _html_search(self, handler):
+        # A results page laid out like DuckDuckGo's HTML one: an ad, then results whose links go through a
+        # redirect. Two of them are also in the /search results, the rest are other pages.
+        query = parse_qs(urlparse(handler.path).query).get("q", [""])[0]
+        link = lambda i: f"{self.pages_url or self.url}/page/{i}?q={query.replace(' ', '+')}"
+        blocks = [f'<div class="result result--ad"><a class="result__a" href="{self.url}/ad">Buy {query}</a></div>']
+        for i in [1, 0] + list(range(5, 8)):
+            blocks.append(f'<div class="result results_links web-result"><h2 class="result__title">'
+                          f'<a class="result__a" href="//duckduckgo.com/l/?uddg={quote(link(i), safe="")}&amp;rut=x">{query} - page {i}</a></h2>'
+                          f'<a class="result__snippet" href="{link(i)}">A longer description of page {i}, which is about {query}.</a></div>')
+        raw = f"<html><body><div id=links class=results>{''.join(blocks)}</div></body></html>".encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(raw)))
+        handler.end_headers()
+        handler.wfile.write(raw)
+
+    def _page(self, handler):
+        # A result page: boilerplate around an article in which a few paragraphs are about the query
+        parsed = urlparse(handler.path)
+        query = unquote(parsed.query.partition("q=")[2]).replace("+", " ") or "the topic"
+        number = int(parsed.path.rsplit("/", 1)[-1] or 0)
+        filler = " ".join(Vocabulary)
+        paragraphs = []
+        for i in range(12):
+            if i % 4 == 1:
+                paragraphs.append(f"<p>Page {number} explains {query} in detail, fact {i}: {filler}.</p>")
+            else:
+                paragraphs.append(f"<p>{filler.capitalize()}, section {i} of page {number}.</p>")
+        html = (f"<html><head><title>{query} - page {number}</title><script>{'var tracking = 1;' * 2000}</script>"
+                f"<style>{'p {{ margin: 0 }}' * 200}</style></head><body>"
+                f"<header><nav>{''.join(f'<a href=/page/{n}>Link {n} in the menu of this site</a>' for n in range(40))}</nav></header>"
+                f"<aside><p>Sponsored: buy the best products for {query} today at discount prices.</p></aside>"
+                f"<div class=content><h1>{query}</h1>{''.join(paragraphs)}</div>"
+                f"<footer><p>Copyright and privacy policy of this example site, all rights reserved.</p></footer></body></html>")
+        raw = html.encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(raw)))
+        handler.end_headers()
+        handler.wfile.write(raw)
+
+    def _image(self, handler):
+        payload = bytes(random.getrandbits(8) for _ in range(2048)) * 64  # ~128 KB, like a compressed 1024x1024 JPEG
+        handler.send_response(200)
+        handler.send_header("Content-Type", "image/jpeg")
+        handler.send_header("Content-Length", str(len(payload)))
+        self._limit_headers(handler)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _json(self, handler, data, status=200):
+        raw = json.dumps(data).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(raw)))
+        self._limit_headers(handler)
+        handler.end_headers()
+        handler.wfile.write(raw)
+
+    def _limit_headers(self, handler):
+        for name, value in getattr(handler, "limit_headers", {}).items():
+            handler.send_header(name, value)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client dropped a kept-alive connection
+
+            def _serve(self, body):
+                server._enter()
+                failed = False
+                try:
+                    admitted, self.limit_headers = server._admit()
+                    if not admitted:
+                        server._json(self, {"error": {"message": "Rate limit reached", "type": "requests"}}, 429)
+                        return
+                    sleep(server.behaviour.Delay())
+                    if server.behaviour.Fails():
+                        failed = True
+                        server._json(self, {"error": "injected failure"}, server.behaviour.failure_status)
+                        return
+                    path = urlparse(self.path).path
+                    if path.endswith("/chat/completions"):
+                        self.close_connection = True  # SSE body has no length, so end it by closing
+                        server._chat(self, body)
+                    elif path == "/search":
+                        server._search(self, body)
+                    elif path == "/html":
+                        server._html_search(self)
+                    elif path.startswith("/page/"):
+                        server._page(self)
+                    elif path.startswith("/prompt/"):
+                        server._image(self)
+                    else:
+                        server._json(self, {"error": f"unknown path {unquote(path)}"}, 404)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client cancelled
+                finally:
+                    server._exit(failed)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b"{}"
+                self._serve(json.loads(raw or b"{}"))
+
+            def do_GET(self):
+                self._serve({})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    llm = StandInServer(Behaviour(ttft=0.2, token_rate=50)).Start()
+    router = StandInServer(Behaviour(ttft=0.1), responder=RouterResponder).Start()
+    print(f"Groq stand-in:   GroqBaseURL={llm.url}/v1")
+    print(f"Cohere stand-in: CohereBaseURL={router.url}/v1")
+    print(f"Serper stand-in: SerperURL={llm.url}/search")
+    print(f"HTML search:     HTMLSearchURL={llm.url}/html")
+    print(f"Image stand-in:  ImageAPIURL={llm.url}")
+    threading.Event().wait()
@@ -4,13 +4,22 @@ import asyncio
 import edge_tts
 import os
 from dotenv import dotenv_values
+import Tracing
+import Cancellation
+import SingleFlight
 
 # Load environment variables
 env_vars = dotenv_values(".env")
 AssistantVoice = env_vars.get("AssistantVoice")
 
+# Identical text synthesized at the same time is synthesized once (they would race on Data\speech.mp3)
+Syntheses = SingleFlight.GetGroup("tts")
+
 # --- ASYNC FUNCTION TO CONVERT TEXT TO AUDIO ---
 async def TextToAudioFile(text) -> None:
+    await Syntheses.ADo(SingleFlight.Fingerprint(text, AssistantVoice), lambda: SynthesizeFile(text))
+
+async def SynthesizeFile(text) -> None:
     file_path = r"Data\speech.mp3"
     
     if os.path.exists(file_path):
@@ -21,42 +30,64 @@ async def TextToAudioFile(text) -> None:
     communicate = edge_tts.Communicate(text, AssistantVoice, pitch='+5Hz', rate='+13%')
     await communicate.save(r'Data\speech.mp3')
 
+# --- PLAYBACK (blocking; stops early when func() returns False or the turn is cancelled) ---
+def PlayAudio(func=lambda r=None: True):
+    with Tracing.Span("tts.playback"):
+        # Initialize pygame mixer for audio playback
+        pygame.mixer.init()
+        
+        # Load the generated speech file
+        pygame.mixer.music.load(r"Data\speech.mp3")
+        pygame.mixer.music.play()
+        
+        # Loop until the audio is done playing or the function stops
+        while pygame.mixer.music.get_busy():
+            if func() == False or Cancellation.IsCancelled(): # Stop if told to, or if the turn was cancelled (barge-in)
+                break
+            pygame.time.Clock().tick(10) # Limit the loop to 10 ticks per second
+
+def StopAudio(func):
+    try:
+        # Call the provided function with False to signal the end of TTS
+        func(False)
+        pygame.mixer.music.stop()
+        pygame.mixer.quit()
+    except Exception as e:
+        print(f"Error in finally block: {e}")
+
 # --- TTS FUNCTION (Handles Playback) ---
 def TTS(Text, func=lambda r=None: True):
     while True:
         try:
             # Convert text to audio file asynchronously
-            asyncio.run(TextToAudioFile(Text))
-            
-            # Initialize pygame mixer for audio playback
-            pygame.mixer.init()
+            with Tracing.Span("tts.synthesize", chars=len(Text)):
+                asyncio.run(Cancellation.Guard(TextToAudioFile(Text)))
             
-            # Load the generated speech file
-            pygame.mixer.music.load(r"Data\speech.mp3")
-            pygame.mixer.music.play()
-            
-            # Loop until the audio is done playing or the function stops
-            while pygame.mixer.music.get_busy():
-                if func() == False: # Check if the external function returns false
-                    break
-                pygame.time.Clock().tick(10) # Limit the loop to 10 ticks per second
-                
+            PlayAudio(func)
             return True # Return True if the audio played successfully
         
         except Exception as e:
             print(f"Error in TTS: {e}")
             
         finally:
-            try:
-                # Call the provided function with False to signal the end of TTS
-                func(False)
-                pygame.mixer.music.stop()
-                pygame.mixer.quit()
-            except Exception as e:
-                print(f"Error in finally block: {e}")
+            StopAudio(func)
+
+# --- ASYNC TTS (for the backend loop: synthesis awaits on the loop, playback runs on its executor) ---
+async def ATTS(Text, func=lambda r=None: True):
+    try:
+        with Tracing.Span("tts.synthesize", chars=len(Text)):
+            await Cancellation.Guard(TextToAudioFile(Text))
+        await asyncio.to_thread(PlayAudio, func)
+        return True
+    except Exception as e:
+        print(f"Error in TTS: {e}")
+        return False
+    finally:
+        StopAudio(func)
 
 # --- TEXT TO SPEECH (Handles Long Text) ---
-def TextToSpeech(Text, func=lambda r=None: True):
+# Text that is actually spoken: long answers are cut to two sentences plus a pointer to the chat
+def SpeechText(Text):
     Data = str(Text).split(".")
     
     # List of responses for long text (taaki user bore na ho)
@@ -80,11 +111,16 @@ def TextToSpeech(Text, func=lambda r=None: True):
 
     # Agar text bohot lamba hai (more than 4 sentences and 250 chars)
     if len(Data) > 4 and len(Text) >= 250:
-        TTS(" ".join(Text.split(".")[0:2]) + ". " + random.choice(responses), func)
+        return " ".join(Text.split(".")[0:2]) + ". " + random.choice(responses)
     
     # Otherwise, play the whole text
-    else:
-        TTS(Text, func)
+    return Text
+
+def TextToSpeech(Text, func=lambda r=None: True):
+    TTS(SpeechText(Text), func)
+
+async def ATextToSpeech(Text, func=lambda r=None: True):
+    await ATTS(SpeechText(Text), func)
 
 # --- MAIN EXECUTION LOOP (Testing) ---
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+# Folder that holds generated images and the on-disk thumbnail cache
+ImageFolder = "Data"
+ThumbnailFolder = os.path.join("Data", "Thumbnails")
+
+# Longest side of a gallery thumbnail in pixels
+ThumbSize = 192
+
+# Image types the gallery will show
+ImageExtensions = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+# Build the cache file path for an image (changes whenever the image is rewritten)
+def ThumbnailPath(image_path, size=ThumbSize, folder=ThumbnailFolder):
+    stat = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(folder, f"{digest}.png")
+
+
+# Decode, downscale and cache one thumbnail (runs inside a worker process)
+def MakeThumbnail(image_path, size=ThumbSize, folder=ThumbnailFolder):
+    thumb_path = ThumbnailPath(image_path, size, folder)
+    if os.path.exists(thumb_path):
+        return thumb_path
+
+    from PIL import Image  # Imported here so the Tk process never pays for Pillow
+
+    with Image.open(image_path) as img:
+        # JPEG draft mode decodes straight at 1/2, 1/4 or 1/8 scale, which is most of the win on 1024x1024 files
+        img.draft("RGB", (size, size))
+        img = img.convert("RGB")
+        img.thumbnail((size, size), Image.BILINEAR)
+
+        os.makedirs(folder, exist_ok=True)
+        temp_path = f"{thumb_path}.{os.getpid()}.tmp"
+        img.save(temp_path, "PNG", optimize=False, compress_level=1)
+        os.replace(temp_path, thumb_path)  # Atomic so a half-written file is never shown
+
+    return thumb_path
+
+
+# List gallery images, newest first
+def ListImages(folder=ImageFolder):
+    if not os.path.isdir(folder):
+        return []
+    files = [os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(ImageExtensions)]
+    files.sort(key=lambda path: os.path.getmtime(path), reverse=True)
+    return files
+
+
+class ThumbnailPipeline:
+    """Decodes thumbnails in a process pool so the Tk thread only ever loads small cached PNGs."""
+
+    def __init__(self, size=ThumbSize, folder=ThumbnailFolder, max_workers=None):
+        self.size = size
+        self.folder = folder
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._pool = None
+        self._pending = {}  # image path -> Future, so repeated scroll requests are not queued twice
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def Cached(self, image_path):
+        """Return the cached thumbnail path if it already exists, without touching the pool."""
+        try:
+            thumb_path = ThumbnailPath(image_path, self.size, self.folder)
+        except OSError:
+            return None
+        return thumb_path if os.path.exists(thumb_path) else None
+
+    def Request(self, image_path, callback):
+        """Schedule a thumbnail; callback(image_path, thumb_path or None) runs on a pool callback thread."""
+        cached = self.Cached(image_path)
+        if cached:
+            callback(image_path, cached)
+            return None
+
+        with self._lock:
+            future = self._pending.get(image_path)
+            if future is None:
+                future = self._get_pool().submit(MakeThumbnail, image_path, self.size, self.folder)
+                self._pending[image_path] = future
+
+        def done(fut):
+            with self._lock:
+                self._pending.pop(image_path, None)
+            try:
+                result = fut.result()
+            except Exception as e:
+                print(f"Thumbnail error for {image_path}: {e}")
+                result = None
+            callback(image_path, result)
+
+        future.add_done_callback(done)
+        return future
+
+    def Cancel(self, image_path):
+        """Drop a queued request that scrolled out of view before a worker picked it up."""
+        with self._lock:
+            future = self._pending.get(image_path)
+            if future is not None and future.cancel():
+                self._pending.pop(image_path, None)
+
+    def Shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# --- Benchmark: thumbnails for a folder of 1024x1024 images ---
+if __name__ == "__main__":
+    import tempfile
+    from PIL import Image
+
+    count = 200
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Creating {count} fixture images (1024x1024)...")
+        for i in range(count):
+            Image.new("RGB", (1024, 1024), ((i * 37) % 255, (i * 91) % 255, (i * 13) % 255)).save(
+                os.path.join(folder, f"fixture_{i}.jpg"), quality=90)
+
+        images = ListImages(folder)
+        pipeline = ThumbnailPipeline(folder=os.path.join(folder, "Thumbnails"))
+        done = threading.Event()
+        remaining = [len(images)]
+        remaining_lock = threading.Lock()
+
+        def finished(_path, _thumb):
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+        start = perf_counter()
+        for path in images:
+            pipeline.Request(path, finished)
+        done.wait()
+        cold = perf_counter() - start
+
+        start = perf_counter()
+        hits = sum(1 for path in images if pipeline.Cached(path))
+        warm = perf_counter() - start
+        pipeline.Shutdown()
+
+        print(f"Cold: {cold * 1000:.0f} ms for {count} thumbnails with {pipeline.max_workers} workers ({cold / count * 1000:.2f} ms each)")
+        print(f"Warm: {warm * 1000:.2f} ms for {hits} cache lookups")
@@ -0,0 +1,297 @@
+import os
+import json
+import asyncio
+import uuid
+import inspect
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter, time
+
+# Finished traces are appended here, one JSON object per turn, and rotated by size
+TraceFile = os.path.join("Data", "Traces.jsonl")
+MaxTraceBytes = 5 * 1024 * 1024
+TraceBackups = 3
+
+# Most recent finished traces, for the GUI breakdown panel
+RecentTraces = deque(maxlen=50)
+
+# Callbacks run with each finished trace (from whichever thread finished it)
+Listeners = []
+
+_current = contextvars.ContextVar("jarvis_span", default=None)
+_file_lock = threading.Lock()
+
+# Trace ID each thread is working for (absent between turns). A sampling profiler on another thread
+# can't read this thread's context variables, so the span is noted here as well whenever it changes.
+# On the event loop thread it is the trace of the span last entered or left there.
+ThreadTraces = {}
+
+
+def _note(span):
+    trace_id = span.trace.trace_id if span is not None and span.trace else None
+    if trace_id is None:
+        ThreadTraces.pop(threading.get_ident(), None)  # Short-lived threads leave nothing behind once they're done
+    else:
+        ThreadTraces[threading.get_ident()] = trace_id
+
+
+def _set(span):
+    token = _current.set(span)
+    _note(span)
+    return token
+
+
+def _reset(token):
+    _current.reset(token)
+    _note(_current.get())
+
+
+@contextmanager
+def _tagged(trace_id):
+    # Tag this thread with trace_id for a while, outside of any span (wrapped calls, trace writes)
+    ident = threading.get_ident()
+    previous = ThreadTraces.get(ident)
+    ThreadTraces[ident] = trace_id
+    try:
+        yield
+    finally:
+        if previous is None:
+            ThreadTraces.pop(ident, None)  # Short-lived threads (hedges, page fetches) leave nothing behind
+        else:
+            ThreadTraces[ident] = previous
+
+
+class Trace:
+    """All spans of one turn. Written out once the root and every child span have ended."""
+
+    def __init__(self, name, attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time()
+        self.start = perf_counter()
+        self.spans = []
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def Hold(self):
+        with self._lock:
+            self.open += 1
+
+    def Release(self):
+        with self._lock:
+            self.open -= 1
+            finished = self.open == 0
+        if finished:
+            _finish(self)
+
+    def AsDict(self):
+        return {"trace_id": self.trace_id, "name": self.name, "started_at": self.started_at,
+                "attrs": self.attrs, "spans": [span.AsDict() for span in self.spans]}
+
+
+class Span:
+    """One timed operation. Use as a context manager (makes it the current span) or Begin()/End()."""
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.error = None
+        self.duration = None
+        self.parent = parent if parent is not None else _current.get()
+        self.trace = self.parent.trace if self.parent is not None else None
+        self.span_id = uuid.uuid4().hex[:8] if self.trace else None
+        self.start = None
+        self._token = None
+
+    def Set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def Start(self):
+        self.start = perf_counter()
+        if self.trace:
+            self.trace.Hold()
+        return self
+
+    def End(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = perf_counter() - self.start
+        if error is not None:
+            self.error = repr(error)
+        if self.trace:
+            with self.trace._lock:
+                self.trace.spans.append(self)
+            self.trace.Release()
+
+    def __enter__(self):
+        self.Start()
+        self._token = _set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _reset(self._token)
+        self.End(exc)
+        return False
+
+    def AsDict(self):
+        return {"name": self.name, "span_id": self.span_id,
+                "parent": self.parent.span_id if self.parent is not None else None,
+                "offset": self.start - self.trace.start, "duration": self.duration,
+                "attrs": self.attrs, "error": self.error}
+
+
+class RootSpan(Span):
+    def __init__(self, name, **attrs):
+        super().__init__(name, **attrs)
+        self.parent = None
+        self.trace = Trace(name, attrs)
+        self.span_id = uuid.uuid4().hex[:8]
+
+
+# Start a new trace for one turn: `with StartTrace("turn", query=q) as root: ...`
+def StartTrace(name, **attrs):
+    return RootSpan(name, **attrs)
+
+
+# Create and start a span without making it current (for generators and callbacks on other threads)
+def Begin(name, parent=None, **attrs):
+    return Span(name, parent=parent, **attrs).Start()
+
+
+def Current():
+    return _current.get()
+
+
+def CurrentTraceId():
+    span = _current.get()
+    return span.trace.trace_id if span is not None and span.trace else None
+
+
+# Decorator: run the function (or coroutine function, or generator) inside a span named `name`
+def Traced(name):
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                # The span is current only while the generator runs, not while the caller handles its items
+                span = Begin(name)
+                generator = func(*args, **kwargs)
+                error = None
+                try:
+                    while True:
+                        reset = _set(span)
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            _reset(reset)
+                        yield item
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    reset = _set(span)
+                    try:
+                        generator.close()
+                    finally:
+                        _reset(reset)
+                        span.End(error)
+            return generator_wrapper
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with Span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Carry the current trace into a new thread; the trace stays open until func returns
+def Wrap(func):
+    context = contextvars.copy_context()
+    span = _current.get()
+    trace = span.trace if span is not None else None
+    if trace:
+        trace.Hold()
+
+    def run(*args, **kwargs):
+        with _tagged(trace.trace_id if trace else None):
+            return func(*args, **kwargs)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return context.run(run, *args, **kwargs)
+        finally:
+            if trace:
+                trace.Release()
+    return wrapper
+
+
+# Like Wrap(), for a coroutine started as a background task: the trace stays open until it finishes
+def WrapCoroutine(coro):
+    span = _current.get()
+    trace = span.trace if span is not None else None
+    if trace:
+        trace.Hold()
+
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            if trace:
+                trace.Release()
+    return wrapper()
+
+
+def Breakdown(trace):
+    """Total seconds per top-level stage name (children of the root), plus the whole turn."""
+    totals = {}
+    root_id = next((s.span_id for s in trace.spans if s.parent is None), None)
+    for span in trace.spans:
+        if span.parent is not None and span.parent.span_id == root_id:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        if span.name == "llm" and span.attrs.get("ttft") is not None:
+            totals["ttft"] = min(totals.get("ttft", float("inf")), span.attrs["ttft"])
+    end = max((s.start - trace.start + s.duration for s in trace.spans), default=0.0)
+    totals["total"] = end
+    return totals
+
+
+def _rotate():
+    if os.path.exists(TraceFile) and os.path.getsize(TraceFile) > MaxTraceBytes:
+        for i in range(TraceBackups - 1, 0, -1):
+            if os.path.exists(f"{TraceFile}.{i}"):
+                os.replace(f"{TraceFile}.{i}", f"{TraceFile}.{i + 1}")
+        os.replace(TraceFile, f"{TraceFile}.1")
+
+
+def _finish(trace):
+    trace.spans.sort(key=lambda s: s.start)
+    RecentTraces.append(trace)
+    with _tagged(trace.trace_id):  # The write and listeners belong to this turn in profiles
+        try:
+            with _file_lock:
+                os.makedirs(os.path.dirname(TraceFile) or ".", exist_ok=True)
+                _rotate()
+                with open(TraceFile, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.AsDict()) + "\n")
+        except OSError as e:
+            print(f"Trace write failed: {e}")
+        for listener in list(Listeners):
+            try:
+                listener(trace)
+            except Exception as e:
+                print(f"Trace listener error: {e}")
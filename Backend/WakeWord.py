@@ -0,0 +1,475 @@
+import os
+import glob
+import wave
+from time import thread_time
+import numpy as np
+from dotenv import dotenv_values
+import Cancellation
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+WakeWordMode = (env_vars.get("WakeWord") or "off").lower() in ("on", "true", "1", "yes")   # Listen for the wake word at start
+WakeThreshold = float(env_vars.get("WakeThreshold") or 0)        # DTW distance that fires (0 = calibrated from the recordings)
+WakeCPUBudget = float(env_vars.get("WakeCPUBudget") or 0.05)     # Share of one core the spotter may use on average
+
+TemplatesPath = os.path.join("Data", "WakeWord")  # Recordings of the user saying the wake word (python Backend/WakeWord.py --enroll)
+
+SampleRate = 16000
+FrameLength = 400      # 25 ms
+FrameHop = 160         # 10 ms
+FFTSize = 512
+MelBands = 26
+Coefficients = 12      # MFCC 1-12; c0 (loudness) is left out so the distance doesn't depend on volume
+Oversubtract = 2.0     # Spectral subtraction: this times the band's noise estimate is taken off
+DynamicRange = 15      # Mel bands more than this many dB under a frame's loudest are raised to it, so background noise in quiet bands doesn't count
+GateDB = 8             # A frame is speech when it is this much louder than the noise floor
+BaseStride = 3         # Frames between matches while there is speech
+MaxStride = 24         # Matches are spread out up to this far when the CPU budget is exceeded
+Margin = 1.6           # Calibrated threshold: this times the typical distance between two recordings
+NoiseFrames = 300      # Noise is estimated over the last 3 s
+Refractory = 1.0       # Seconds after firing during which the spotter stays quiet
+
+
+def MelFilterbank(rate=SampleRate, fft=FFTSize, bands=MelBands, low=60.0, high=None):
+    """Triangular filters evenly spaced on the mel scale, as a (bands, fft // 2 + 1) matrix."""
+    mel = lambda hz: 2595.0 * np.log10(1.0 + hz / 700.0)
+    edges = 700.0 * (10 ** (np.linspace(mel(low), mel(high or rate / 2), bands + 2) / 2595.0) - 1.0)
+    bins = np.fft.rfftfreq(fft, 1.0 / rate)
+    lower, centre, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    return np.maximum(0.0, np.minimum((bins - lower) / (centre - lower), (upper - bins) / (upper - centre)))
+
+
+_window = np.hamming(FrameLength).astype(np.float32)
+_filters = MelFilterbank().astype(np.float32)
+_n = np.arange(MelBands)
+_dct = (np.cos(np.pi * np.arange(1, Coefficients + 1)[:, None] * (_n + 0.5) / MelBands)
+        * np.sqrt(2.0 / MelBands) * (1 + 11 * np.sin(np.pi * np.arange(1, Coefficients + 1) / 22))[:, None]).astype(np.float32)
+
+
+def Spectrum(samples):
+    """(mel energies, frame energies in dB) of float samples in [-1, 1], one row per 10 ms frame."""
+    if len(samples) < FrameLength:
+        return np.zeros((0, MelBands), np.float32), np.zeros(0, np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FrameLength)[::FrameHop]
+    frames = np.concatenate([frames[:, :1], frames[:, 1:] - 0.97 * frames[:, :-1]], axis=1) * _window
+    power = np.abs(np.fft.rfft(frames, FFTSize)) ** 2
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    return (power @ _filters.T).astype(np.float32), energy.astype(np.float32)
+
+
+def Cepstra(mel, noise=None):
+    """MFCCs of mel energies, with the background noise (per band) subtracted first.
+
+    What is left in a band under DynamicRange below the frame's loudest band is raised to that
+    level, so noise in quiet bands doesn't count towards the distance.
+    """
+    if noise is not None:
+        mel = np.maximum(mel - Oversubtract * noise, 0.05 * mel)
+    mel = np.maximum(mel, mel.max(axis=1, keepdims=True) * 10 ** (-DynamicRange / 10))
+    return (np.log(mel + 1e-10) @ _dct.T).astype(np.float32)
+
+
+def Speech(energy, below=30):
+    """Slice of the frames from the first to the last that is clearly above the background noise
+    (and not more than `below` dB under the loudest)."""
+    if not len(energy):
+        return slice(0, 0)
+    loud = np.flatnonzero(energy > max(energy.max() - below, min(np.percentile(energy, 10) + GateDB, energy.max() - 3)))
+    return slice(max(0, loud[0] - 3), loud[-1] + 3)
+
+
+def Template(samples):
+    """MFCCs of a recording of the wake word: the spoken part only, its own background subtracted."""
+    mel, energy = Spectrum(samples)
+    return Cepstra(mel[Speech(energy)], np.percentile(mel, 10, axis=0))
+
+
+def Trim(samples):
+    """Cut leading and trailing silence."""
+    speech = Speech(Spectrum(samples)[1])
+    return samples[speech.start * FrameHop:speech.stop * FrameHop + FrameLength]
+
+
+def Distance(template, window):
+    """Mean frame distance of the best alignment of the whole template with any part of the window.
+
+    Subsequence DTW where each step moves one template frame and zero, one or two window frames,
+    so a row depends only on the row before and is computed with numpy in one go.
+    """
+    if not len(window):
+        return np.inf
+    cost = np.sqrt(np.maximum(0.0, (template ** 2).sum(1)[:, None] + (window ** 2).sum(1)[None, :] - 2 * template @ window.T))
+    row = cost[0]
+    for i in range(1, len(template)):
+        best = row.copy()
+        np.minimum(best[1:], row[:-1], out=best[1:])
+        np.minimum(best[2:], row[:-2], out=best[2:])
+        row = cost[i] + best
+    return float(row.min()) / len(template)
+
+
+def ReadWav(path):
+    """Mono float32 samples at SampleRate from a 16-bit PCM WAV file."""
+    with wave.open(path, "rb") as f:
+        rate, channels, width = f.getframerate(), f.getnchannels(), f.getsampwidth()
+        data = f.readframes(f.getnframes())
+    if width != 2:
+        raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+    samples = np.frombuffer(data, dtype=np.int16).reshape(-1, channels).mean(axis=1) / 32768.0
+    if rate != SampleRate:
+        samples = np.interp(np.arange(0, len(samples), rate / SampleRate), np.arange(len(samples)), samples)
+    return samples.astype(np.float32)
+
+
+def WriteWav(path, samples, rate=SampleRate):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+
+
+class Spotter:
+    """Streaming keyword spotter: MFCC frames of the incoming audio matched against recordings of the wake word.
+
+    Matching only runs while there is speech (frames GateDB over the noise floor) and for one
+    word-length after it, so silence costs little more than the FFTs. The time between matches
+    grows when the spotter's CPU time per second of audio goes over the budget.
+    """
+
+    def __init__(self, templates, threshold=None, budget=WakeCPUBudget):
+        self.templates = [Template(t) for t in templates]
+        self.threshold = threshold or self.Calibrate()
+        self.budget = budget
+        self.span = max(len(t) for t in self.templates)       # Frames after speech during which a match can still end
+        self.history = np.zeros((int(self.span * 1.6), Coefficients), np.float32)
+        self.mels = self.energies = None                      # Last 3 s, for the noise estimates
+        self.carry = np.zeros(0, np.float32)
+        self.frame = 0
+        self.last_speech = -10 ** 9
+        self.last_match = -10 ** 9
+        self.quiet_until = 0
+        self.stride = BaseStride
+        self.cpu = self.audio = 0.0
+        self.matches = self.fired = 0
+        self._window_cpu = self._window_audio = 0.0
+        self.score = np.inf
+
+    def Calibrate(self):
+        """Threshold from how far apart the recordings are from each other."""
+        if len(self.templates) < 2:
+            raise ValueError("At least two recordings of the wake word are needed to calibrate the threshold")
+        nearest = [min(Distance(t, o) for j, o in enumerate(self.templates) if j != i) for i, t in enumerate(self.templates)]
+        return Margin * float(np.mean(nearest))
+
+    def Reset(self):
+        self.history[:] = 0
+        self.carry = np.zeros(0, np.float32)
+        self.last_speech = -10 ** 9
+
+    def Feed(self, chunk):
+        """Add int16 or float samples; True when the wake word has just been said."""
+        start = thread_time()
+        chunk = np.asarray(chunk)
+        chunk = chunk / np.float32(32768.0) if chunk.dtype == np.int16 else chunk.astype(np.float32)
+        samples = np.concatenate([self.carry, chunk])
+        mel, energy = Spectrum(samples)
+        count = len(energy)
+        self.carry = samples[count * FrameHop:]
+        fired = False
+        if count:
+            if self.mels is None:
+                self.mels, self.energies = np.repeat(mel[:1], NoiseFrames, axis=0), np.repeat(energy[:1], NoiseFrames)
+            self.mels = np.concatenate([self.mels, mel])[-NoiseFrames:]
+            self.energies = np.concatenate([self.energies, energy])[-NoiseFrames:]
+            mfcc = Cepstra(mel, np.percentile(self.mels, 10, axis=0))
+            self.history = np.concatenate([self.history, mfcc])[-len(self.history):]
+            floor = np.percentile(self.energies, 10)
+            speech = np.flatnonzero(energy > floor + GateDB)
+            self.frame += count
+            if len(speech):
+                self.last_speech = self.frame - count + speech[-1]
+            if (self.frame - self.last_speech <= self.span and self.frame - self.last_match >= self.stride
+                    and self.frame >= self.quiet_until):
+                self.last_match = self.frame
+                self.matches += 1
+                self.score = min(Distance(t, self.history) for t in self.templates)
+                if self.score < self.threshold:
+                    fired = True
+                    self.fired += 1
+                    self.quiet_until = self.frame + int(Refractory * 100)
+                    self.Reset()
+        self._account(thread_time() - start, len(chunk) / SampleRate)
+        return fired
+
+    def _account(self, cpu, seconds):
+        self.cpu += cpu
+        self.audio += seconds
+        self._window_cpu += cpu
+        self._window_audio += seconds
+        if self._window_audio >= 1.0:
+            load = self._window_cpu / self._window_audio
+            if load > self.budget:
+                self.stride = min(MaxStride, self.stride * 2)
+            elif load < self.budget / 3 and self.stride > BaseStride:
+                self.stride = max(BaseStride, self.stride // 2)
+            self._window_cpu = self._window_audio = 0.0
+
+    def AsDict(self):
+        return {"templates": len(self.templates), "threshold": self.threshold, "audio_s": self.audio,
+                "cpu_load": self.cpu / self.audio if self.audio else 0.0, "budget": self.budget,
+                "stride": self.stride, "matches": self.matches, "fired": self.fired}
+
+
+def LoadTemplates(path=TemplatesPath):
+    return [ReadWav(p) for p in sorted(glob.glob(os.path.join(path, "*.wav")))]
+
+
+def Load(path=TemplatesPath):
+    """A Spotter for the user's recordings, or None until the wake word has been enrolled."""
+    templates = LoadTemplates(path)
+    if len(templates) < 2:
+        return None
+    return Spotter(templates, threshold=WakeThreshold or None)
+
+
+def Microphone(chunk=1600):
+    """int16 chunks (100 ms) from the default input device."""
+    import pyaudio  # Only needed for live listening; fixtures and tests read WAV files
+
+    audio = pyaudio.PyAudio()
+    stream = audio.open(format=pyaudio.paInt16, channels=1, rate=SampleRate, input=True, frames_per_buffer=chunk)
+    try:
+        while True:
+            yield np.frombuffer(stream.read(chunk, exception_on_overflow=False), dtype=np.int16)
+    finally:
+        stream.stop_stream()
+        stream.close()
+        audio.terminate()
+
+
+def Listen(spotter, source=None):
+    """Block until the wake word is heard. The microphone is released before returning, so the
+    speech recognizer can take it; cancelling the current token stops listening."""
+    source = source if source is not None else Microphone()
+    try:
+        for chunk in source:
+            Cancellation.Check()
+            if spotter.Feed(chunk):
+                return True
+        return False
+    finally:
+        if hasattr(source, "close"):
+            source.close()
+
+
+def Enroll(count=4, seconds=2.0, path=TemplatesPath):
+    """Record the wake word `count` times from the microphone into Data/WakeWord."""
+    os.makedirs(path, exist_ok=True)
+    for i in range(count):
+        input(f"Press Enter and say the wake word ({i + 1}/{count})...")
+        chunks, microphone = [], Microphone()
+        for chunk in microphone:
+            chunks.append(chunk)
+            if len(chunks) * len(chunk) >= seconds * SampleRate:
+                break
+        microphone.close()
+        samples = np.concatenate(chunks) / 32768.0  # Kept with its silence, which gives the background noise
+        WriteWav(os.path.join(path, f"wake{i + 1}.wav"), samples)
+        print(f"  saved, {len(Trim(samples)) / SampleRate:.2f} s of speech")
+    spotter = Load(path)
+    print(f"Threshold {spotter.threshold:.2f}")
+
+
+# --- Benchmark: false accepts, false rejects and CPU on WAV fixtures ---
+# Without --fixtures the WAVs are synthesized: a small formant synthesizer says "jarvis", words
+# that sound like it and other speech, with varied pitch, speed, vocal tract length and noise.
+if __name__ == "__main__":
+    import sys
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Wake-word accuracy and CPU on WAV fixtures")
+    parser.add_argument("--enroll", action="store_true", help="Record the wake word from the microphone")
+    parser.add_argument("--fixtures", help="Directory with templates/, positive/ and negative/ WAV files")
+    parser.add_argument("--positives", type=int, default=100)
+    parser.add_argument("--negatives", type=int, default=200)
+    parser.add_argument("--minutes", type=float, default=10, help="Minutes of background speech and noise for false accepts per hour")
+    args = parser.parse_args()
+    if args.enroll:
+        Enroll()
+        sys.exit(0)
+
+    rng = np.random.default_rng(7)
+
+    # (F1, F2, F3) of vowels and voiced consonants; (low, high) noise band of fricatives
+    Vowels = {"a": (730, 1090, 2440), "i": (270, 2290, 3010), "ih": (390, 1990, 2550), "e": (530, 1840, 2480),
+              "ae": (660, 1720, 2410), "u": (300, 870, 2240), "o": (570, 840, 2410), "er": (490, 1350, 1690),
+              "r": (460, 1200, 1600), "l": (360, 1300, 2700), "w": (300, 700, 2200), "n": (250, 1100, 2500), "m": (250, 900, 2200)}
+    Noises = {"s": (4000, 7500), "z": (4000, 7500), "sh": (1800, 6000), "dj": (1800, 6000), "f": (1200, 7000),
+              "v": (1200, 7000), "th": (1500, 7000), "dh": (1500, 7000), "h": (500, 4000),
+              "t": (3000, 7000), "k": (1500, 4000), "p": (500, 3000), "d": (3000, 7000), "g": (1500, 4000), "b": (500, 3000)}
+    VoicedNoise = {"z", "dj", "v", "dh", "d", "g", "b"}
+    Stops = {"t", "k", "p", "d", "g", "b", "dj"}
+    Durations = {"vowel": 110, "glide": 70, "fricative": 100, "stop": 60}
+
+    Wake = "dj a r v ih s"
+    Confusable = ["s er v ih s", "h a r v ih s t", "t r ae v ih s", "dj a v a", "dj a r z", "n er v ih s", "g a r b ih dj",
+                  "dj a r v ih k", "m a r v ih n", "dj er v ih s", "a r t ih s t", "p a r s ih s", "dj ae z", "k a r v ih ng"]
+    Words = ["h e l o", "w e dh er", "m u z ih k", "o p e n", "th ae ng k s", "t ae m er o", "l i s t", "k a l", "s e n d",
+             "p l e", "s t o p", "n u z", "t ae m", "r e d", "b u k", "f a n", "g u d", "m o r n ih ng", "w a t", "i z"]
+    Words = [w.replace("ng", "n") for w in Words]
+    Confusable = [w.replace("ng", "n") for w in Confusable]
+
+    def Say(phones, f0=120.0, scale=1.0, tempo=1.0, rate=SampleRate):
+        """Formant synthesis of a phone string: harmonics of f0 shaped by formant resonances, noise for fricatives."""
+        segments = []
+        for phone in phones.split():
+            if phone in Vowels:
+                kind = "vowel" if phone not in ("r", "l", "w", "n", "m") else "glide"
+            else:
+                kind = "stop" if phone in Stops else "fricative"
+            length = int(Durations[kind] / tempo * rng.uniform(0.85, 1.15) * rate / 1000)
+            segments.append((phone, kind, length))
+        total = sum(length for _, _, length in segments)
+        t = np.arange(total) / rate
+        pitch = f0 * (1 + 0.08 * np.sin(2 * np.pi * 3 * t) - 0.15 * t / max(t[-1], 1e-3)) * (1 + 0.01 * rng.standard_normal(total).cumsum() / np.sqrt(total))
+        formants = np.zeros((total, 3))
+        voicing = np.zeros(total)
+        noise = np.zeros(total)
+        position = 0
+        last = Vowels["er"]
+        for phone, kind, length in segments:
+            target = Vowels.get(phone, last)
+            formants[position:position + length] = np.array(target) * scale
+            voicing[position:position + length] = 1.0 if phone in Vowels else (0.5 if phone in VoicedNoise else 0.0)
+            if phone in Noises:
+                low, high = Noises[phone]
+                band = np.fft.rfft(rng.standard_normal(length))
+                freqs = np.fft.rfftfreq(length, 1 / rate)
+                band[(freqs < low * scale) | (freqs > high * scale)] = 0
+                burst = np.fft.irfft(band, length)
+                envelope = np.ones(length)
+                if phone in Stops:
+                    envelope[: length // 2] = 0
+                noise[position:position + length] = burst / (np.abs(burst).max() + 1e-9) * envelope * (0.35 if phone != "h" else 0.15)
+            last = target
+            position += length
+        # Smooth formant and voicing tracks so transitions glide like coarticulation
+        kernel = np.hanning(int(0.03 * rate))
+        kernel /= kernel.sum()
+        formants = np.stack([np.convolve(formants[:, i], kernel, mode="same") for i in range(3)], axis=1)
+        voicing = np.convolve(voicing, kernel, mode="same")
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        voiced = np.zeros(total)
+        for k in range(1, int(4000 / f0)):
+            frequency = k * pitch
+            gain = sum(1.0 / (1.0 + ((frequency - formants[:, i]) / (60 + 20 * i)) ** 2) for i in range(3)) / k ** 0.5
+            voiced += gain * np.sin(k * phase)
+        voiced /= np.abs(voiced).max() + 1e-9
+        signal = voiced * voicing * 0.8 + noise
+        fade = np.minimum(1, np.minimum(np.arange(total), np.arange(total)[::-1]) / (0.01 * rate))
+        return (signal * fade).astype(np.float32)
+
+    def Background(seconds, snr_level):
+        """Pink-ish noise at a level relative to speech at amplitude ~0.3."""
+        length = int(round(seconds * SampleRate))
+        white = np.fft.rfft(rng.standard_normal(length))
+        white /= np.sqrt(np.maximum(np.fft.rfftfreq(length, 1 / SampleRate), 20))
+        noise = np.fft.irfft(white, length)
+        return (noise / (noise.std() + 1e-9) * 0.1 * 10 ** (-snr_level / 20)).astype(np.float32)
+
+    User = {"f0": 125.0, "scale": 1.0, "tempo": 1.0}
+
+    def UserSays(phones, spread=1.0):
+        return Say(phones, f0=User["f0"] * rng.uniform(1 - 0.12 * spread, 1 + 0.12 * spread),
+                   scale=User["scale"] * rng.uniform(1 - 0.04 * spread, 1 + 0.04 * spread),
+                   tempo=User["tempo"] * rng.uniform(1 - 0.2 * spread, 1 + 0.2 * spread)) * rng.uniform(0.3, 1.0)
+
+    def Sentence(parts, snr_level):
+        pieces = [np.zeros(int(0.4 * SampleRate), np.float32)]
+        for part in parts:
+            pieces += [part, np.zeros(int(rng.uniform(0.05, 0.3) * SampleRate), np.float32)]
+        pieces.append(np.zeros(int(0.6 * SampleRate), np.float32))
+        speech = np.concatenate(pieces)
+        return speech + Background(len(speech) / SampleRate, snr_level)
+
+    def RandomWords(count, say):
+        return [say(Words[rng.integers(len(Words))]) for _ in range(count)]
+
+    directory = args.fixtures
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="jarvis-wake-")
+        for sub in ("templates", "positive", "negative"):
+            os.makedirs(os.path.join(directory, sub))
+        for i in range(4):
+            WriteWav(os.path.join(directory, "templates", f"wake{i + 1}.wav"), Sentence([UserSays(Wake, spread=0.5)], 25))
+        for i in range(args.positives):
+            before = RandomWords(rng.integers(0, 2), UserSays)
+            after = RandomWords(rng.integers(0, 4), UserSays)
+            WriteWav(os.path.join(directory, "positive", f"p{i:03d}.wav"),
+                     Sentence(before + [UserSays(Wake)] + after, rng.uniform(5, 30)))
+        for i in range(args.negatives):
+            other = lambda phones: Say(phones, f0=rng.uniform(85, 260), scale=rng.uniform(0.88, 1.18), tempo=rng.uniform(0.8, 1.3))
+            say = UserSays if i % 2 == 0 else other  # Half by the user, half by other speakers
+            words = RandomWords(rng.integers(0, 3), say) + [say(Confusable[i % len(Confusable)])] + RandomWords(rng.integers(0, 3), say)
+            WriteWav(os.path.join(directory, "negative", f"n{i:03d}.wav"), Sentence(words, rng.uniform(5, 30)))
+        # Continuous background: conversation without the wake word, and stretches of fan noise
+        stream = []
+        while sum(len(s) for s in stream) < args.minutes * 60 * SampleRate:
+            if rng.random() < 0.7:
+                stream.append(Sentence(RandomWords(rng.integers(3, 10), UserSays if rng.random() < 0.5 else
+                                                   (lambda p: Say(p, f0=rng.uniform(85, 260), scale=rng.uniform(0.88, 1.18)))),
+                                       rng.uniform(5, 30)))
+            else:
+                stream.append(Background(rng.uniform(5, 20), rng.uniform(0, 20)) * 3)
+        WriteWav(os.path.join(directory, "negative", "background.wav"), np.concatenate(stream))
+        print(f"Synthesized fixtures in {directory}")
+
+    templates = [ReadWav(p) for p in sorted(glob.glob(os.path.join(directory, "templates", "*.wav")))]
+    calibrated = Spotter(templates).threshold
+
+    def Run(path, threshold):
+        """Stream a WAV through a fresh spotter in 100 ms chunks; number of times it fired."""
+        spotter = Spotter(templates, threshold=threshold)
+        samples = (ReadWav(path) * 32768).astype(np.int16)
+        fired = sum(spotter.Feed(samples[i:i + 1600]) for i in range(0, len(samples), 1600))
+        return fired, spotter
+
+    positives = sorted(glob.glob(os.path.join(directory, "positive", "*.wav")))
+    negatives = sorted(glob.glob(os.path.join(directory, "negative", "*.wav")))
+    print(f"{len(templates)} templates, calibrated threshold {calibrated:.2f}")
+    print(f"{'threshold':>10} {'false reject':>13} {'false accept':>13} {'FA per hour':>12} {'CPU load':>9}")
+    for factor in (0.8, 0.9, 1.0, 1.1, 1.2):
+        threshold = calibrated * factor
+        missed = sum(Run(p, threshold)[0] == 0 for p in positives)
+        accepted, accepts, cpu, audio, hours = 0, 0, 0.0, 0.0, 0.0
+        for path in negatives:
+            fired, spotter = Run(path, threshold)
+            accepted += fired > 0
+            accepts += fired
+            cpu += spotter.cpu
+            audio += spotter.audio
+            hours += spotter.audio / 3600
+        print(f"{threshold:>10.2f} {missed / len(positives) * 100:>12.1f}% {accepted / len(negatives) * 100:>12.1f}% "
+              f"{accepts / hours:>12.1f} {cpu / audio * 100:>8.2f}%")
+
+    # CPU with and without the speech gate, over the background recording
+    background = [p for p in negatives if os.path.basename(p) == "background.wav"]
+    if background:
+        samples = (ReadWav(background[0]) * 32768).astype(np.int16)
+        gate_db = GateDB
+        for label, gate in (("gated", gate_db), ("ungated", -1000)):
+            GateDB = gate
+            spotter = Spotter(templates, threshold=calibrated, budget=1.0)
+            for i in range(0, len(samples), 1600):
+                spotter.Feed(samples[i:i + 1600])
+            print(f"{label:<8} {spotter.audio / 60:.1f} min of conversation and noise: CPU load {spotter.cpu / spotter.audio * 100:.2f}% "
+                  f"of a core, {spotter.matches} matches, fired {spotter.fired} times")
+        GateDB = gate_db
+        spotter = Spotter(templates, threshold=calibrated)
+        for i in range(0, len(samples), 1600):
+            spotter.Feed(samples[i:i + 1600])
+        print(f"budget {WakeCPUBudget * 100:.0f}%: CPU load {spotter.cpu / spotter.audio * 100:.2f}%, final stride {spotter.stride} frames")
+    sys.exit(0)
@@ -0,0 +1,305 @@
+import re
+import math
+import threading
+from time import perf_counter, monotonic
+from urllib.parse import urlparse
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from bs4 import BeautifulSoup
+from dotenv import dotenv_values
+import Tracing
+import Cancellation
+from Embeddings import Tokenize
+
+# Load environment variables from the .env file
+env_vars = dotenv_values(".env")
+
+RealtimePages = int(env_vars.get("RealtimePages") or 3)           # Top search results whose pages are read (0 = snippets only)
+PageDeadline = float(env_vars.get("PageDeadline") or 2.5)         # Seconds for all pages of one search; late ones are dropped
+PagesPerHost = int(env_vars.get("PagesPerHost") or 2)             # Connections to one host at a time
+PageBudget = int(env_vars.get("PageBudget") or 3000)              # Characters of page text added to the prompt
+PageCacheTTL = float(env_vars.get("PageCacheTTL") or 900)         # Seconds an extracted page is reused
+PageWorkers = 8
+MaxPageBytes = 2_000_000
+MinParagraph = 40                                                 # Shorter blocks are menus, captions and buttons
+
+# lxml is much faster when installed; html.parser always works
+try:
+    import lxml  # noqa: F401
+    Parser = "lxml"
+except ImportError:
+    Parser = "html.parser"
+
+# Google answer-box classes: when a page has them, their text is the answer itself
+AnswerBoxClasses = ["zCubwf", "hgKElc", "LTKOO sY7ric", "Z0LcW", "gsrt vk_bk FzwWb YwPhnf", "pclqee", "tw-Data-text tw-text-small tw-ta", "IZ6rdc", "O5uR6d LTKOO", "vlzY6ch", "webanswers-webanswers_table__webanswers-table", "dDoNo ikb4Bb gsrt", "sXLaOe", "LWkfKe", "VQF4g", "QV3WPe", "kno-rdesc", "SPZz6b"]
+
+# Browser user agent; many sites refuse the default python-requests one
+UserAgent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.75 Safari/537.36'
+
+Boilerplate = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe", "button"]
+
+
+def Extract(html):
+    """(title, paragraphs) of a page's main content: answer boxes first, then the article text."""
+    soup = BeautifulSoup(html, Parser)
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    paragraphs = []
+    for name in AnswerBoxClasses:
+        for element in soup.find_all(class_=name):
+            text = element.get_text(" ", strip=True)
+            if text:
+                paragraphs.append(text)
+    for element in soup(Boilerplate):
+        element.decompose()
+    # The main element if the page marks one, else the block holding the most paragraph text
+    root = soup.find("article") or soup.find("main") or soup.find(attrs={"role": "main"})
+    if root is None:
+        blocks = Counter()
+        for p in soup.find_all("p"):
+            if p.parent is not None:
+                blocks[id(p.parent)] += len(p.get_text(strip=True))
+        parents = {id(p.parent): p.parent for p in soup.find_all("p") if p.parent is not None}
+        root = parents[blocks.most_common(1)[0][0]] if blocks else (soup.body or soup)
+    for element in root.find_all(["p", "li", "h2", "h3", "td"]):
+        text = re.sub(r"\s+", " ", element.get_text(" ", strip=True))
+        if len(text) >= MinParagraph and text not in paragraphs:
+            paragraphs.append(text)
+    return title, paragraphs
+
+
+def Rank(query, passages, budget=PageBudget):
+    """The passages most relevant to the query (BM25 over the passages themselves) that fit in `budget` characters.
+
+    `passages` are (source, text) pairs; the result keeps their score order.
+    """
+    terms = set(Tokenize(query))
+    if not passages or not terms:
+        return []
+    documents = [Counter(Tokenize(text)) for _, text in passages]
+    lengths = [sum(d.values()) or 1 for d in documents]
+    average = sum(lengths) / len(lengths)
+    frequency = {t: sum(1 for d in documents if t in d) for t in terms}
+    scores = []
+    for index, (document, length) in enumerate(zip(documents, lengths)):
+        score = 0.0
+        for term in terms:
+            tf = document.get(term, 0)
+            if tf:
+                idf = math.log(1 + (len(documents) - frequency[term] + 0.5) / (frequency[term] + 0.5))
+                score += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / average))
+        scores.append((score, index))
+    chosen, used = [], 0
+    for score, index in sorted(scores, key=lambda s: (-s[0], s[1])):
+        if score <= 0:
+            break
+        source, text = passages[index]
+        size = len(source) + len(text) + 3  # As formatted by Context(): "(source) text\n"
+        if used + size > budget:
+            continue  # A shorter passage further down may still fit
+        chosen.append((source, text))
+        used += size
+    return chosen
+
+
+class PageCache:
+    """Extracted pages by URL, for `ttl` seconds; least recently used ones go past `capacity`."""
+
+    def __init__(self, capacity=256, ttl=PageCacheTTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def Get(self, url):
+        with self._lock:
+            entry = self.pages.get(url)
+            if entry is None or entry[0] < monotonic():
+                self.pages.pop(url, None)
+                self.misses += 1
+                return None
+            self.pages.move_to_end(url)
+            self.hits += 1
+            return entry[1]
+
+    def Put(self, url, page):
+        with self._lock:
+            self.pages[url] = (monotonic() + self.ttl, page)
+            self.pages.move_to_end(url)
+            while len(self.pages) > self.capacity:
+                self.pages.popitem(last=False)
+
+
+class PageFetcher:
+    """Fetches result pages at once on its own threads, at most `per_host` per host, within a hard deadline.
+
+    Every fetch has its own cancel token (also cancelled with the turn), so pages still loading at
+    the deadline are dropped and their connections closed; the answer uses whatever arrived.
+    """
+
+    def __init__(self, workers=PageWorkers, per_host=PagesPerHost, deadline=PageDeadline, cache=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.per_host = per_host
+        self.deadline = deadline
+        self.cache = cache if cache is not None else PageCache()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="PageFetch")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = UserAgent
+        self.hosts = {}
+        self.fetched = 0
+        self.late = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self.hosts[host]
+
+    def _fetch(self, url, token, until):
+        with Cancellation.Scope(token), Tracing.Span("page", url=url) as span:
+            host = self._host(url)
+            if not host.acquire(timeout=max(0.0, until - monotonic())):
+                raise TimeoutError("host busy until the deadline")
+            try:
+                response = Cancellation.Request("GET", url, session=self.session, stream=True,
+                                                timeout=(1.0, max(0.1, until - monotonic())))
+                with Cancellation.Registered(lambda: Cancellation.AbortResponse(response)):
+                    if response.status_code != 200 or "html" not in response.headers.get("Content-Type", "html"):
+                        raise ValueError(f"{response.status_code} {response.headers.get('Content-Type')}")
+                    body = bytearray()
+                    for chunk in response.iter_content(65536):
+                        body += chunk
+                        if len(body) >= MaxPageBytes:
+                            break
+                    Cancellation.Check()
+                response.close()
+            finally:
+                host.release()
+            start = perf_counter()
+            page = Extract(body.decode(response.encoding or "utf-8", errors="replace"))
+            span.Set(bytes=len(body), paragraphs=len(page[1]), extract_ms=round((perf_counter() - start) * 1000, 1))
+            self.cache.Put(url, page)
+            return page
+
+    def Fetch(self, urls, deadline=None):
+        """{url: (title, paragraphs)} for the pages that were cached or arrived before the deadline."""
+        until = monotonic() + (self.deadline if deadline is None else deadline)
+        pages, futures = {}, {}
+        parent = Cancellation.Current()
+        for url in dict.fromkeys(urls):
+            cached = self.cache.Get(url)
+            if cached is not None:
+                pages[url] = cached
+                continue
+            token = Cancellation.CancelToken("page")
+            unlink = parent.OnCancel(lambda token=token: token.Cancel(parent.reason)) if parent is not None else (lambda: None)
+            future = self.executor.submit(Tracing.Wrap(self._fetch), url, token, until)
+            future.add_done_callback(lambda _, unlink=unlink: unlink())
+            futures[future] = (url, token)
+        if futures:
+            done, late = wait(futures, timeout=max(0.0, until - monotonic()))
+            Cancellation.Check()
+            for future in late:
+                future.cancel()
+                futures[future][1].Cancel("page deadline")
+            failed = 0
+            for future in done:
+                try:
+                    pages[futures[future][0]] = future.result()
+                except Exception:
+                    failed += 1
+            with self._lock:
+                self.fetched += len(done) - failed
+                self.failed += failed
+                self.late += len(late)
+        return pages
+
+    def AsDict(self):
+        with self._lock:
+            return {"fetched": self.fetched, "late": self.late, "failed": self.failed,
+                    "cache_hits": self.cache.hits, "cache_misses": self.cache.misses}
+
+
+# Shared fetcher used by RealtimeSearchEngine
+Fetcher = PageFetcher()
+
+
+@Tracing.Traced("pages")
+def Context(query, results, pages=RealtimePages, budget=PageBudget):
+    """Prompt text with the passages of the top `pages` search results most relevant to the query ("" if none)."""
+    links = [r.get("link") for r in results[:pages] if r.get("link")]
+    if not links:
+        return ""
+    fetched = Fetcher.Fetch(links)
+    passages = []
+    for url in links:
+        if url in fetched:
+            title, paragraphs = fetched[url]
+            passages += [(title or urlparse(url).netloc, text) for text in paragraphs]
+    chosen = Rank(query, passages, budget)
+    Tracing.Current().Set(pages=len(fetched), passages=len(chosen), chars=sum(len(t) for _, t in chosen))
+    if not chosen:
+        return ""
+    return "Extracts from the top pages:\n[start]\n" + "\n".join(f"({source}) {text}" for source, text in chosen) + "\n[end]"
+
+
+# --- Benchmark: pages fetched one by one vs concurrently with a deadline, against local fixture sites ---
+if __name__ == "__main__":
+    import sys
+    import argparse
+    import requests
+    from StandIns import StandInServer, Behaviour
+
+    parser = argparse.ArgumentParser(description="Fetch and extract search result pages from local fixture sites")
+    parser.add_argument("-n", "--queries", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--deadline", type=float, default=PageDeadline)
+    args = parser.parse_args()
+
+    # Three sites: most pages in ~150 ms, one in ten stuck for ~3 s
+    sites = [StandInServer(Behaviour(ttft=0.15, jitter=0.5, slow_rate=0.1, slow_factor=20, seed=i)).Start() for i in range(3)]
+    queries = [f"history of topic{i} rivers" for i in range(args.queries)]
+
+    def links(query, i):
+        return [{"link": f"{sites[(i + j) % len(sites)].url}/page/{i * 10 + j}?q={query.replace(' ', '+')}"}
+                for j in range(args.pages)]
+
+    def report(label, latencies, chars):
+        latencies.sort()
+        print(f"{label:<26} p50 {latencies[len(latencies) // 2] * 1000:6.0f}  p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.0f}"
+              f"  max {latencies[-1] * 1000:6.0f} ms   prompt text {sum(chars) / len(chars):6.0f} chars")
+
+    latencies, chars = [], []
+    for i, query in enumerate(queries):
+        start = perf_counter()
+        text = ""
+        for result in links(query, i):
+            text += "\n".join(Extract(requests.get(result["link"], timeout=30).text)[1])
+        latencies.append(perf_counter() - start)
+        chars.append(len(text))
+    report("one by one, whole pages", latencies, chars)
+
+    Fetcher = PageFetcher(deadline=args.deadline)
+    for label in ("concurrent + deadline", "again, from the cache"):
+        latencies, chars = [], []
+        for i, query in enumerate(queries):
+            start = perf_counter()
+            text = Context(query, links(query, i), pages=args.pages)
+            latencies.append(perf_counter() - start)
+            chars.append(len(text))
+        report(label, latencies, chars)
+    stats = Fetcher.AsDict()
+    print(f"\npages fetched {stats['fetched']}, dropped at the deadline {stats['late']}, failed {stats['failed']}, "
+          f"cache hits {stats['cache_hits']}; extraction with {Parser}")
+    print("\n" + Context(queries[0], links(queries[0], 0), pages=args.pages)[:600])
+    for site in sites:
+        site.Stop()
+    sys.exit(0)
@@ -4,6 +4,7 @@ import threading
 import time
 import asyncio
 from queue import Queue, Empty
+from collections import deque
 from datetime import datetime
 
 try:
@@ -19,6 +20,16 @@ BACKEND = os.path.join(ROOT, "Backend")
 if BACKEND not in sys.path:
     sys.path.insert(0, BACKEND)
 
+# Thumbnail pipeline, tracing, cancellation and the backend loop don't import any SDKs
+import Thumbnails
+import Tracing
+import Cancellation
+import BackendLoop
+import Reminders
+import WakeWord
+import Memory
+import Profiler
+
 # Import backend modules with graceful fallbacks
 try:
     import Model
@@ -41,6 +52,209 @@ except Exception as e:
     Model = Chatbot = RealtimeSearchEngine = ImageGeneration = Automation = SpeechToText = TextToSpeech = _Dummy()
 
 
+# Router decisions handled by Automation.Automation
+AUTOMATION_PREFIXES = ("open ", "close ", "content ", "google search ", "youtube search ", "system ")
+
+
+class ImageGallery:
+    """Inline, lazily loaded thumbnail grid for generated images.
+
+    Thumbnails are decoded in a process pool and cached on disk; the Tk thread
+    only creates PhotoImages for rows near the viewport and drains finished
+    thumbnails under a per-frame time budget.
+    """
+
+    FRAME_BUDGET = 0.016   # Target for one scroll/render pass (60 fps)
+    DRAIN_BUDGET = 0.008   # Time per tick spent turning cached PNGs into PhotoImages
+    OVERSCAN_ROWS = 1      # Rows rendered above/below the viewport
+    KEEP_ROWS = 4          # Rows kept alive beyond the viewport before images are freed
+
+    def __init__(self, app, parent):
+        self.app = app
+        self.root = app.root
+        colors = app.colors
+
+        self.cell = Thumbnails.ThumbSize + 12
+        self.pipeline = Thumbnails.ThumbnailPipeline()
+        self.images = []
+        self.photos = {}      # index -> PhotoImage (only for rows near the viewport)
+        self.items = {}       # index -> canvas item ids
+        self.requested = set()
+        self.ready = Queue()  # (generation, index, thumb path) from pool callback threads
+        self.generation = 0   # Bumped on refresh so stale callbacks are ignored
+        self.frame_times = deque(maxlen=240)
+        self._render_pending = False
+        self.visible = False
+
+        self.frame = tk.Frame(parent, bg=colors['bg_sidebar'], width=2 * self.cell + 30)
+        self.frame.pack_propagate(False)
+
+        header = tk.Frame(self.frame, bg=colors['bg_sidebar'])
+        header.pack(fill=tk.X)
+        self.title_var = tk.StringVar(value="Gallery")
+        tk.Label(header, textvariable=self.title_var, bg=colors['bg_sidebar'], fg=colors['text_primary'],
+                 font=('Segoe UI', 11, 'bold')).pack(side=tk.LEFT, padx=10, pady=8)
+        tk.Button(header, text="⟳", bg=colors['bg_sidebar'], fg=colors['text_primary'], relief=tk.FLAT, bd=0,
+                  command=self.refresh).pack(side=tk.RIGHT, padx=10)
+
+        self.canvas = tk.Canvas(self.frame, bg=colors['bg_sidebar'], highlightthickness=0, bd=0,
+                                yscrollincrement=self.cell // 4)
+        scrollbar = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.canvas.configure(yscrollcommand=lambda first, last: (scrollbar.set(first, last), self._schedule_render()))
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self._layout())
+        self.canvas.bind("<MouseWheel>", lambda e: self._scroll(-1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self._scroll(-1))
+        self.canvas.bind("<Button-5>", lambda e: self._scroll(1))
+
+    # ----- visibility -----
+
+    def toggle(self, before):
+        if self.visible:
+            self.frame.pack_forget()
+            self.visible = False
+        else:
+            self.frame.pack(side=tk.RIGHT, fill=tk.Y, before=before)
+            self.visible = True
+            self.refresh()
+            self._drain()
+
+    def add_image(self, path):
+        """Called after a new image is generated; shows it at the top of the grid."""
+        if self.visible:
+            self.refresh()
+
+    def refresh(self):
+        self.generation += 1
+        self.images = Thumbnails.ListImages()
+        for path in self.requested:
+            self.pipeline.Cancel(path)
+        self.requested.clear()
+        self.photos.clear()
+        self.items.clear()
+        self.canvas.delete("all")
+        self.canvas.yview_moveto(0)
+        self._layout()
+
+    # ----- geometry -----
+
+    def _columns(self):
+        return max(1, self.canvas.winfo_width() // self.cell)
+
+    def _layout(self):
+        rows = -(-len(self.images) // self._columns())
+        self.canvas.configure(scrollregion=(0, 0, self._columns() * self.cell, rows * self.cell))
+        # Column count may have changed, so positions are rebuilt from scratch
+        self.canvas.delete("all")
+        self.items.clear()
+        self._schedule_render()
+
+    def _scroll(self, units):
+        self.canvas.yview_scroll(units, "units")
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+
+    def _schedule_render(self):
+        if not self._render_pending:
+            self._render_pending = True
+            self.root.after_idle(self._render_visible)
+
+    def _row_range(self, extra_rows):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, int(top // self.cell) - extra_rows)
+        last = int(bottom // self.cell) + extra_rows
+        return first, last
+
+    # ----- rendering -----
+
+    def _render_visible(self):
+        self._render_pending = False
+        if not self.visible or not self.images:
+            self._update_title()
+            return
+
+        start = time.perf_counter()
+        columns = self._columns()
+        first, last = self._row_range(self.OVERSCAN_ROWS)
+        keep_first, keep_last = self._row_range(self.KEEP_ROWS)
+
+        visible = range(first * columns, min(len(self.images), (last + 1) * columns))
+        for index in visible:
+            if index not in self.items:
+                self._place(index, columns)
+
+        # Free everything that has scrolled well out of view
+        for index in [i for i in self.items if not keep_first * columns <= i < (keep_last + 1) * columns]:
+            for item in self.items.pop(index):
+                self.canvas.delete(item)
+            self.photos.pop(index, None)
+            path = self.images[index]
+            if path in self.requested:
+                self.requested.discard(path)
+                self.pipeline.Cancel(path)
+
+        self.frame_times.append(time.perf_counter() - start)
+        self._update_title()
+
+    def _place(self, index, columns):
+        x = (index % columns) * self.cell + 6
+        y = (index // columns) * self.cell + 6
+        size = Thumbnails.ThumbSize
+        placeholder = self.canvas.create_rectangle(x, y, x + size, y + size, outline=self.app.colors['border'])
+        self.items[index] = [placeholder]
+
+        photo = self.photos.get(index)
+        if photo is not None:
+            self._show(index, photo)
+            return
+
+        path = self.images[index]
+        if path not in self.requested:
+            self.requested.add(path)
+            generation = self.generation
+            self.pipeline.Request(path, lambda p, thumb: self.ready.put((generation, index, thumb)))
+
+    def _show(self, index, photo):
+        columns = self._columns()
+        x = (index % columns) * self.cell + 6 + Thumbnails.ThumbSize // 2
+        y = (index // columns) * self.cell + 6 + Thumbnails.ThumbSize // 2
+        item = self.canvas.create_image(x, y, image=photo)
+        path = self.images[index]
+        self.canvas.tag_bind(item, "<Button-1>", lambda e: ImageGeneration.open_image_file(path))
+        self.items.setdefault(index, []).append(item)
+
+    def _drain(self):
+        """Turn finished thumbnails into PhotoImages, bounded so scrolling stays smooth."""
+        if not self.visible:
+            return
+        start = time.perf_counter()
+        try:
+            while time.perf_counter() - start < self.DRAIN_BUDGET:
+                generation, index, thumb = self.ready.get_nowait()
+                if generation != self.generation or thumb is None or index not in self.items:
+                    continue
+                self.requested.discard(self.images[index])
+                photo = tk.PhotoImage(file=thumb)  # Small cached PNG, Tk decodes it natively
+                self.photos[index] = photo
+                self._show(index, photo)
+        except Empty:
+            pass
+        self.root.after(16, self._drain)
+
+    def _update_title(self):
+        if self.frame_times:
+            ordered = sorted(self.frame_times)
+            p95 = ordered[int(len(ordered) * 0.95) - 1 if len(ordered) > 1 else 0]
+            over = sum(1 for t in ordered if t > self.FRAME_BUDGET)
+            self.title_var.set(f"Gallery ({len(self.images)}) · p95 {p95 * 1000:.1f} ms" + (f" · {over} slow" if over else ""))
+        else:
+            self.title_var.set(f"Gallery ({len(self.images)})")
+
+
 class JarvisAssistantUI:
     """ChatGPT-Style AI Assistant UI"""
 
@@ -88,6 +302,19 @@ class JarvisAssistantUI:
 
         self.voice_listening = False
         self.tts_enabled = True
+        self.wake_token = None
+
+        # Only one turn runs at a time: a new query (or speech while Jarvis talks) cancels the current one.
+        # Turns and speech are coroutines on the shared backend loop, so these are asyncio locks.
+        self.turn_token = None
+        self._turn_guard = threading.Lock()
+        self._turn_lock = asyncio.Lock()
+        self._speak_lock = asyncio.Lock()
+        self.root.bind("<Escape>", lambda e: self.cancel_turn("stopped"))
+        if self.wake_var.get():
+            self.on_wake_toggle()
+        if self.profile_var.get():
+            self.on_profile_toggle()
         
         # Add window icon if available
         try:
@@ -136,6 +363,20 @@ class JarvisAssistantUI:
                                 anchor='w',
                                 command=self.clear_chat)
         new_chat_btn.pack(fill=tk.X)
+
+        # Gallery toggle
+        gallery_btn = tk.Button(sidebar,
+                                text="🖼  Gallery",
+                                bg=self.colors['bg_sidebar'],
+                                fg=self.colors['text_primary'],
+                                font=('Segoe UI', 13, 'bold'),
+                                relief=tk.FLAT,
+                                bd=0,
+                                padx=20,
+                                pady=10,
+                                anchor='w',
+                                command=self.toggle_gallery)
+        gallery_btn.pack(fill=tk.X)
         
         # Separator
         separator = tk.Frame(sidebar, height=1, bg=self.colors['border'])
@@ -200,10 +441,42 @@ class JarvisAssistantUI:
                                   font=('Segoe UI', 10))
         tts_check.pack(pady=(10, 0))
 
+        # Wake word toggle: a light keyword spotter listens, speech recognition starts when it hears "Jarvis"
+        self.wake_var = tk.BooleanVar(value=WakeWord.WakeWordMode)
+        wake_check = tk.Checkbutton(bottom_frame,
+                                   text='Wake Word ("Jarvis")',
+                                   variable=self.wake_var,
+                                   command=self.on_wake_toggle,
+                                   bg=self.colors['bg_sidebar'],
+                                   fg=self.colors['text_primary'],
+                                   selectcolor=self.colors['accent'],
+                                   activebackground=self.colors['bg_sidebar'],
+                                   activeforeground=self.colors['text_primary'],
+                                   font=('Segoe UI', 10))
+        wake_check.pack(pady=(4, 0))
+
+        # Profiler toggle: samples every thread's stack; stopping writes a flamegraph-ready file to Data/Profiles
+        self.profile_var = tk.BooleanVar(value=Profiler.ProfilerMode)
+        profile_check = tk.Checkbutton(bottom_frame,
+                                      text="Sampling Profiler",
+                                      variable=self.profile_var,
+                                      command=self.on_profile_toggle,
+                                      bg=self.colors['bg_sidebar'],
+                                      fg=self.colors['text_primary'],
+                                      selectcolor=self.colors['accent'],
+                                      activebackground=self.colors['bg_sidebar'],
+                                      activeforeground=self.colors['text_primary'],
+                                      font=('Segoe UI', 10))
+        profile_check.pack(pady=(4, 0))
+
     def create_main_area(self):
         """Create main chat area like ChatGPT"""
         main_container = tk.Frame(self.root, bg=self.colors['bg_dark'])
         main_container.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.main_container = main_container
+
+        # Image gallery (hidden until toggled)
+        self.gallery = ImageGallery(self, self.root)
         
         # Top bar
         top_bar = tk.Frame(main_container, bg=self.colors['bg_dark'], height=60)
@@ -318,6 +591,28 @@ class JarvisAssistantUI:
                             bg=self.colors['bg_dark'])
         log_label.pack(side=tk.LEFT, pady=(5, 0))
 
+        # Latency breakdown of the last few turns
+        self.trace_var = tk.StringVar(value="")
+        trace_label = tk.Label(input_container,
+                               textvariable=self.trace_var,
+                               font=('Consolas', 9),
+                               fg=self.colors['text_muted'],
+                               bg=self.colors['bg_dark'],
+                               justify=tk.LEFT,
+                               anchor='e')
+        trace_label.pack(side=tk.RIGHT, pady=(5, 0))
+        Tracing.Listeners.append(lambda trace: self.queue.put((self._update_trace_panel, ())) if trace.name == "turn" else None)
+
+        # Live process memory and the modules holding the most objects
+        self.memory_var = tk.StringVar(value="")
+        memory_label = tk.Label(input_container,
+                                textvariable=self.memory_var,
+                                font=('Consolas', 9),
+                                fg=self.colors['text_muted'],
+                                bg=self.colors['bg_dark'])
+        memory_label.pack(side=tk.LEFT, padx=(15, 0), pady=(5, 0))
+        self.root.after(1000, self._update_memory_panel)
+
     def load_chat(self, chat_id):
         """Load chat history (placeholder)"""
         self.append_chat("System", f"Loading chat {chat_id}...")
@@ -335,6 +630,9 @@ class JarvisAssistantUI:
         else:
             self.status_var.set("● Ready")
 
+    def toggle_gallery(self):
+        self.gallery.toggle(before=self.main_container)
+
     # ========== Chat Methods ==========
     
     def _start_queue_poller(self):
@@ -352,8 +650,11 @@ class JarvisAssistantUI:
             self.root.after(100, poll)
         poll()
 
+    CHAT_LINES = 2000
+
     def append_chat(self, who: str, text: str, slow=False):
         timestamp = datetime.now().strftime("%H:%M")
+        render_span = Tracing.Begin("render", who=who, chars=len(text))  # Includes time waiting in the UI queue
         
         # Define colors for different senders
         bg_colors = {
@@ -397,8 +698,14 @@ class JarvisAssistantUI:
                 self.chat.insert(tk.END, text, tag_name)
 
             self.chat.insert(tk.END, "\n\n")
+
+            # Keep only the most recent lines: the full conversation is in the chat log
+            excess = int(self.chat.index("end-1c").split(".")[0]) - self.CHAT_LINES
+            if excess > 0:
+                self.chat.delete("1.0", f"{excess + 1}.0")
             self.chat.configure(state=tk.DISABLED)
             self.chat.see(tk.END)
+            render_span.End()
 
         self.queue.put((insert_all, ()))
 
@@ -428,132 +735,306 @@ class JarvisAssistantUI:
         self.input_var.set("")
         self.append_chat("You", query)
         self.show_progress(True)
-        threading.Thread(target=self._dispatch_query, args=(query,), daemon=True).start()
+        self.submit_query(query)
+
+    def cancel_turn(self, reason="cancelled"):
+        with self._turn_guard:
+            token = self.turn_token
+        if token is not None and token.Cancel(reason):
+            self.set_log(f"Cancelled ({reason})")
+
+    def submit_query(self, query: str):
+        """Cancel the current turn (from the calling thread, so it stops right away) and queue the new one."""
+        token = Cancellation.CancelToken()
+        with self._turn_guard:
+            previous, self.turn_token = self.turn_token, token
+        if previous is not None:
+            previous.Cancel("new query")
+        BackendLoop.Submit(self._dispatch_query(query, token))
+
+    async def _dispatch_query(self, query: str, token):
+        # The cancelled turn unwinds before this one starts, so turns never write ChatLog.json concurrently
+        async with self._turn_lock:
+            if token.cancelled:
+                return
+            # One trace per turn; backend modules add nested spans to it and check the token
+            try:
+                with Cancellation.Scope(token), Tracing.StartTrace("turn", query=query):
+                    await self._run_turn(query)
+            except Cancellation.Cancelled:
+                pass
+            finally:
+                with self._turn_guard:
+                    current = self.turn_token is token
+                if current:
+                    self.show_progress(False)
+                    self.set_status("Ready")
+                    if not token.cancelled:
+                        self.set_log("Ready")
 
-    def _dispatch_query(self, query: str):
+    def _speak_later(self, answer):
+        # Speech runs in the background; the turn's trace stays open until it finishes
+        BackendLoop.Background(Tracing.WrapCoroutine(self._speak(answer)))
+
+    async def _run_turn(self, query: str):
         self.set_log("Processing your request...")
+        started = time.perf_counter()
+        decision, running = [], []
+        previous = None
 
+        # Each task starts as soon as the router has streamed it. Automation tasks run concurrently
+        # (e.g. several content tasks generate together); the others run in decision order.
         try:
-            decision = Model.FirstLayerDMM(query)
-        except Exception as e:
-            decision = [f"general {query}"]
-
-        self.set_log(f"Model output: {decision}")
-        # If multiple tasks returned, handle each
-        for task in decision:
-            task = task.strip()
-            if task.startswith("general "):
-                prompt = task.removeprefix("general ")
-                self.set_status("Thinking...")
-                try:
-                    answer = Chatbot.ChatBot(prompt)
-                except Exception as e:
-                    answer = f"I apologize, but I encountered an error: {e}"
-                self.append_chat("Jarvis", answer, slow=True)
-                if self.tts_var.get():
-                    threading.Thread(target=self._speak, args=(answer,), daemon=True).start()
-
-            elif task.startswith("realtime "):
-                prompt = task.removeprefix("realtime ")
-                self.set_status("Searching...")
-                try:
-                    answer = RealtimeSearchEngine.RealtimeSearchEngine(prompt)
-                except Exception as e:
-                    answer = f"Search error: {e}"
-                self.append_chat("Jarvis", answer, slow=True)
-                if self.tts_var.get():
-                    threading.Thread(target=self._speak, args=(answer,), daemon=True).start()
-
-            elif task.startswith("generate image"):
-                prompt = task.removeprefix("generate image").strip()
-                if not prompt:
-                    prompt = query
-                self.set_status("Generating...")
-                self.append_chat("System", f"Generating image: {prompt}")
-                try:
-                    ImageGeneration.GenerateImages(prompt)
-                    self.append_chat("System", "✓ Image saved in Data folder")
-                except Exception as e:
-                    self.append_chat("System", f"✗ Image generation failed: {e}")
-
-            elif task.startswith("play "):
-                param = task.removeprefix("play ")
-                self.set_status("Playing...")
-                self.append_chat("System", f"Playing: {param}")
-                try:
-                    Automation.PlayYoutube(param)
-                except Exception as e:
-                    self.append_chat("System", f"✗ Play failed: {e}")
-
-            elif task.startswith("open ") or task.startswith("close ") or task.startswith("content ") or task.startswith("google search ") or task.startswith("youtube search ") or task.startswith("system "):
-                self.set_status("Executing...")
-                try:
-                    asyncio.run(Automation.Automation([task]))
-                    self.append_chat("System", f"✓ Executed: {task}")
-                except Exception as e:
-                    self.append_chat("System", f"✗ Automation error: {e}")
-
-            elif task == "exit":
-                self.append_chat("System", "Goodbye!")
-                self.set_status("Exiting...")
-                time.sleep(0.5)
-                self.root.quit()
+            try:
+                async for task in Model.AFirstLayerDMMStream(query):
+                    if not decision:
+                        Tracing.Current().Set(first_task_ms=round((time.perf_counter() - started) * 1000, 1))
+                    decision.append(task)
+                    self.set_log(f"Model output: {decision}")
+                    if task.startswith(AUTOMATION_PREFIXES):
+                        running.append(asyncio.ensure_future(self._run_task(task, query)))
+                    else:
+                        previous = asyncio.ensure_future(self._chain(previous, task, query))
+                        running.append(previous)
+            except Exception as e:
+                if not decision:
+                    decision.append(f"general {query}")
+                    running.append(asyncio.ensure_future(self._run_task(decision[0], query)))
+            await asyncio.gather(*running)
+        finally:
+            for task in running:
+                task.cancel()
 
-            else:
-                self.set_status("Thinking...")
-                try:
-                    answer = Chatbot.ChatBot(task)
-                except Exception as e:
-                    answer = f"Error: {e}"
-                self.append_chat("Jarvis", answer, slow=True)
-                if self.tts_var.get():
-                    threading.Thread(target=self._speak, args=(answer,), daemon=True).start()
-
-        self.show_progress(False)
-        self.set_status("Ready")
-        self.set_log("Ready")
+    async def _chain(self, previous, task: str, query: str):
+        if previous is not None:
+            await previous
+        Cancellation.Check()
+        await self._run_task(task, query)
+
+    async def _run_task(self, task: str, query: str):
+        if task.startswith("general "):
+            prompt = task.removeprefix("general ")
+            self.set_status("Thinking...")
+            try:
+                answer = await Chatbot.AChatBot(prompt)
+            except Exception as e:
+                answer = f"I apologize, but I encountered an error: {e}"
+            self.append_chat("Jarvis", answer, slow=True)
+            if self.tts_var.get():
+                self._speak_later(answer)
+
+        elif task.startswith("realtime "):
+            prompt = task.removeprefix("realtime ")
+            self.set_status("Searching...")
+            try:
+                answer = await RealtimeSearchEngine.ARealtimeSearchEngine(prompt)
+            except Exception as e:
+                answer = f"Search error: {e}"
+            self.append_chat("Jarvis", answer, slow=True)
+            if self.tts_var.get():
+                self._speak_later(answer)
+
+        elif task.startswith("generate image"):
+            prompt = task.removeprefix("generate image").strip()
+            if not prompt:
+                prompt = query
+            self.set_status("Generating...")
+            self.append_chat("System", f"Generating image: {prompt}")
+            try:
+                image_path = await ImageGeneration.AGenerateImages(prompt, open_after=False)
+                if image_path:
+                    self.append_chat("System", f"✓ Image saved: {image_path}")
+                    self.queue.put((self._show_new_image, (image_path,)))
+                else:
+                    self.append_chat("System", "✗ Image generation failed")
+            except Exception as e:
+                self.append_chat("System", f"✗ Image generation failed: {e}")
+
+        elif task.startswith("play "):
+            param = task.removeprefix("play ")
+            self.set_status("Playing...")
+            self.append_chat("System", f"Playing: {param}")
+            try:
+                await asyncio.to_thread(Automation.PlayYoutube, param)
+            except Exception as e:
+                self.append_chat("System", f"✗ Play failed: {e}")
+
+        elif task.startswith("reminder "):
+            try:
+                reminder = Reminders.Scheduler.AddFromText(task.removeprefix("reminder "))
+                self.append_chat("System", f"⏰ Reminder set for {reminder.When()}: {reminder.message}")
+            except ValueError as e:
+                self.append_chat("System", f"✗ Couldn't set reminder: {e}")
+
+        elif task.startswith(AUTOMATION_PREFIXES):
+            self.set_status("Executing...")
+            try:
+                await Cancellation.Guard(Automation.Automation([task]))
+                self.append_chat("System", f"✓ Executed: {task}")
+            except Exception as e:
+                self.append_chat("System", f"✗ Automation error: {e}")
+
+        elif task == "exit":
+            self.append_chat("System", "Goodbye!")
+            self.set_status("Exiting...")
+            await asyncio.sleep(0.5)
+            self.queue.put((self.root.quit, ()))
+
+        else:
+            self.set_status("Thinking...")
+            try:
+                answer = await Chatbot.AChatBot(task)
+            except Exception as e:
+                answer = f"Error: {e}"
+            self.append_chat("Jarvis", answer, slow=True)
+            if self.tts_var.get():
+                self._speak_later(answer)
+
+    TRACE_PANEL_TURNS = 5
+
+    def _update_trace_panel(self):
+        lines = []
+        turns = [t for t in Tracing.RecentTraces if t.name == "turn"][-self.TRACE_PANEL_TURNS:]
+        for trace in turns:
+            stages = Tracing.Breakdown(trace)
+            total = stages.pop("total")
+            ttft = stages.pop("ttft", None)
+            parts = [f"{name} {seconds * 1000:.0f}" for name, seconds in sorted(stages.items(), key=lambda kv: -kv[1])]
+            if ttft is not None:
+                parts.append(f"ttft {ttft * 1000:.0f}")
+            started = datetime.fromtimestamp(trace.started_at).strftime("%H:%M:%S")
+            lines.append(f"{started}  total {total:.2f}s | " + " · ".join(parts) + " ms")
+        self.trace_var.set("\n".join(lines))
+
+    MEMORY_PANEL_MS = 5000
+
+    def _update_memory_panel(self):
+        self.memory_var.set(Memory.Panel())
+        self.root.after(self.MEMORY_PANEL_MS, self._update_memory_panel)
+
+    def _on_reminder(self, reminder):
+        # Called from the reminder timer thread
+        text = f"⏰ Reminder: {reminder.message}"
+        if reminder.late:
+            text += f" (was due {reminder.When()}, while I was closed)"
+        self.append_chat("Jarvis", text)
+        if self.tts_var.get():
+            BackendLoop.Submit(self._speak(f"Sir, here is your reminder: {reminder.message}"))
+
+    def _show_new_image(self, image_path):
+        if not self.gallery.visible:
+            self.toggle_gallery()
+        else:
+            self.gallery.add_image(image_path)
 
     def on_voice_toggle(self):
         if not self.voice_listening:
             self.voice_listening = True
-            self.voice_btn.configure(text="🔴 Listening...", bg=self.colors['accent_red'])
+            self._show_listening(True)
             self.set_status("Listening...")
-            threading.Thread(target=self._do_listen, daemon=True).start()
+            BackendLoop.Submit(self._listen())
         else:
             self.voice_listening = False
-            self.voice_btn.configure(text="🎤  Voice Input", bg=self.colors['accent'])
+            self._show_listening(False)
             self.set_status("Ready")
 
-    def _do_listen(self):
+    # Tk thread only: backend coroutines queue this instead of calling it
+    def _show_listening(self, listening):
+        if listening:
+            self.voice_btn.configure(text="🔴 Listening...", bg=self.colors['accent_red'])
+        else:
+            self.voice_btn.configure(text="🎤  Voice Input", bg=self.colors['accent'])
+
+    def on_wake_toggle(self):
+        if self.wake_var.get():
+            spotter = WakeWord.Load()
+            if spotter is None:
+                self.wake_var.set(False)
+                self.append_chat("System", "Record the wake word first: python Backend/WakeWord.py --enroll")
+                return
+            self.wake_token = Cancellation.CancelToken("wake word")
+            BackendLoop.Submit(self._wake_loop(spotter, self.wake_token))
+            self.set_log('Wake word on: say "Jarvis"')
+        elif self.wake_token is not None:
+            self.wake_token.Cancel("wake word off")
+            self.wake_token = None
+            self.set_log("Wake word off")
+
+    def on_profile_toggle(self):
+        if self.profile_var.get():
+            Profiler.Sampler.Start()
+            self.set_log(f"Profiler on ({Profiler.Sampler.hz:.0f} Hz)")
+        else:
+            path = Profiler.Sampler.Stop()
+            stats = Profiler.Sampler.AsDict()
+            self.set_log("Profiler off")
+            if path:
+                self.append_chat("System", f"Profile written to {path} ({stats['samples']} samples, "
+                                           f"{stats['cpu_load'] * 100:.1f}% CPU). Open it with speedscope or flamegraph.pl.")
+
+    async def _wake_loop(self, spotter, token):
+        # Only the spotter runs until the wake word is heard; the recognizer then gets the microphone for one query
+        try:
+            while not token.cancelled:
+                with Cancellation.Scope(token):
+                    heard = await asyncio.to_thread(WakeWord.Listen, spotter)
+                if heard and not self.voice_listening:
+                    self.voice_listening = True
+                    self.queue.put((self._show_listening, (True,)))
+                    self.set_status("Listening...")
+                    await self._listen()
+        except Cancellation.Cancelled:
+            pass
+        except Exception as e:
+            self.append_chat("System", f"Wake word error: {e}")
+            self.queue.put((self.wake_var.set, (False,)))
+
+    async def _listen(self):
         self.set_log("Listening... Speak now")
         try:
-            text = SpeechToText.SpeechRecognition()
+            # Speaking while Jarvis talks (barge-in) cancels the current turn as soon as speech is heard
+            text = await asyncio.to_thread(SpeechToText.SpeechRecognition, on_speech=lambda: self.cancel_turn("barge-in"))
             if text:
                 self.append_chat("You (voice)", text)
-                threading.Thread(target=self._dispatch_query, args=(text,), daemon=True).start()
+                self.submit_query(text)
         except Exception as e:
             self.append_chat("System", f"Voice recognition error: {e}")
         finally:
             self.voice_listening = False
-            self.voice_btn.configure(text="🎤  Voice Input", bg=self.colors['accent'])
+            self.queue.put((self._show_listening, (False,)))
             self.set_status("Ready")
 
-    def _speak(self, text: str):
-        try:
-            TextToSpeech.TextToSpeech(text)
-        except Exception as e:
-            self.append_chat("System", f"TTS error: {e}")
+    async def _speak(self, text: str):
+        # Answers are spoken one after another; playback stops when the turn is cancelled
+        async with self._speak_lock:
+            if Cancellation.IsCancelled():
+                return
+            try:
+                await TextToSpeech.ATextToSpeech(text)
+            except Cancellation.Cancelled:
+                pass
+            except Exception as e:
+                self.append_chat("System", f"TTS error: {e}")
 
 
 def main():
+    BackendLoop.Loop.Start()
     root = tk.Tk()
     app = JarvisAssistantUI(root)
+
+    # Reminders due while Jarvis was closed fire as soon as the listener is attached
+    Reminders.Scheduler.Listeners.append(app._on_reminder)
+    Reminders.Scheduler.Start()
     
     # Add welcome message
     root.after(1000, lambda: app.append_chat("Jarvis", 
         "Hello! I'm J.A.R.V.I.S., your AI assistant. How can I help you today?"))
     
     root.mainloop()
+    Profiler.Sampler.Stop()
+    app.gallery.pipeline.Shutdown()
+    Reminders.Scheduler.Stop()
+    BackendLoop.Loop.Stop()
 
 
 if __name__ == "__main__":